@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""Micro-benchmark: PR comment scoring, selection and decision-atom inference.
+
+Builds a synthetic PR bundle (2,000 comments by default) and times the
+pipeline in history_context.py, which tokenizes each comment once per bundle
+(`annotate_comments`) and classifies only selected comments, against the
+previous approach that re-tokenized every body in scoring and again in
+selection. `--targets N` scores the same bundle for N targets with different
+keywords, as `inspect-batch` does when targets share a PR. Both variants must
+produce identical output.
+
+    python3 benchmarks/comment_scoring.py [--comments 2000] [--targets 1] [--repeat 5]
+"""
+
+from __future__ import annotations
+
+import argparse
+import copy
+import json
+import random
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Sequence, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+import history_context as hc  # noqa: E402
+
+PATH = "src/service/handler.py"
+SYMBOLS = ["handle_request", "legacy_mode"]
+KEYWORD_SETS = [["timeout", "retry", "compat"], ["reaper", "lock"], ["auth", "token", "logs"], ["allocation"], ["protocol", "document"]]
+PHRASES = [
+    "Keep legacy_mode for backwards compatibility with old clients.",
+    "This could race with the reaper thread; take the lock first.",
+    "nit: rename variable",
+    "Avoid allocation in the hot path please.",
+    "Must not leak the auth token into logs.",
+    "Add a regression test for the timeout retry path.",
+    "Temporary workaround until upstream fixes the known bug.",
+    "LGTM",
+    "Why not use handle_request directly here?",
+    "By design the retry count is an invariant of the protocol.",
+    "Should we document this?",
+]
+
+
+def synthetic_bundle(n: int, seed: int = 7) -> Dict[str, Any]:
+    rng = random.Random(seed)
+
+    def body() -> str:
+        return " ".join(rng.choice(PHRASES) for _ in range(rng.randint(1, 4)))
+
+    third = n // 3
+    return {
+        "number": 1,
+        "title": "Rework handle_request retries",
+        "body": "Reworks retry handling. " + body(),
+        "files": [{"filename": PATH, "status": "modified", "changes": 4, "patch": "@@ -1 +1 @@\n-a\n+b"}],
+        "commits": [],
+        "reviews": [{"id": i, "state": "COMMENTED", "body": body()} for i in range(third)],
+        "review_comments": [
+            {"id": i, "path": PATH if i % 3 else "src/other.py", "line": i, "body": body(),
+             "diff_hunk": "@@ -10,3 +10,4 @@ def handle_request(req):\n+    if legacy_mode:\n+        return retry(req)"}
+            for i in range(third)
+        ],
+        "issue_comments": [{"id": i, "body": body()} for i in range(n - 2 * third)],
+        "api_counts": {},
+    }
+
+
+# --- previous implementation, kept verbatim as the reference --------------------------------
+
+LEGACY_ATOM_PATTERNS = [(typ, pat.pattern) for typ, pat in hc.ATOM_PATTERNS]
+
+
+def legacy_token_set(text: str) -> set:
+    return {t.lower() for t in re.findall(r"[A-Za-z_][A-Za-z0-9_]{2,}|[0-9]{3,}", text or "")}
+
+
+def legacy_select(bundle: Dict[str, Any], path: str, symbols: Sequence[str], keywords: Sequence[str], max_items: int) -> List[Dict[str, Any]]:
+    qtokens = {t.lower() for t in list(symbols) + list(keywords) if len(t) >= 3}
+    items: List[Tuple[float, Dict[str, Any]]] = []
+
+    def score_text(text: str, extra: float = 0.0) -> float:
+        score = extra + 0.05 * len(legacy_token_set(text) & qtokens)
+        if hc.RISKY_WORDS.search(text or ""):
+            score += 0.2
+        return score
+
+    for c in bundle.get("review_comments", []):
+        extra = 0.25 if c.get("path") == path else 0.0
+        s = score_text((c.get("body") or "") + " " + (c.get("diff_hunk") or ""), extra)
+        if s > 0 or c.get("path") == path:
+            items.append((s, {"kind": "review_comment", **c}))
+    for c in bundle.get("issue_comments", []):
+        s = score_text(c.get("body") or "")
+        if s > 0:
+            items.append((s, {"kind": "issue_comment", **c}))
+    for r in bundle.get("reviews", []):
+        s = score_text(r.get("body") or "")
+        if s > 0:
+            items.append((s, {"kind": "review", **r}))
+    items.sort(key=lambda x: x[0], reverse=True)
+    return [x[1] for x in items[:max_items]]
+
+
+def legacy_classify(body: str) -> Any:
+    for typ, pat in [(typ, re.compile(pat, re.I)) for typ, pat in LEGACY_ATOM_PATTERNS]:
+        if pat.search(body):
+            return typ
+    return None
+
+
+def legacy_discussion_signals(bundle: Dict[str, Any], symbols: Sequence[str], keywords: Sequence[str]) -> Tuple[int, bool]:
+    body_text = " ".join([
+        bundle.get("title") or "",
+        bundle.get("body") or "",
+        " ".join(r.get("body") or "" for r in bundle.get("reviews", [])),
+        " ".join(c.get("body") or "" for c in bundle.get("review_comments", [])),
+        " ".join(c.get("body") or "" for c in bundle.get("issue_comments", [])),
+    ])
+    query_tokens = {x.lower() for x in list(symbols) + list(keywords) if len(x) >= 3}
+    return len(legacy_token_set(body_text) & query_tokens), bool(hc.RISKY_WORDS.findall(body_text))
+
+
+def run_legacy(bundle: Dict[str, Any], keywords: Sequence[str], max_items: int) -> Dict[str, Any]:
+    overlap, risky = legacy_discussion_signals(bundle, SYMBOLS, keywords)
+    comments = legacy_select(bundle, PATH, SYMBOLS, keywords, max_items)
+    return {
+        "overlap": overlap,
+        "risky": risky,
+        "selected": [(c["kind"], c["id"]) for c in comments],
+        "atoms": [legacy_classify(c.get("body") or "") for c in comments],
+    }
+
+
+# --- current pipeline ------------------------------------------------------------------------
+
+def run_current(bundle: Dict[str, Any], keywords: Sequence[str], max_items: int) -> Dict[str, Any]:
+    scored = hc.score_pr_bundle(bundle, PATH, SYMBOLS, keywords, {}, [])
+    comments = hc.select_relevant_comments(bundle, PATH, SYMBOLS, keywords, max_items)
+    hc.infer_decision_atoms(comments, 1, PATH, SYMBOLS)
+    reasons = " ".join(scored["why_relevant"])
+    m = re.search(r"matches (\d+) query token", reasons)
+    return {
+        "overlap": int(m.group(1)) if m else 0,
+        "risky": "risk/constraint language" in reasons,
+        "selected": [(c["kind"], c["id"]) for c in comments],
+        "atoms": [c["_atom"] for c in comments],
+    }
+
+
+def compare(comments: int = 2000, targets: int = 1, repeat: int = 5, max_items: int = 200) -> Dict[str, Any]:
+    base = synthetic_bundle(comments)
+    keyword_sets = [KEYWORD_SETS[i % len(KEYWORD_SETS)] for i in range(targets)]
+    timings: Dict[str, float] = {}
+    outputs: Dict[str, Any] = {}
+    for name, fn in (("per_pass", run_legacy), ("annotated_once", run_current)):
+        best = float("inf")
+        for _ in range(repeat):
+            bundle = copy.deepcopy(base)
+            t0 = time.perf_counter()
+            outputs[name] = [fn(bundle, kw, max_items) for kw in keyword_sets]
+            best = min(best, time.perf_counter() - t0)
+        timings[name] = best
+    return {
+        "comments": comments,
+        "targets": targets,
+        "best_of": repeat,
+        "seconds": {k: round(v, 4) for k, v in timings.items()},
+        "speedup": round(timings["per_pass"] / timings["annotated_once"], 2) if timings["annotated_once"] else None,
+        "identical": outputs["per_pass"] == outputs["annotated_once"],
+    }
+
+
+def main(argv: Any = None) -> int:
+    p = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    p.add_argument("--comments", type=int, default=2000, help="Comments in the synthetic bundle.")
+    p.add_argument("--targets", type=int, default=1, help="Targets scored against the same bundle.")
+    p.add_argument("--repeat", type=int, default=5, help="Runs per variant; the best time is reported.")
+    args = p.parse_args(argv)
+    result = compare(args.comments, args.targets, args.repeat)
+    print(json.dumps(result, indent=2))
+    return 0 if result["identical"] else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
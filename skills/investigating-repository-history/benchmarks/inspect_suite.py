@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+"""Benchmark suite: `inspect` stage timings over a synthetic repository and recorded GitHub responses.
+
+Generates a git repository of configurable size with `git fast-import` (one
+target file with a long blame range that is edited by most commits and
+renamed several times, plus background churn in other files), writes a
+`--replay` fixture directory answering every REST request `inspect` makes for
+it (commit→PR associations, search, PR bundles with many comments), then runs
+`history_context.py inspect --profile` as a child process. Each run records
+wall time, per-stage seconds (`blame`, `pickaxe`, `scoring`, ...), git and gh
+process counts, and peak RSS. Modes: `git` (`--no-index`) and `index` (after
+`index build`), each measured with a cold and a warm git object cache.
+
+Results are JSON. With `--baseline FILE` (an earlier result), metrics that got
+slower than `--tolerance`, process counts that grew, and peak memory that grew
+are listed under `comparison.regressions` and the exit status is 1.
+
+    python3 benchmarks/inspect_suite.py [--preset small|medium|large] [--repeat 3] \\
+        [--output results.json] [--baseline previous.json]
+
+GraphQL commit→PR lookups are not recorded, so they miss under `--replay` and
+fall back to the per-commit REST endpoint, which is.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+HERE = Path(__file__).resolve().parent
+SCRIPT = HERE.parent / "scripts" / "history_context.py"
+sys.path.insert(0, str(SCRIPT.parent))
+import history_context as hc  # noqa: E402
+from comment_scoring import PHRASES  # noqa: E402
+
+SCHEMA_VERSION = 1
+REPO = "bench/synthetic"
+SYMBOL = "handle_request"
+QUESTION = "Why does handle_request retry on timeout in legacy_mode?"
+PRESETS: Dict[str, Dict[str, int]] = {
+    "small": {"commits": 150, "files": 40, "renames": 2, "blame_lines": 200, "comments": 30},
+    "medium": {"commits": 800, "files": 150, "renames": 4, "blame_lines": 800, "comments": 90},
+    "large": {"commits": 3000, "files": 400, "renames": 8, "blame_lines": 2000, "comments": 150},
+}
+COMMITS_PER_PR = 2
+FIRST_PR = 100
+
+
+# --- synthetic repository -------------------------------------------------------------------
+
+def _target_line(j: int, rev: int) -> str:
+    call = SYMBOL if (j + rev) % 3 else "retry_timeout"
+    mode = "  # legacy_mode" if (j * 7 + rev) % 11 == 0 else ""
+    return f"    value_{j} = {call}(ctx, {rev}){mode}\n"
+
+
+def _data(text: str) -> bytes:
+    raw = text.encode("utf-8")
+    return b"data %d\n" % len(raw) + raw + b"\n"
+
+
+def make_repo(root: Path, commits: int, files: int, renames: int, blame_lines: int, seed: int = 7) -> Dict[str, Any]:
+    """Build the repository at `root`; returns the target path and, per commit, its sha, PR and touched paths."""
+    rng = random.Random(seed)
+    hc.run(["git", "init", "-q", str(root)])
+    for key, value in (("user.email", "bench@example.com"), ("user.name", "Bench")):
+        hc.run(["git", "config", key, value], cwd=root)
+    target = "src/pkg0/target.py"
+    body = [_target_line(j, 0) for j in range(blame_lines)]
+    others = {f"src/mod{f}.py": [f"def f{f}_{k}():\n    return {k}\n" for k in range(20)] for f in range(files)}
+    rename_at = {max(1, (k + 1) * commits // (renames + 1)): k + 1 for k in range(renames)}
+    stream: List[bytes] = []
+    log: List[Dict[str, Any]] = []
+    for i in range(commits):
+        touched: List[str] = []
+        ops: List[bytes] = []
+        if i == 0:
+            touched = [target, *others]
+        else:
+            if i in rename_at:
+                new = f"src/pkg{rename_at[i]}/target.py"
+                ops.append(f"R {target} {new}\n".encode())
+                target = new
+            if i in rename_at or rng.random() < 0.6:
+                span = max(1, blame_lines * rng.randint(1, 8) // 100)
+                lo = rng.randrange(0, max(1, blame_lines - span))
+                for j in range(lo, min(blame_lines, lo + span)):
+                    body[j] = _target_line(j, i)
+                touched.append(target)
+            for name in rng.sample(sorted(others), min(len(others), rng.randint(1, 3))):
+                lines = others[name]
+                k = rng.randrange(len(lines))
+                lines[k] = f"def f{k}_{i}():\n    return {i}\n"
+                touched.append(name)
+        for name in touched:
+            content = "".join(body) if name == target else "".join(others[name])
+            ops.append(f"M 100644 inline {name}\n".encode() + _data(content))
+        pr = FIRST_PR + i // COMMITS_PER_PR
+        ts = 1600000000 + i * 3600
+        stream.append(f"commit refs/heads/main\nmark :{i + 1}\n".encode())
+        stream.append(f"committer Bench <bench@example.com> {ts} +0000\n".encode())
+        stream.append(_data(f"Change {i}: adjust {SYMBOL} retries (#{pr})"))
+        if i:
+            stream.append(f"from :{i}\n".encode())
+        stream.extend(ops)
+        stream.append(b"\n")
+        log.append({"pr": pr, "paths": touched, "target": target})
+    marks = root / ".git" / "bench-marks"
+    proc = subprocess.run(["git", "fast-import", "--quiet", f"--export-marks={marks}"], cwd=str(root),
+                          input=b"".join(stream), stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.decode("utf-8", "replace"))
+    shas = dict(line.split() for line in marks.read_text().split("\n") if line)
+    marks.unlink()
+    for i, entry in enumerate(log):
+        entry["sha"] = shas[f":{i + 1}"]
+    hc.run(["git", "symbolic-ref", "HEAD", "refs/heads/main"], cwd=root)
+    hc.run(["git", "reset", "-q", "--hard"], cwd=root)
+    return {"path": target, "commits": log}
+
+
+# --- recorded GitHub responses --------------------------------------------------------------
+
+def _comment_body(rng: random.Random) -> str:
+    return " ".join(rng.choice(PHRASES) for _ in range(rng.randint(1, 4)))
+
+
+def _pages(items: List[Any]) -> List[List[Any]]:
+    pages = [items[i:i + hc.GH_PER_PAGE] for i in range(0, len(items), hc.GH_PER_PAGE)]
+    if not pages or len(pages[-1]) == hc.GH_PER_PAGE:
+        pages.append([])
+    return pages
+
+
+def write_fixtures(directory: Path, repo: Dict[str, Any], comments: int, seed: int = 7) -> int:
+    """Write replay fixtures for `repo` (from make_repo); returns the number of response files."""
+    rng = random.Random(seed)
+    http = hc.HttpCache(directory, replay=True)
+    written = 0
+
+    def put(endpoint: str, body: Any, params: Optional[Dict[str, Any]] = None) -> None:
+        nonlocal written
+        target = http.path_for(endpoint, params)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_text(json.dumps({"etag": None, "fetched_at": 0, "body": body}), encoding="utf-8")
+        written += 1
+
+    prs: Dict[int, List[Dict[str, Any]]] = {}
+    for c in repo["commits"]:
+        prs.setdefault(c["pr"], []).append(c)
+    for n, members in prs.items():
+        url = f"https://github.com/{REPO}/pull/{n}"
+        merged_at = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(1600000000 + n * 3600))
+        summary = {"number": n, "title": f"Adjust {SYMBOL} retries ({n})", "state": "closed", "merged_at": merged_at, "html_url": url}
+        for c in members:
+            put(f"repos/{REPO}/commits/{c['sha']}/pulls", [summary])
+        paths = list(dict.fromkeys(p for c in members for p in c["paths"]))
+        target = members[-1]["target"]
+        hunk = f"@@ -10,3 +10,4 @@ def {SYMBOL}(req):\n+    if legacy_mode:\n+        return retry_timeout(req)"
+        third = comments // 3
+        lists = {
+            "files": [{"filename": p, "status": "modified", "additions": 2, "deletions": 1, "changes": 3, "patch": hunk} for p in paths],
+            "commits": [{"sha": c["sha"], "commit": {"message": f"Change for #{n}", "author": {"name": "Bench", "date": merged_at}}} for c in members],
+            "reviews": [{"id": n * 10000 + k, "state": "COMMENTED", "user": {"login": "reviewer"}, "body": _comment_body(rng)}
+                        for k in range(third)],
+            "comments": [{"id": n * 10000 + 3000 + k, "path": target if k % 3 else paths[-1], "line": k + 1, "user": {"login": "reviewer"},
+                          "body": _comment_body(rng), "diff_hunk": hunk, "commit_id": members[-1]["sha"]} for k in range(third)],
+        }
+        issue_comments = [{"id": n * 10000 + 6000 + k, "user": {"login": "author"}, "body": _comment_body(rng)} for k in range(comments - 2 * third)]
+        put(f"repos/{REPO}/pulls/{n}", dict(summary, body=f"Reworks {SYMBOL}. " + _comment_body(rng), user={"login": "author"},
+                                            changed_files=len(paths), commits=len(members), review_comments=third,
+                                            comments=len(issue_comments)))
+        for key, items in (*lists.items(), ("issue_comments", issue_comments)):
+            endpoint = f"repos/{REPO}/issues/{n}/comments" if key == "issue_comments" else f"repos/{REPO}/pulls/{n}/{key}"
+            for page, chunk in enumerate(_pages(items), start=1):
+                put(f"{endpoint}?per_page={hc.GH_PER_PAGE}&page={page}", chunk)
+    defaults = hc.build_parser().parse_args(["inspect", "--path", repo["path"]])
+    keywords = hc.extract_keywords(QUESTION, [SYMBOL])
+    hits = [{"number": n, "title": f"Adjust {SYMBOL} retries ({n})", "html_url": f"https://github.com/{REPO}/pull/{n}"}
+            for n in sorted(prs)[-defaults.search_per_page:]]
+    for q in hc.build_candidate_search_queries(REPO, repo["path"], [SYMBOL], keywords):
+        put("search/issues", {"items": hits}, {"q": q, "per_page": str(defaults.search_per_page)})
+    return written
+
+
+# --- measurement ----------------------------------------------------------------------------
+
+def run_measured(cmd: Sequence[str], cwd: Path) -> Tuple[int, str, str, float, int]:
+    """Run `cmd`; returns (exit code, stdout, stderr, wall seconds, peak RSS in KiB of the largest process)."""
+    with tempfile.TemporaryFile() as out, tempfile.TemporaryFile() as err:
+        t0 = time.perf_counter()
+        proc = subprocess.Popen(list(cmd), cwd=str(cwd), stdout=out, stderr=err)
+        _, status, usage = os.wait4(proc.pid, 0)
+        wall = time.perf_counter() - t0
+        proc.returncode = os.waitstatus_to_exitcode(status)
+        out.seek(0)
+        err.seek(0)
+        peak = usage.ru_maxrss // 1024 if sys.platform == "darwin" else usage.ru_maxrss
+        return proc.returncode, out.read().decode("utf-8", "replace"), err.read().decode("utf-8", "replace"), wall, peak
+
+
+def measure_inspect(root: Path, path: str, fixtures: Path, blame_lines: int, mode: str) -> Dict[str, Any]:
+    cmd = [
+        sys.executable, str(SCRIPT), "inspect", "--repo-dir", str(root), "--path", path,
+        "--start", "1", "--end", str(blame_lines), "--symbol", SYMBOL, "--question", QUESTION,
+        "--github-repo", REPO, "--replay", str(fixtures), "--profile", "--no-daemon", "--format", "json",
+    ]
+    if mode == "git":
+        cmd.append("--no-index")
+    code, out, err, wall, peak = run_measured(cmd, root)
+    result: Dict[str, Any] = {"exit_code": code, "wall_seconds": round(wall, 3), "peak_rss_kb": peak}
+    if code != 0:
+        result["error"] = err.strip()[-2000:]
+        return result
+    report = json.loads(out)
+    perf = report.get("perf") or {}
+    result.update({
+        "stages": {k: v["seconds"] for k, v in perf.get("stages", {}).items()},
+        "git_processes": perf.get("git_processes"),
+        "gh_calls": perf.get("gh_calls"),
+        "http_cache": perf.get("http_cache"),
+        "seed_commits": len(report.get("seed_commits") or []),
+        "relevant_prs": len(report.get("relevant_prs") or []),
+        "renames": len((report.get("file_lineage") or {}).get("renames") or []),
+    })
+    return result
+
+
+def best_of(runs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Fastest wall and stage times across repeats; counts from the last run; peak RSS as the maximum."""
+    ok = [r for r in runs if r.get("exit_code") == 0]
+    if not ok:
+        return runs[-1]
+    best = dict(ok[-1])
+    best["wall_seconds"] = min(r["wall_seconds"] for r in ok)
+    best["stages"] = {k: min(r["stages"].get(k, float("inf")) for r in ok) for k in ok[-1]["stages"]}
+    best["peak_rss_kb"] = max(r["peak_rss_kb"] for r in ok)
+    best["runs"] = len(ok)
+    return best
+
+
+def run_suite(params: Dict[str, int], repeat: int = 3, modes: Sequence[str] = ("git", "index"),
+              workdir: Optional[Path] = None, seed: int = 7) -> Dict[str, Any]:
+    base = workdir or Path(tempfile.mkdtemp(prefix="rhi-bench-"))
+    root, fixtures = base / "repo", base / "fixtures"
+    try:
+        t0 = time.perf_counter()
+        repo = make_repo(root, params["commits"], params["files"], params["renames"], params["blame_lines"], seed)
+        responses = write_fixtures(fixtures, repo, params["comments"], seed)
+        setup = round(time.perf_counter() - t0, 3)
+        objects = hc.history_dir(root) / "objects"
+        scenarios: Dict[str, Dict[str, Any]] = {}
+        for mode in modes:
+            if mode == "index":
+                code, _, err, wall, peak = run_measured([sys.executable, str(SCRIPT), "index", "build", "--repo-dir", str(root)], root)
+                scenarios["index/build"] = {"exit_code": code, "wall_seconds": round(wall, 3), "peak_rss_kb": peak}
+                if code != 0:
+                    scenarios["index/build"]["error"] = err.strip()[-2000:]
+            runs: Dict[str, List[Dict[str, Any]]] = {"cold": [], "warm": []}
+            for _ in range(repeat):
+                shutil.rmtree(objects, ignore_errors=True)
+                for cache_state in ("cold", "warm"):
+                    runs[cache_state].append(measure_inspect(root, repo["path"], fixtures, params["blame_lines"], mode))
+            for cache_state, results in runs.items():
+                scenarios[f"{mode}/{cache_state}"] = best_of(results)
+        return {
+            "schema_version": SCHEMA_VERSION,
+            "generated_at": datetime.now(tz=timezone.utc).isoformat(),
+            "environment": {
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "git": hc.run(["git", "--version"]).strip(),
+            },
+            "params": dict(params, seed=seed, repeat=repeat),
+            "setup_seconds": setup,
+            "fixture_responses": responses,
+            "scenarios": scenarios,
+        }
+    finally:
+        if workdir is None:
+            shutil.rmtree(base, ignore_errors=True)
+
+
+# --- baseline comparison --------------------------------------------------------------------
+
+def _metrics(scenario: Dict[str, Any]) -> Dict[str, Any]:
+    out: Dict[str, Any] = {"wall_seconds": scenario.get("wall_seconds"), "peak_rss_kb": scenario.get("peak_rss_kb")}
+    out.update({f"stages.{k}": v for k, v in (scenario.get("stages") or {}).items()})
+    for key in ("git_processes", "gh_calls"):
+        if scenario.get(key) is not None:
+            out[key] = scenario[key]
+    return out
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float = 0.25, min_delta: float = 0.05) -> Dict[str, Any]:
+    """Regressions and improvements of `current` against `baseline`.
+
+    Times regress when they exceed the baseline by more than `tolerance` (a
+    fraction) and by at least `min_delta` seconds; peak RSS by more than
+    `tolerance`; process and call counts whenever they grow.
+    """
+    ignore = {"seed", "repeat"}
+    if {k: v for k, v in current["params"].items() if k not in ignore} != {k: v for k, v in baseline.get("params", {}).items() if k not in ignore}:
+        return {"comparable": False, "note": "baseline was run with different parameters", "regressions": [], "improvements": []}
+    regressions, improvements = [], []
+    for name, scenario in current["scenarios"].items():
+        old = (baseline.get("scenarios") or {}).get(name)
+        if not old or scenario.get("exit_code") != 0 or old.get("exit_code") != 0:
+            continue
+        old_metrics = _metrics(old)
+        for metric, new in _metrics(scenario).items():
+            was = old_metrics.get(metric)
+            if new is None or was is None:
+                continue
+            entry = {"scenario": name, "metric": metric, "baseline": was, "current": new}
+            if metric in ("git_processes", "gh_calls"):
+                worse, better = new > was, new < was
+            elif metric == "peak_rss_kb":
+                worse, better = new > was * (1 + tolerance), new < was * (1 - tolerance)
+            else:
+                worse = new > was * (1 + tolerance) and new - was >= min_delta
+                better = new < was * (1 - tolerance) and was - new >= min_delta
+            if worse:
+                regressions.append(entry)
+            elif better:
+                improvements.append(entry)
+    return {"comparable": True, "tolerance": tolerance, "min_delta": min_delta, "regressions": regressions, "improvements": improvements}
+
+
+def main(argv: Any = None) -> int:
+    p = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    p.add_argument("--preset", choices=sorted(PRESETS), default="small", help="Repository size; the options below override it.")
+    p.add_argument("--commits", type=int, help="Commits in the synthetic history.")
+    p.add_argument("--files", type=int, help="Background files churned alongside the target.")
+    p.add_argument("--renames", type=int, help="Times the target file is renamed.")
+    p.add_argument("--blame-lines", type=int, help="Length of the target file, all of it blamed.")
+    p.add_argument("--comments", type=int, help="Reviews plus review and issue comments per PR.")
+    p.add_argument("--seed", type=int, default=7)
+    p.add_argument("--repeat", type=int, default=3, help="Runs per scenario; the best time is reported.")
+    p.add_argument("--modes", default="git,index", help="Comma-separated: git (--no-index), index (after `index build`).")
+    p.add_argument("--workdir", help="Build the repository and fixtures here and keep them (default: a removed temp dir).")
+    p.add_argument("--output", help="Write results JSON here instead of stdout.")
+    p.add_argument("--baseline", help="Earlier results JSON to compare against; regressions exit 1.")
+    p.add_argument("--tolerance", type=float, default=0.25, help="Allowed fractional slowdown / memory growth.")
+    p.add_argument("--min-delta", type=float, default=0.05, help="Ignore time differences below this many seconds.")
+    args = p.parse_args(argv)
+    params = dict(PRESETS[args.preset])
+    for key in params:
+        if getattr(args, key) is not None:
+            params[key] = getattr(args, key)
+    modes = [m for m in args.modes.split(",") if m]
+    unknown = set(modes) - {"git", "index"}
+    if unknown:
+        p.error(f"unknown mode(s): {', '.join(sorted(unknown))}")
+    workdir = Path(args.workdir) if args.workdir else None
+    if workdir is not None:
+        if workdir.exists() and any(workdir.iterdir()):
+            p.error(f"--workdir {workdir} is not empty")
+        workdir.mkdir(parents=True, exist_ok=True)
+    result = run_suite(params, args.repeat, modes, workdir, args.seed)
+    status = 0 if all(s.get("exit_code") == 0 for s in result["scenarios"].values()) else 1
+    if args.baseline:
+        result["comparison"] = compare(result, json.loads(Path(args.baseline).read_text(encoding="utf-8")), args.tolerance, args.min_delta)
+        if result["comparison"]["regressions"]:
+            status = 1
+    text = json.dumps(result, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+    return status
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -10,22 +10,22 @@ from __future__ import annotations
 import argparse
 import json
 import re
-import shlex
 import subprocess
 import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Sequence
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
 
+# Same directory: one response cache layout and one rate-limit backoff for both scripts.
+import history_context
+from history_context import DEFAULT_HTTP_CACHE_TTL, CommandError, _split_http_response, configure_http_cache, run_gh
 
-def eprint(*args: Any) -> None:
-    print(*args, file=sys.stderr)
+PER_PAGE = 100
+ENDPOINTS = ("pr", "files", "reviews", "review_comments", "issue_comments")
 
 
-def run(cmd: Sequence[str], cwd: Optional[Path] = None, timeout: int = 60) -> str:
-    proc = subprocess.run(list(cmd), cwd=str(cwd) if cwd else None, text=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=timeout)
-    if proc.returncode != 0:
-        raise RuntimeError(f"Command failed ({proc.returncode}): {' '.join(map(shlex.quote, cmd))}\n{proc.stderr.strip()}")
-    return proc.stdout
+def eprint(*args: Any) -> None:
+    print(*args, file=sys.stderr)
 
 
 def flatten_pages(obj: Any) -> Any:
@@ -38,17 +38,63 @@ def flatten_pages(obj: Any) -> Any:
 
 
 def gh_api(endpoint: str, paginate: bool = False, cache: str = "1h") -> Any:
-    cmd = ["gh", "api", "-H", "Accept: application/vnd.github+json", "--cache", cache]
-    if paginate:
-        cmd += ["--paginate", "--slurp"]
+    """GET an endpoint through `gh api`, via history_context's response cache and rate-limit retry."""
+    http = history_context.HTTP_CACHE
+    if http is None:
+        cmd = ["gh", "api", "-H", "Accept: application/vnd.github+json", "--cache", cache]
+        if paginate:
+            cmd += ["--paginate", "--slurp"]
+        cmd.append(endpoint)
+        out = run_gh(cmd)
+        return flatten_pages(json.loads(out)) if out.strip() else []
+    path = http.path_for(endpoint)
+    entry = http.load(path)
+    if entry is not None and http.is_fresh(entry):
+        return flatten_pages(entry["body"])
+    if http.replay:
+        raise http.missing(path)
+    cmd = ["gh", "api", "-H", "Accept: application/vnd.github+json", "-i"]
+    if entry is not None and entry.get("etag"):
+        cmd += ["-H", f"If-None-Match: {entry['etag']}"]
     cmd.append(endpoint)
-    out = run(cmd, timeout=90)
-    return flatten_pages(json.loads(out)) if out.strip() else []
+    try:
+        out = run_gh(cmd)
+    except CommandError as ex:
+        # gh exits non-zero on 304 Not Modified; the cached body is still valid.
+        if entry is None or _split_http_response(ex.stdout or "")[0] != 304:
+            raise
+        http.store(path, entry["body"], entry.get("etag"))
+        return flatten_pages(entry["body"])
+    _, headers, body = _split_http_response(out)
+    parsed = json.loads(body) if body.strip() else []
+    http.store(path, parsed, headers.get("etag"))
+    return flatten_pages(parsed)
+
+
+def gh_api_paged(endpoint: str, limit: Optional[int] = None, until: Optional[Callable[[Dict[str, Any]], bool]] = None) -> Tuple[List[Any], bool]:
+    """Read a list endpoint page by page (per_page=100), stopping at `limit` items or an item matching `until`.
+
+    Returns (items, exhausted); `exhausted` is False when pages were left unread.
+    """
+    items: List[Any] = []
+    page = 1
+    while True:
+        batch = gh_api(f"{endpoint}?per_page={PER_PAGE}&page={page}")
+        if not isinstance(batch, list):
+            return items, True
+        items.extend(batch)
+        if len(batch) < PER_PAGE:
+            return items, True
+        if (limit is not None and len(items) >= limit) or (until is not None and any(until(x) for x in batch)):
+            return items, False
+        page += 1
 
 
 def detect_repo(repo_dir: Path, explicit: Optional[str]) -> str:
     if explicit:
         return explicit
+    if history_context.HTTP_CACHE is not None and history_context.HTTP_CACHE.replay:
+        raise RuntimeError("--replay needs --github-repo OWNER/REPO.")
     proc = subprocess.run(["gh", "repo", "view", "--json", "nameWithOwner", "--jq", ".nameWithOwner"], cwd=str(repo_dir), text=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
     if proc.returncode == 0 and proc.stdout.strip():
         return proc.stdout.strip()
@@ -62,12 +108,67 @@ def compact_text(text: Optional[str], limit: int) -> str:
     return s if len(s) <= limit else s[: limit - 1].rstrip() + "…"
 
 
-def fetch(repo: str, pr_num: int, max_comments: int) -> Dict[str, Any]:
-    pr = gh_api(f"repos/{repo}/pulls/{pr_num}")
-    files = gh_api(f"repos/{repo}/pulls/{pr_num}/files", paginate=True)
-    reviews = gh_api(f"repos/{repo}/pulls/{pr_num}/reviews", paginate=True)
-    review_comments = gh_api(f"repos/{repo}/pulls/{pr_num}/comments", paginate=True)
-    issue_comments = gh_api(f"repos/{repo}/issues/{pr_num}/comments", paginate=True)
+def fetch_endpoint(repo: str, pr_num: int, key: str, max_comments: int, path: Optional[str] = None) -> Any:
+    """One of ENDPOINTS: the PR object, or (items, exhausted) for a list endpoint."""
+    if key == "pr":
+        return gh_api(f"repos/{repo}/pulls/{pr_num}")
+    if key == "files":
+        if path:
+            return gh_api_paged(f"repos/{repo}/pulls/{pr_num}/files", until=lambda f: path in (f.get("filename"), f.get("previous_filename")))
+        return gh_api_paged(f"repos/{repo}/pulls/{pr_num}/files", limit=80)
+    if key == "reviews":
+        return gh_api_paged(f"repos/{repo}/pulls/{pr_num}/reviews", limit=max_comments)
+    if key == "review_comments":
+        return gh_api_paged(f"repos/{repo}/pulls/{pr_num}/comments", limit=max_comments)
+    return gh_api_paged(f"repos/{repo}/issues/{pr_num}/comments", limit=max_comments)
+
+
+def fetch(repo: str, pr_num: int, max_comments: int, path: Optional[str] = None) -> Dict[str, Any]:
+    raw = {key: fetch_endpoint(repo, pr_num, key, max_comments, path) for key in ENDPOINTS}
+    return compact(pr_num, raw, max_comments, path)
+
+
+def fetch_many(repo: str, numbers: Sequence[int], max_comments: int, path: Optional[str] = None, jobs: int = 6) -> Iterator[Tuple[int, Any]]:
+    """Yield (number, compact PR or exception) as each PR finishes.
+
+    Every (PR, endpoint) pair is a separate task in one pool of `jobs` workers,
+    so a PR completes as soon as its own five requests are done.
+    """
+    numbers = list(dict.fromkeys(numbers))
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        futures = {pool.submit(fetch_endpoint, repo, n, key, max_comments, path): (n, key) for n in numbers for key in ENDPOINTS}
+        raw: Dict[int, Dict[str, Any]] = {n: {} for n in numbers}
+        failed: set = set()
+        for fut in as_completed(futures):
+            n, key = futures[fut]
+            if n in failed:
+                continue
+            try:
+                raw[n][key] = fut.result()
+            except Exception as ex:
+                failed.add(n)
+                yield n, ex
+                continue
+            if len(raw[n]) == len(ENDPOINTS):
+                try:
+                    yield n, compact(n, raw.pop(n), max_comments, path)
+                except Exception as ex:
+                    yield n, ex
+
+
+def compact(pr_num: int, raw: Dict[str, Any], max_comments: int, path: Optional[str] = None) -> Dict[str, Any]:
+    pr = raw["pr"]
+    files, files_done = raw["files"]
+    reviews, reviews_done = raw["reviews"]
+    review_comments, review_comments_done = raw["review_comments"]
+    issue_comments, issue_comments_done = raw["issue_comments"]
+    shown_files = files[:80] + [f for f in files[80:] if path in (f.get("filename"), f.get("previous_filename"))]
+    # GitHub totals come from the PR object; reviews have no total there.
+    totals = {"files": pr.get("changed_files"), "reviews": None, "review_comments": pr.get("review_comments"), "issue_comments": pr.get("comments")}
+    fetched = {"files": (files, files_done), "reviews": (reviews, reviews_done),
+               "review_comments": (review_comments, review_comments_done), "issue_comments": (issue_comments, issue_comments_done)}
+    api_counts: Dict[str, Any] = {k: totals[k] if totals[k] is not None else len(items) for k, (items, _) in fetched.items()}
+    api_counts["truncated"] = [k for k, (items, done) in fetched.items() if not done or (totals[k] is not None and len(items) < totals[k])]
     return {
         "number": pr_num,
         "title": pr.get("title"),
@@ -88,7 +189,7 @@ def fetch(repo: str, pr_num: int, max_comments: int) -> Dict[str, Any]:
                 "has_patch": bool(f.get("patch")),
                 "patch_excerpt": compact_text(f.get("patch"), 800),
             }
-            for f in (files or [])[:80]
+            for f in shown_files
         ],
         "reviews": [
             {
@@ -121,26 +222,69 @@ def fetch(repo: str, pr_num: int, max_comments: int) -> Dict[str, Any]:
             }
             for c in (issue_comments or [])[:max_comments]
         ],
-        "api_counts": {
-            "files": len(files or []),
-            "reviews": len(reviews or []),
-            "review_comments": len(review_comments or []),
-            "issue_comments": len(issue_comments or []),
-        },
+        "api_counts": api_counts,
     }
 
 
+def stream_jsonl(repo: str, args: argparse.Namespace, out: Any) -> int:
+    """Write one JSON line per PR as it finishes (or in --pr order with --ordered); return the failure count."""
+    order = list(dict.fromkeys(args.pr))
+    pending: Dict[int, Any] = {}
+    failures = 0
+
+    def emit(n: int, result: Any) -> None:
+        nonlocal failures
+        if isinstance(result, Exception):
+            failures += 1
+            record = {"github_repo": repo, "number": n, "error": str(result)}
+        else:
+            record = {"github_repo": repo, **result}
+        out.write(json.dumps(record, ensure_ascii=False) + "\n")
+        out.flush()
+
+    for n, result in fetch_many(repo, order, args.max_comments, args.path, args.jobs):
+        if not args.ordered:
+            emit(n, result)
+            continue
+        pending[n] = result
+        while order and order[0] in pending:
+            head = order.pop(0)
+            emit(head, pending.pop(head))
+    return failures
+
+
 def main(argv: Optional[Sequence[str]] = None) -> int:
     parser = argparse.ArgumentParser(description="Fetch compact GitHub PR evidence for repository-history investigations.")
     parser.add_argument("--repo-dir", default=".", help="Local repo directory used for gh repo detection.")
     parser.add_argument("--github-repo", help="GitHub slug OWNER/REPO. Auto-detected if omitted.")
     parser.add_argument("--pr", action="append", type=int, required=True, help="PR number. Repeatable.")
-    parser.add_argument("--max-comments", type=int, default=80, help="Maximum reviews/comments per endpoint to include.")
+    parser.add_argument("--max-comments", type=int, default=80, help="Maximum reviews/comments per endpoint to fetch and include.")
+    parser.add_argument("--path", help="Repository-relative file of interest; file pages are fetched until it appears.")
+    parser.add_argument("--jobs", type=int, default=6, help="Maximum concurrent `gh` calls across all PRs and endpoints.")
+    parser.add_argument("--format", choices=["json", "jsonl"], default="json", help="`json`: one document once every PR is done. `jsonl`: one line per PR, written as soon as it finishes.")
+    parser.add_argument("--ordered", action="store_true", help="With --format jsonl, emit PRs in --pr order instead of completion order.")
+    parser.add_argument("--http-cache", metavar="DIR", help="Keep GitHub responses in DIR and revalidate them by ETag once older than --http-cache-ttl (default: history-context/http under the repository's git directory, shared with history_context.py).")
+    parser.add_argument("--http-cache-ttl", type=int, default=DEFAULT_HTTP_CACHE_TTL, help="Seconds a cached response is served without revalidation.")
+    parser.add_argument("--no-http-cache", action="store_true", help="Do not keep our own response cache; rely on `gh --cache` only.")
+    parser.add_argument("--replay", metavar="DIR", help="Serve every response from this recorded cache/fixture directory; never call GitHub.")
     parser.add_argument("--output", help="Write JSON to file instead of stdout.")
     args = parser.parse_args(argv)
     try:
+        configure_http_cache(args, Path(args.repo_dir).resolve())
         repo = detect_repo(Path(args.repo_dir), args.github_repo)
-        data = {"github_repo": repo, "pull_requests": [fetch(repo, n, args.max_comments) for n in args.pr]}
+        if args.format == "jsonl":
+            if args.output:
+                with open(args.output, "w", encoding="utf-8") as fh:
+                    failures = stream_jsonl(repo, args, fh)
+                eprint(f"wrote {args.output}")
+            else:
+                failures = stream_jsonl(repo, args, sys.stdout)
+            return 1 if failures else 0
+        results = dict(fetch_many(repo, args.pr, args.max_comments, args.path, args.jobs))
+        for n in args.pr:
+            if isinstance(results[n], Exception):
+                raise results[n]
+        data = {"github_repo": repo, "pull_requests": [results[n] for n in args.pr]}
         text = json.dumps(data, indent=2, ensure_ascii=False)
         if args.output:
             Path(args.output).write_text(text, encoding="utf-8")
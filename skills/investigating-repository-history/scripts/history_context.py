@@ -9,18 +9,30 @@ loading huge raw git/PR output into context.
 from __future__ import annotations
 
 import argparse
+import codecs
+import hashlib
 import json
 import os
+import random
 import re
 import shlex
+import signal
+import socket
+import socketserver
+import sqlite3
 import subprocess
 import sys
+import tempfile
+import threading
 import time
+from array import array
 from collections import Counter, defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
 from dataclasses import dataclass, field
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, TextIO, Tuple
 
 SHA_RE = re.compile(r"^[0-9a-f]{40}$")
 SHORT_SHA_RE = re.compile(r"^[0-9a-f]{7,40}$")
@@ -30,11 +42,42 @@ RISKY_WORDS = re.compile(
     r"rollback|fix[- ]?forward|flaky|do not|must not|must|by design|invariant)\b",
     re.IGNORECASE,
 )
+# Decision-atom types in priority order: a comment gets the first type whose pattern occurs anywhere in it.
+ATOM_PATTERNS = tuple((typ, re.compile(pat, re.IGNORECASE)) for typ, pat in (
+    ("compatibility_constraint", r"compat|legacy|backwards?|breaking"),
+    ("security_invariant", r"security|auth|permission|leak|secret|injection"),
+    ("performance_constraint", r"perf|performance|alloc|allocation|hot path|latency"),
+    ("concurrency_invariant", r"race|deadlock|lock|concurr|async|thread"),
+    ("rejected_approach", r"reject|rejected|don'?t|do not|must not|avoid|not safe"),
+    ("test_requirement", r"test|coverage|regression|flaky"),
+    ("known_bug_or_workaround", r"workaround|known bug|hack|temporary|fix forward"),
+    ("constraint", r"must|should|by design|invariant|required"),
+))
 GENERATED_PATH_RE = re.compile(
     r"(^|/)(node_modules|vendor|third_party|dist|build|generated|snapshots?)(/|$)|"
     r"(package-lock\.json|pnpm-lock\.yaml|yarn\.lock|Cargo\.lock|go\.sum)$",
     re.IGNORECASE,
 )
+PATCH_DIFF_OPTS = ("--find-renames=50%", "--find-copies=50%", "--unified=2")
+# patch-id hashes the diff text only, so copy detection is wasted work there.
+PATCH_ID_DIFF_OPTS = ("--find-renames=50%", "--unified=2")
+DEFAULT_CACHE_MAX_MB = 64
+COMMIT_SUMMARY_FMT = "%H%x1f%h%x1f%ct%x1f%an%x1f%s"
+RATE_LIMIT_RE = re.compile(r"rate limit|HTTP 429|abuse detection", re.IGNORECASE)
+GH_MAX_RETRIES = 4
+DEFAULT_GH_JOBS = 6
+# (bundle key, endpoint template, paginate) for every REST call a PR bundle needs.
+PR_BUNDLE_ENDPOINTS = (
+    ("pr", "repos/{repo}/pulls/{number}", False),
+    ("files", "repos/{repo}/pulls/{number}/files", True),
+    ("commits", "repos/{repo}/pulls/{number}/commits", True),
+    ("reviews", "repos/{repo}/pulls/{number}/reviews", True),
+    ("review_comments", "repos/{repo}/pulls/{number}/comments", True),
+    ("issue_comments", "repos/{repo}/issues/{number}/comments", True),
+)
+GH_PER_PAGE = 100
+# Bundle key -> field of the REST pull-request object holding GitHub's total for that list.
+PR_TOTAL_FIELDS = {"files": "changed_files", "commits": "commits", "review_comments": "review_comments", "issue_comments": "comments"}
 
 
 class CommandError(RuntimeError):
@@ -50,7 +93,57 @@ def eprint(*args: Any) -> None:
     print(*args, file=sys.stderr)
 
 
+class Profiler:
+    """Wall time and call counts per stage, plus process/API counters, for `inspect --profile`."""
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self.lock:
+            self.started = time.perf_counter()
+            self.stages: Dict[str, Dict[str, Any]] = {}
+            self.counters: Counter = Counter()
+
+    @contextmanager
+    def stage(self, name: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - t0
+            with self.lock:
+                st = self.stages.setdefault(name, {"calls": 0, "seconds": 0.0})
+                st["calls"] += 1
+                st["seconds"] += elapsed
+
+    def count(self, key: str, n: int = 1) -> None:
+        with self.lock:
+            self.counters[key] += n
+
+    def spawned(self, cmd: Sequence[str]) -> None:
+        tool = Path(cmd[0]).name if cmd else ""
+        self.count("gh_calls" if tool == "gh" else "git_processes" if tool == "git" else "other_processes")
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "wall_seconds": round(time.perf_counter() - self.started, 3),
+                "stages": {k: {"calls": v["calls"], "seconds": round(v["seconds"], 3)} for k, v in self.stages.items()},
+                "git_processes": self.counters["git_processes"],
+                "gh_calls": self.counters["gh_calls"],
+                "gh_rate_limit_retries": self.counters["gh_rate_limit_retries"],
+                "shared_lookups": self.counters["shared_lookups"],
+                "http_cache": {k: self.counters[f"http_cache_{k}"] for k in ("hits", "revalidated", "misses")},
+            }
+
+
+PROFILE = Profiler()
+
+
 def run(cmd: Sequence[str], cwd: Optional[Path] = None, check: bool = True, timeout: int = 60) -> str:
+    PROFILE.spawned(cmd)
     proc = subprocess.run(
         list(cmd),
         cwd=str(cwd) if cwd else None,
@@ -65,6 +158,7 @@ def run(cmd: Sequence[str], cwd: Optional[Path] = None, check: bool = True, time
 
 
 def run_optional(cmd: Sequence[str], cwd: Optional[Path] = None, timeout: int = 60) -> Tuple[int, str, str]:
+    PROFILE.spawned(cmd)
     proc = subprocess.run(
         list(cmd),
         cwd=str(cwd) if cwd else None,
@@ -76,6 +170,28 @@ def run_optional(cmd: Sequence[str], cwd: Optional[Path] = None, timeout: int =
     return proc.returncode, proc.stdout, proc.stderr
 
 
+class Watchdog:
+    """Kill a streaming child process that is still running after `seconds`.
+
+    Deadlines checked between output lines never trigger while the child is
+    silent; this timer does. `fired` tells whether it had to.
+    """
+
+    def __init__(self, proc: subprocess.Popen, seconds: float):
+        self.proc = proc
+        self.fired = False
+        self.timer = threading.Timer(seconds, self._expire)
+        self.timer.daemon = True
+        self.timer.start()
+
+    def _expire(self) -> None:
+        self.fired = True
+        self.proc.kill()
+
+    def cancel(self) -> None:
+        self.timer.cancel()
+
+
 def json_dump(obj: Any) -> str:
     return json.dumps(obj, ensure_ascii=False, indent=2, sort_keys=False)
 
@@ -93,42 +209,279 @@ def flatten_pages(obj: Any) -> Any:
     return obj
 
 
+_rate_limit_lock = threading.Lock()
+_rate_limit_until = 0.0
+
+
+def _wait_for_rate_limit() -> None:
+    with _rate_limit_lock:
+        delay = _rate_limit_until - time.monotonic()
+    if delay > 0:
+        time.sleep(delay)
+
+
+def _back_off(attempt: int) -> None:
+    """Pause every gh caller after a rate-limit response, not just the one that hit it."""
+    global _rate_limit_until
+    delay = min(60.0, 2.0 ** (attempt + 1)) + random.uniform(0, 1)
+    PROFILE.count("gh_rate_limit_retries")
+    with _rate_limit_lock:
+        _rate_limit_until = max(_rate_limit_until, time.monotonic() + delay)
+    eprint(f"warning: GitHub rate limit hit; backing off {delay:.1f}s")
+
+
+def run_gh(cmd: Sequence[str], timeout: int = 90) -> str:
+    """Run a `gh` command, retrying with shared backoff when GitHub rate-limits us."""
+    for attempt in range(GH_MAX_RETRIES + 1):
+        _wait_for_rate_limit()
+        try:
+            return run(cmd, timeout=timeout)
+        except CommandError as ex:
+            if attempt == GH_MAX_RETRIES or not RATE_LIMIT_RE.search(ex.stderr or ""):
+                raise
+            _back_off(attempt)
+    raise AssertionError("unreachable")
+
+
+DEFAULT_HTTP_CACHE_TTL = 3600
+_SAFE_SEGMENT_RE = re.compile(r"[^A-Za-z0-9._-]")
+_SAFE_QUERY_RE = re.compile(r"^[A-Za-z0-9_.,=&-]{1,120}$")
+
+
+class HttpCache:
+    """On-disk cache of GitHub API responses with ETag revalidation and an offline replay mode.
+
+    Each response is a JSON file named after the request, e.g.
+    `repos/o/r/pulls/7/files@page=1&per_page=100.json` (long or unusual query
+    strings and GraphQL queries are hashed), holding
+    {"etag": ..., "fetched_at": ..., "body": <parsed JSON>}. Entries younger
+    than `ttl` are served directly; older ones are revalidated with
+    `If-None-Match`, and a 304 does not count against the rate limit. With
+    `replay=True` nothing reaches GitHub, so a hand-written fixture directory
+    can stand in for it.
+    """
+
+    def __init__(self, directory: Path, ttl: int = DEFAULT_HTTP_CACHE_TTL, replay: bool = False):
+        self.directory = directory
+        self.ttl = ttl
+        self.replay = replay
+
+    def path_for(self, endpoint: str, params: Optional[Dict[str, Any]] = None) -> Path:
+        base, _, query = endpoint.partition("?")
+        merged = dict(p.split("=", 1) if "=" in p else (p, "") for p in query.split("&") if p)
+        merged.update({k: str(v) for k, v in (params or {}).items()})
+        segments = [_SAFE_SEGMENT_RE.sub("_", seg) for seg in base.strip("/").split("/") if seg not in ("", ".", "..")]
+        name = segments.pop() if segments else "_"
+        if merged:
+            qs = "&".join(f"{k}={merged[k]}" for k in sorted(merged))
+            name += "@" + (qs if _SAFE_QUERY_RE.match(qs) else hashlib.sha256(qs.encode("utf-8")).hexdigest()[:16])
+        return self.directory.joinpath(*segments, name + ".json")
+
+    def load(self, path: Path) -> Optional[Dict[str, Any]]:
+        try:
+            entry = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        return entry if isinstance(entry, dict) and "body" in entry else None
+
+    def is_fresh(self, entry: Dict[str, Any]) -> bool:
+        return self.replay or time.time() - float(entry.get("fetched_at") or 0) < self.ttl
+
+    def store(self, path: Path, body: Any, etag: Optional[str]) -> None:
+        if self.replay:
+            return
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp.write_text(json.dumps({"etag": etag, "fetched_at": time.time(), "body": body}, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp, path)
+        except OSError:
+            pass
+
+    def missing(self, path: Path) -> RuntimeError:
+        return RuntimeError(f"--replay: no recorded response at {path}")
+
+
+HTTP_CACHE: Optional[HttpCache] = None
+
+
+def configure_http_cache(args: argparse.Namespace, root: Optional[Path]) -> None:
+    """Set the process-wide response cache from --replay / --http-cache / --no-http-cache."""
+    global HTTP_CACHE
+    if getattr(args, "replay", None):
+        HTTP_CACHE = HttpCache(Path(args.replay), replay=True)
+    elif getattr(args, "no_http_cache", False):
+        HTTP_CACHE = None
+    elif getattr(args, "http_cache", None):
+        HTTP_CACHE = HttpCache(Path(args.http_cache), ttl=args.http_cache_ttl)
+    else:
+        base = history_dir(root) if root is not None else None
+        HTTP_CACHE = HttpCache(base / "http", ttl=args.http_cache_ttl) if base is not None else None
+
+
+def _split_http_response(out: str) -> Tuple[int, Dict[str, str], str]:
+    """Parse `gh api -i` output into (status, lower-cased headers, body)."""
+    head, sep, body = out.replace("\r\n", "\n").partition("\n\n")
+    lines = head.split("\n")
+    m = re.match(r"HTTP/\S+\s+(\d{3})", lines[0] if lines else "")
+    if not m or not sep:
+        return 0, {}, out
+    headers = {}
+    for line in lines[1:]:
+        k, _, v = line.partition(":")
+        headers[k.strip().lower()] = v.strip()
+    return int(m.group(1)), headers, body
+
+
 def gh_api(endpoint: str, repo: str, paginate: bool = False, cache: str = "1h", fields: Optional[Dict[str, str]] = None) -> Any:
+    """GET a REST endpoint through `gh api`; `fields` become query parameters.
+
+    With HTTP_CACHE set, fresh entries are served from disk and stale
+    single-page entries are revalidated with their ETag.
+    """
+    endpoint = endpoint.replace("{repo}", repo)
+    http = HTTP_CACHE
+    entry_path = http.path_for(endpoint, fields) if http is not None else None
+    entry = http.load(entry_path) if http is not None and entry_path is not None else None
+    if http is not None and entry is not None and http.is_fresh(entry):
+        PROFILE.count("http_cache_hits")
+        return flatten_pages(entry["body"])
+    if http is not None and http.replay:
+        raise http.missing(entry_path)
     cmd = ["gh", "api", "-H", "Accept: application/vnd.github+json"]
-    if cache:
+    if cache and http is None:
         cmd += ["--cache", cache]
     if paginate:
         cmd += ["--paginate", "--slurp"]
+    elif http is not None:
+        cmd.append("-i")
+        if entry is not None and entry.get("etag"):
+            cmd += ["-H", f"If-None-Match: {entry['etag']}"]
     if fields:
+        cmd += ["-X", "GET"]
         for k, v in fields.items():
             cmd += ["-f", f"{k}={v}"]
-    endpoint = endpoint.replace("{repo}", repo)
     cmd.append(endpoint)
-    out = run(cmd, timeout=90)
+    etag = None
+    try:
+        out = run_gh(cmd, timeout=90)
+    except CommandError as ex:
+        # gh exits non-zero on 304 Not Modified; the cached body is still valid.
+        if http is None or paginate or entry is None or _split_http_response(ex.stdout or "")[0] != 304:
+            raise
+        PROFILE.count("http_cache_revalidated")
+        http.store(entry_path, entry["body"], entry.get("etag"))
+        return flatten_pages(entry["body"])
+    if http is not None and not paginate:
+        _, headers, out = _split_http_response(out)
+        etag = headers.get("etag")
     if not out.strip():
-        return []
+        parsed: Any = []
+    else:
+        try:
+            parsed = json.loads(out)
+        except json.JSONDecodeError as ex:
+            raise RuntimeError(f"Could not parse gh JSON for {endpoint}: {ex}\nFirst 500 chars:\n{out[:500]}")
+    if http is not None:
+        PROFILE.count("http_cache_misses")
+        http.store(entry_path, parsed, etag)
+    return flatten_pages(parsed)
+
+
+def gh_api_paged(
+    endpoint: str,
+    repo: str,
+    limit: Optional[int] = None,
+    until: Optional[Callable[[Dict[str, Any]], bool]] = None,
+) -> Tuple[List[Any], bool]:
+    """Fetch a list endpoint one `per_page=100` page at a time instead of `--paginate`.
+
+    Stops once `limit` items are collected or an item satisfies `until` (the
+    rest of that page is kept). Returns (items, exhausted); `exhausted` is
+    False when pages were left unread.
+    """
+    items: List[Any] = []
+    sep = "&" if "?" in endpoint else "?"
+    page = 1
+    while True:
+        batch = gh_api(f"{endpoint}{sep}per_page={GH_PER_PAGE}&page={page}", repo)
+        if not isinstance(batch, list):
+            return items, True
+        items.extend(batch)
+        if len(batch) < GH_PER_PAGE:
+            return items, True
+        if (limit is not None and len(items) >= limit) or (until is not None and any(until(x) for x in batch)):
+            return items, False
+        page += 1
+
+
+def gh_graphql(query: str, variables: Dict[str, Any]) -> Dict[str, Any]:
+    """Run a GraphQL query through `gh api graphql`, keeping partial data on errors.
+
+    GraphQL has no ETags, so HTTP_CACHE serves entries only within their TTL
+    (or always, under --replay).
+    """
+    http = HTTP_CACHE
+    entry_path = None
+    if http is not None:
+        digest = hashlib.sha256(json.dumps([query, variables], sort_keys=True).encode("utf-8")).hexdigest()[:24]
+        entry_path = http.directory / "graphql" / f"{digest}.json"
+        entry = http.load(entry_path)
+        if entry is not None and http.is_fresh(entry):
+            PROFILE.count("http_cache_hits")
+            payload = entry["body"]
+            if isinstance(payload, dict) and payload.get("data"):
+                return payload
+        if http.replay:
+            raise http.missing(entry_path)
+    cmd = ["gh", "api", "graphql"] + (["--cache", "1h"] if http is None else []) + ["-f", f"query={query}"]
+    for k, v in variables.items():
+        cmd += ["-F" if isinstance(v, int) else "-f", f"{k}={v}"]
     try:
-        parsed = json.loads(out)
+        out = run_gh(cmd, timeout=120)
+    except CommandError as ex:
+        # gh exits non-zero when any alias errors (e.g. one missing PR) but still
+        # prints the data for the rest of the query.
+        if not ex.stdout.strip():
+            raise
+        out = ex.stdout
+    try:
+        payload = json.loads(out)
     except json.JSONDecodeError as ex:
-        raise RuntimeError(f"Could not parse gh JSON for {endpoint}: {ex}\nFirst 500 chars:\n{out[:500]}")
-    return flatten_pages(parsed)
+        raise RuntimeError(f"Could not parse gh GraphQL JSON: {ex}\nFirst 500 chars:\n{out[:500]}")
+    if http is not None and entry_path is not None and isinstance(payload, dict) and payload.get("data"):
+        PROFILE.count("http_cache_misses")
+        http.store(entry_path, payload, None)
+    if not isinstance(payload, dict) or not payload.get("data"):
+        raise RuntimeError(f"GraphQL query failed: {compact_text(json.dumps((payload or {}).get('errors')), 500)}")
+    return payload
+
+
+def gh_rate_limit() -> Optional[Dict[str, Any]]:
+    """Remaining GitHub API budget per resource; does not count against the limit itself."""
+    if HTTP_CACHE is not None and HTTP_CACHE.replay:
+        return None
+    code, out, _ = run_optional(["gh", "api", "rate_limit"], timeout=30)
+    if code != 0:
+        return None
+    try:
+        resources = json.loads(out).get("resources", {})
+    except json.JSONDecodeError:
+        return None
+    return {
+        name: {k: resources[name].get(k) for k in ("limit", "remaining", "reset")}
+        for name in ("core", "graphql", "search")
+        if isinstance(resources.get(name), dict)
+    }
 
 
 def gh_search_issues(repo: str, query: str, per_page: int = 20) -> List[Dict[str, Any]]:
-    cmd = [
-        "gh", "api", "-X", "GET", "search/issues",
-        "-f", f"q={query}",
-        "-F", f"per_page={per_page}",
-        "--cache", "1h",
-    ]
-    code, out, err = run_optional(cmd, timeout=90)
-    if code != 0:
-        eprint(f"warning: GitHub search failed: {err.strip()}")
-        return []
     try:
-        return json.loads(out).get("items", [])
-    except Exception:
+        res = gh_api("search/issues", repo, fields={"q": query, "per_page": str(per_page)})
+    except Exception as ex:
+        eprint(f"warning: GitHub search failed: {str(ex).strip()}")
         return []
+    return res.get("items", []) if isinstance(res, dict) else []
 
 
 def repo_root(repo_dir: Path) -> Path:
@@ -191,8 +544,53 @@ def compact_text(s: Optional[str], limit: int = 600) -> str:
     return s[: limit - 1].rstrip() + "…"
 
 
+TOKEN_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]{2,}|[0-9]{3,}")
+
+
 def token_set(text: str) -> set:
-    return {t.lower() for t in re.findall(r"[A-Za-z_][A-Za-z0-9_]{2,}|[0-9]{3,}", text or "")}
+    return {t.lower() for t in TOKEN_RE.findall(text or "")}
+
+
+def classify_atom(text: str) -> Optional[str]:
+    for typ, pat in ATOM_PATTERNS:
+        if pat.search(text or ""):
+            return typ
+    return None
+
+
+def comment_atom(c: Dict[str, Any]) -> Optional[str]:
+    """Decision-atom type of a comment body, classified on first use and cached on the comment."""
+    if "_atom" not in c:
+        c["_atom"] = classify_atom(c.get("body") or "")
+    return c["_atom"]
+
+
+def annotate_comments(bundle: Dict[str, Any]) -> Dict[str, Any]:
+    """Tokenize each review/comment of a PR bundle once, in place.
+
+    Scoring and comment selection read the cached `_tokens` and `_risky` keys
+    (plus `_hunk_tokens` / `_hunk_risky` on review comments) instead of
+    re-running the regexes per pass or per batch target; `_atom` is added by
+    comment_atom() for comments that get selected. Keys starting with `_` are
+    private and stripped before comments reach the report.
+    """
+    if bundle.get("_annotated"):
+        return bundle
+    for key in ("reviews", "review_comments", "issue_comments"):
+        for c in bundle.get(key, []):
+            body = c.get("body") or ""
+            c["_tokens"] = token_set(body)
+            c["_risky"] = bool(RISKY_WORDS.search(body))
+            if key == "review_comments":
+                hunk = c.get("diff_hunk") or ""
+                c["_hunk_tokens"] = token_set(hunk)
+                c["_hunk_risky"] = bool(RISKY_WORDS.search(hunk))
+    bundle["_annotated"] = True
+    return bundle
+
+
+def public_fields(item: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: v for k, v in item.items() if not k.startswith("_")}
 
 
 def normalize_patch_lines(patch: str) -> List[str]:
@@ -214,12 +612,209 @@ def jaccard(a: Iterable[str], b: Iterable[str]) -> float:
     return len(sa & sb) / len(sa | sb)
 
 
-def git_commit_summary(root: Path, sha: str) -> Dict[str, Any]:
-    fmt = "%H%x1f%h%x1f%ct%x1f%an%x1f%s"
-    code, out, _ = run_optional(["git", "show", "-s", f"--format={fmt}", sha], cwd=root, timeout=20)
+class HunkSimilarityIndex:
+    """Finds the seed patch most similar (exact Jaccard) to a PR patch without scoring every pair.
+
+    Each large patch gets a one-permutation MinHash signature (`BINS` 64-bit
+    slots in an array, empty bins densified by rotation) computed once. Pairs
+    are only compared exactly when they collide in at least one LSH band of
+    `ROWS` slots and the estimated similarity is within `MARGIN` of `FLOOR`.
+    Small patches are always compared exactly; the size-ratio filter is exact
+    (J can never exceed the smaller set over the larger).
+
+    This differs from an exhaustive scan in two ways. Below FLOOR the result
+    can read lower than the true best Jaccard (down to 0.0), because pruned
+    pairs are never scored; only `best_hunk_similarity` values under 0.25
+    are affected. At or above FLOOR the pruning is probabilistic: a pair
+    with J >= FLOOR is dropped with probability below 1e-7 (LSH miss about
+    7e-8, estimate under FLOOR - MARGIN about 1.5e-8). Pairs that are not
+    dropped are scored exactly, so the >= 0.25 / >= 0.65 bands, including
+    pairs right at the cutoffs, match exhaustive Jaccard with that
+    probability.
+    """
+
+    BINS = 512
+    ROWS = 2
+    FLOOR = 0.25
+    MARGIN = 0.1
+    EXACT_BELOW = 1024  # distinct lines; below this an exact set intersection is cheap anyway
+    _BIN_BITS = 9
+    _VALUE_BITS = 64 - _BIN_BITS
+
+    def __init__(self, patches: Dict[str, List[str]]):
+        self.sets = {sha: frozenset(lines) for sha, lines in patches.items()}
+        self.signatures = {sha: self.signature(lines) for sha, lines in self.sets.items()}
+        self.buckets: Dict[Tuple[int, int, int], List[str]] = defaultdict(list)
+        for sha, sig in self.signatures.items():
+            if sig is not None:
+                for key in self._band_keys(sig):
+                    self.buckets[key].append(sha)
+
+    @classmethod
+    def signature(cls, lines: frozenset) -> Optional[array]:
+        if len(lines) < cls.EXACT_BELOW:
+            return None
+        empty = (1 << 64) - 1
+        sig = array("Q", [empty]) * cls.BINS
+        mask = (1 << cls._VALUE_BITS) - 1
+        for line in lines:
+            h = int.from_bytes(hashlib.blake2b(line.encode("utf-8"), digest_size=8).digest(), "big")
+            b, v = h >> cls._VALUE_BITS, h & mask
+            if v < sig[b]:
+                sig[b] = v
+        # Rotation densification: an empty bin borrows the next non-empty bin's value, tagged with the distance.
+        raw = sig.tolist()
+        nxt = None
+        for i in range(2 * cls.BINS - 1, -1, -1):
+            j = i % cls.BINS
+            if raw[j] != empty:
+                nxt = i
+            elif i < cls.BINS and nxt is not None:
+                sig[j] = ((nxt - i) << cls._VALUE_BITS) | raw[nxt % cls.BINS]
+        return sig
+
+    @classmethod
+    def _band_keys(cls, sig: array) -> List[Tuple[int, int, int]]:
+        return [(b, sig[b * cls.ROWS], sig[b * cls.ROWS + 1]) for b in range(cls.BINS // cls.ROWS)]
+
+    @staticmethod
+    def estimate(a: array, b: array) -> float:
+        return sum(1 for x, y in zip(a, b) if x == y) / len(a)
+
+    def best_match(self, lines: Iterable[str]) -> Tuple[float, Optional[str]]:
+        """(similarity, sha) of the first seed patch with the highest Jaccard, like an exhaustive scan."""
+        target = frozenset(lines)
+        if not target:
+            return 0.0, None
+        sig = self.signature(target)
+        candidates = {sha for key in self._band_keys(sig) for sha in self.buckets.get(key, ())} if sig is not None else set()
+        best, best_sha = 0.0, None
+        for sha, seed in self.sets.items():
+            if not seed or min(len(seed), len(target)) / max(len(seed), len(target)) < self.FLOOR:
+                continue
+            seed_sig = self.signatures[sha]
+            if sig is not None and seed_sig is not None:
+                if sha not in candidates or self.estimate(sig, seed_sig) < self.FLOOR - self.MARGIN:
+                    continue
+            inter = len(seed & target)
+            sim = inter / (len(seed) + len(target) - inter)
+            if sim > best:
+                best, best_sha = sim, sha
+        return best, best_sha
+
+
+def history_dir(root: Path) -> Optional[Path]:
+    """Per-repository state directory for this script, shared by all worktrees."""
+    code, out, _ = run_optional(["git", "rev-parse", "--git-common-dir"], cwd=root, timeout=10)
+    if code != 0 or not out.strip():
+        return None
+    git_dir = Path(out.strip())
+    if not git_dir.is_absolute():
+        git_dir = root / git_dir
+    return git_dir / "history-context"
+
+
+_MISS = object()
+
+
+class GitObjectCache:
+    """Content-addressed on-disk cache for output derived from immutable commits.
+
+    Entries are keyed by full commit SHA plus the path and diff options that
+    shaped the output, so a key can never go stale. The cache lives under the
+    repository's git directory and is pruned least-recently-used first.
+    """
+
+    def __init__(self, directory: Path, max_bytes: int = DEFAULT_CACHE_MAX_MB * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def for_repo(cls, root: Path, max_mb: int = DEFAULT_CACHE_MAX_MB) -> Optional["GitObjectCache"]:
+        base = history_dir(root)
+        if base is None:
+            return None
+        return cls(base / "objects", max_bytes=max_mb * 1024 * 1024)
+
+    def _entry(self, kind: str, sha: str, parts: Sequence[Any]) -> Optional[Path]:
+        if not SHA_RE.match(sha):
+            return None  # abbreviated names and refs can move; only full SHAs are immutable
+        key = hashlib.sha256(json.dumps([kind, sha, list(parts)]).encode("utf-8")).hexdigest()
+        return self.directory / key[:2] / f"{key[2:]}.json"
+
+    def get(self, kind: str, sha: str, *parts: Any) -> Any:
+        entry = self._entry(kind, sha, parts)
+        if entry is None:
+            return _MISS
+        try:
+            value = json.loads(entry.read_text(encoding="utf-8"))["value"]
+        except (OSError, ValueError, KeyError):
+            self.misses += 1
+            return _MISS
+        try:
+            os.utime(entry)  # mtime doubles as the LRU clock for prune()
+        except OSError:
+            pass
+        self.hits += 1
+        return value
+
+    def put(self, kind: str, sha: str, value: Any, *parts: Any) -> None:
+        entry = self._entry(kind, sha, parts)
+        if entry is None:
+            return
+        try:
+            entry.parent.mkdir(parents=True, exist_ok=True)
+            tmp = entry.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp.write_text(json.dumps({"value": value}, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp, entry)
+        except OSError as ex:
+            eprint(f"warning: could not write git object cache entry: {ex}")
+
+    def prune(self) -> None:
+        """Evict least-recently-used entries until the cache fits in `max_bytes`."""
+        if not self.directory.is_dir():
+            return
+        entries = []
+        total = 0
+        for f in self.directory.glob("*/*.json"):
+            try:
+                st = f.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, f))
+            total += st.st_size
+        if total <= self.max_bytes:
+            return
+        entries.sort()
+        target = int(self.max_bytes * 0.8)
+        for _, size, f in entries:
+            if total <= target:
+                break
+            try:
+                f.unlink()
+                total -= size
+            except OSError:
+                continue
+
+
+def git_commit_summary(root: Path, sha: str, cache: Optional[GitObjectCache] = None) -> Dict[str, Any]:
+    if cache is not None:
+        hit = cache.get("summary", sha)
+        if hit is not _MISS:
+            return hit
+    code, out, _ = run_optional(["git", "show", "-s", f"--format={COMMIT_SUMMARY_FMT}", sha], cwd=root, timeout=20)
     if code != 0 or not out.strip():
         return {"sha": sha}
-    parts = out.strip().split("\x1f", 4)
+    d = _parse_commit_summary(sha, out.strip())
+    if cache is not None and len(d) > 1:
+        cache.put("summary", sha, d)
+    return d
+
+
+def _parse_commit_summary(sha: str, header: str) -> Dict[str, Any]:
+    parts = header.split("\x1f", 4)
     d: Dict[str, Any] = {"sha": sha}
     if len(parts) == 5:
         ts = int(parts[2]) if parts[2].isdigit() else 0
@@ -233,66 +828,248 @@ def git_commit_summary(root: Path, sha: str) -> Dict[str, Any]:
     return d
 
 
-def git_changed_files(root: Path, sha: str) -> List[str]:
+def git_changed_files(root: Path, sha: str, cache: Optional[GitObjectCache] = None) -> List[str]:
+    if cache is not None:
+        hit = cache.get("changed_files", sha)
+        if hit is not _MISS:
+            return hit
     code, out, _ = run_optional(["git", "show", "--name-only", "--format=", sha], cwd=root, timeout=30)
     if code != 0:
         return []
-    return [x.strip() for x in out.splitlines() if x.strip()]
-
-
-def git_patch(root: Path, sha: str, path: Optional[str] = None) -> str:
-    cmd = ["git", "show", "--format=", "--find-renames=50%", "--find-copies=50%", "--unified=2", sha]
+    files = [x.strip() for x in out.splitlines() if x.strip()]
+    if cache is not None:
+        cache.put("changed_files", sha, files)
+    return files
+
+
+def git_commit_batch(root: Path, shas: Sequence[str], cache: Optional[GitObjectCache] = None) -> Dict[str, Dict[str, Any]]:
+    """Summaries and changed files for many commits from one `git log --no-walk --stdin` stream.
+
+    Returns {sha: {"summary": ..., "changed_files": [...]}} in the shapes of
+    `git_commit_summary` / `git_changed_files`. Commits missing from the result
+    (bad revisions, or the whole batch failing) are left to those per-SHA
+    functions as fallbacks.
+    """
+    out_map: Dict[str, Dict[str, Any]] = {}
+    pending = []
+    for sha in unique_preserve(shas):
+        if cache is not None:
+            summary = cache.get("summary", sha)
+            files = cache.get("changed_files", sha)
+            if summary is not _MISS and files is not _MISS:
+                out_map[sha] = {"summary": summary, "changed_files": files}
+                continue
+        pending.append(sha)
+    if not pending:
+        return out_map
+    cmd = ["git", "log", "--no-walk=unsorted", "--stdin", "--cc", "--name-only", f"--format=%x1e{COMMIT_SUMMARY_FMT}"]
+    PROFILE.spawned(cmd)
+    proc = subprocess.run(cmd, cwd=str(root), input="\n".join(pending) + "\n", text=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=120)
+    if proc.returncode != 0:
+        return out_map
+    for record in proc.stdout.split("\x1e"):
+        lines = record.strip("\n").split("\n")
+        if not lines or "\x1f" not in lines[0]:
+            continue
+        sha = lines[0].split("\x1f", 1)[0]
+        summary = _parse_commit_summary(sha, lines[0])
+        files = [x.strip() for x in lines[1:] if x.strip()]
+        out_map[sha] = {"summary": summary, "changed_files": files}
+        if cache is not None:
+            cache.put("summary", sha, summary)
+            cache.put("changed_files", sha, files)
+    return out_map
+
+
+def _git_patch(root: Path, sha: str, path: Optional[str], cache: Optional[GitObjectCache]) -> Optional[str]:
+    """Return the rendered patch, or None when `git show` failed."""
+    if cache is not None:
+        hit = cache.get("patch", sha, path, PATCH_DIFF_OPTS)
+        if hit is not _MISS:
+            return hit
+    cmd = ["git", "show", "--format=", *PATCH_DIFF_OPTS, sha]
     if path:
         cmd += ["--", path]
     code, out, _ = run_optional(cmd, cwd=root, timeout=60)
-    return out if code == 0 else ""
-
-
-def git_patch_id(root: Path, sha: str) -> Optional[str]:
-    patch = git_patch(root, sha)
-    if not patch.strip():
+    if code != 0:
         return None
-    proc1 = subprocess.Popen(["git", "patch-id", "--stable"], cwd=str(root), text=True, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    stdout, _ = proc1.communicate(patch, timeout=30)
-    if proc1.returncode == 0 and stdout.strip():
-        return stdout.strip().split()[0]
-    return None
+    if cache is not None:
+        cache.put("patch", sha, out, path, PATCH_DIFF_OPTS)
+    return out
 
 
-def blame_commits(root: Path, path: str, start: Optional[int], end: Optional[int]) -> Tuple[List[Dict[str, Any]], List[str]]:
-    if start is None or end is None:
+def git_patch(root: Path, sha: str, path: Optional[str] = None, cache: Optional[GitObjectCache] = None) -> str:
+    return _git_patch(root, sha, path, cache) or ""
+
+
+def git_patch_id(root: Path, sha: str, cache: Optional[GitObjectCache] = None) -> Optional[str]:
+    return git_patch_ids(root, [sha], cache).get(sha)
+
+
+def git_patch_ids(root: Path, shas: Sequence[str], cache: Optional[GitObjectCache] = None) -> Dict[str, Optional[str]]:
+    """`git patch-id --stable` for many commits: one `git log --no-walk -p` piped into one patch-id process.
+
+    `shas` are usually full commit ids, as blame and log report them; any
+    other revision (an abbreviated sha, a tag) is resolved first and reported
+    under the name it was given. Returns {rev: patch_id}; commits without a
+    textual diff (merges, empty or mode-only changes) map to None; revisions
+    git cannot resolve to a commit are left out.
+    """
+    resolved = {rev: rev for rev in unique_preserve(shas) if SHA_RE.match(rev)}
+    others = [rev for rev in unique_preserve(shas) if rev not in resolved]
+    if others:
+        cmd = ["git", "cat-file", "--batch-check"]
+        PROFILE.spawned(cmd)
+        proc = subprocess.run(cmd, cwd=str(root), input="".join(f"{rev}^{{commit}}\n" for rev in others),
+                              text=True, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, timeout=60)
+        for rev, line in zip(others, proc.stdout.splitlines()):
+            parts = line.split()
+            if len(parts) == 3 and parts[1] == "commit":
+                resolved[rev] = parts[0]
+    ids = _git_patch_ids(root, list(dict.fromkeys(resolved.values())), cache)
+    return {rev: ids[sha] for rev, sha in resolved.items() if sha in ids}
+
+
+def _git_patch_ids(root: Path, shas: Sequence[str], cache: Optional[GitObjectCache]) -> Dict[str, Optional[str]]:
+    """git_patch_ids for full commit ids, keyed by the `%H` each commit's patch is printed under."""
+    out_map: Dict[str, Optional[str]] = {}
+    pending = []
+    for sha in unique_preserve(shas):
+        hit = cache.get("patch_id", sha, PATCH_ID_DIFF_OPTS) if cache is not None else _MISS
+        if hit is not _MISS:
+            out_map[sha] = hit
+        else:
+            pending.append(sha)
+    if not pending:
+        return out_map
+    log_cmd = ["git", "log", "--no-walk=unsorted", "--stdin", "-p", "--format=commit %H", *PATCH_ID_DIFF_OPTS]
+    id_cmd = ["git", "patch-id", "--stable"]
+    PROFILE.spawned(log_cmd)
+    PROFILE.spawned(id_cmd)
+    log = subprocess.Popen(log_cmd, cwd=str(root), stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    assert log.stdin is not None and log.stdout is not None
+    ids = subprocess.Popen(id_cmd, cwd=str(root), stdin=log.stdout, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    log.stdout.close()
+    log.stdin.write(("\n".join(pending) + "\n").encode())
+    log.stdin.close()
+    try:
+        stdout, _ = ids.communicate(timeout=120)
+        log.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        ids.kill()
+        log.kill()
+        ids.communicate()
+        log.wait()
+        return out_map
+    if log.returncode != 0 or ids.returncode != 0:
+        # One bad revision fails the whole log; retry the rest one by one.
+        if len(pending) > 1:
+            for sha in pending:
+                out_map.update(_git_patch_ids(root, [sha], cache))
+        return out_map
+    found = {}
+    for line in stdout.split("\n"):
+        parts = line.split()
+        if len(parts) >= 2:
+            found[parts[1]] = parts[0]
+    for sha in pending:
+        # `git log -p` prints no diff for a merge (as `git show | git patch-id` yields no id
+        # for its combined diff), so merges are absent from `found` and map to None.
+        out_map[sha] = found.get(sha)
+        if cache is not None:
+            cache.put("patch_id", sha, out_map[sha], PATCH_ID_DIFF_OPTS)
+    return out_map
+
+
+BLAME_STOP_MIN_LINES = 2
+BLAME_TIMEOUT = 90
+BLAME_HEADER_RE = re.compile(r"^([0-9a-f]{40}) \d+ \d+ (\d+)$")
+
+
+def parse_line_range(value: str) -> Tuple[int, int]:
+    m = re.fullmatch(r"\s*(\d+)\s*[,:-]\s*(\d+)\s*", value)
+    if not m or int(m.group(1)) < 1 or int(m.group(2)) < int(m.group(1)):
+        raise argparse.ArgumentTypeError(f"expected START,END with 1 <= START <= END, got {value!r}")
+    return int(m.group(1)), int(m.group(2))
+
+
+def blame_commits(
+    root: Path,
+    path: str,
+    start: Optional[int],
+    end: Optional[int],
+    ranges: Sequence[Tuple[int, int]] = (),
+    stop_after: Optional[int] = None,
+) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """Aggregate `git blame --incremental` per commit as it streams from the pipe.
+
+    All `-L` ranges go to one blame run. With `stop_after`, blame is
+    terminated once that many distinct commits each own at least
+    `BLAME_STOP_MIN_LINES` lines, leaving the remaining lines unattributed.
+    """
+    line_ranges = ([(start, end)] if start is not None and end is not None else []) + list(ranges)
+    if not line_ranges:
         return [], []
-    cmd = ["git", "blame", "-w", "-M", "-C", "-C", "-C", "--line-porcelain", "-L", f"{start},{end}"]
+    cmd = ["git", "blame", "-w", "-M", "-C", "-C", "-C", "--incremental"]
+    for lo, hi in line_ranges:
+        cmd += ["-L", f"{lo},{hi}"]
     ignore_file = root / ".git-blame-ignore-revs"
     if ignore_file.exists():
         cmd += ["--ignore-revs-file", str(ignore_file)]
     cmd += ["--", path]
-    code, out, err = run_optional(cmd, cwd=root, timeout=90)
     warnings = []
-    if code != 0:
-        return [], [f"git blame failed: {err.strip()}"]
+    PROFILE.spawned(cmd)
+    # stderr goes to a file: a pipe nobody drains until stdout closes can fill up and stall both sides.
+    err = tempfile.TemporaryFile()
+    proc = subprocess.Popen(cmd, cwd=str(root), text=True, errors="replace", stdout=subprocess.PIPE, stderr=err)
+    assert proc.stdout is not None
+    watchdog = Watchdog(proc, BLAME_TIMEOUT)
     records: Dict[str, Dict[str, Any]] = {}
-    cur_sha = None
-    for line in out.splitlines():
-        m = re.match(r"^([0-9a-f]{40})\s+", line)
+    cur: Optional[Dict[str, Any]] = None
+    covered: set = set()
+    stopped = False
+    for line in proc.stdout:
+        line = line.rstrip("\n")
+        m = BLAME_HEADER_RE.match(line)
         if m:
-            cur_sha = m.group(1)
-            records.setdefault(cur_sha, {"sha": cur_sha, "line_count": 0, "paths": set()})
+            sha = m.group(1)
+            cur = records.setdefault(sha, {"sha": sha, "line_count": 0, "paths": set()})
+            cur["line_count"] += int(m.group(2))
             continue
-        if cur_sha is None:
+        if cur is None:
             continue
         if line.startswith("author "):
-            records[cur_sha]["author"] = line[len("author "):]
+            cur["author"] = line[len("author "):]
         elif line.startswith("author-time "):
             ts = int(line[len("author-time "):])
-            records[cur_sha]["timestamp"] = ts
-            records[cur_sha]["date"] = datetime.fromtimestamp(ts, tz=timezone.utc).isoformat()
+            cur["timestamp"] = ts
+            cur["date"] = datetime.fromtimestamp(ts, tz=timezone.utc).isoformat()
         elif line.startswith("summary "):
-            records[cur_sha]["summary"] = line[len("summary "):]
+            cur["summary"] = line[len("summary "):]
         elif line.startswith("filename "):
-            records[cur_sha]["paths"].add(line[len("filename "):])
-        elif line.startswith("\t"):
-            records[cur_sha]["line_count"] += 1
+            # Each incremental block ends with its filename line.
+            cur["paths"].add(line[len("filename "):])
+            if cur["line_count"] >= BLAME_STOP_MIN_LINES:
+                covered.add(cur["sha"])
+            if stop_after and len(covered) >= stop_after:
+                stopped = True
+                break
+            cur = None
+    if stopped:
+        proc.kill()
+    proc.stdout.close()
+    code = proc.wait()
+    watchdog.cancel()
+    if watchdog.fired and not stopped:
+        warnings.append(f"git blame timed out after {BLAME_TIMEOUT}s; blame evidence is partial")
+        stopped = True
+    err.seek(0)
+    stderr = err.read().decode("utf-8", errors="replace")
+    err.close()
+    if code != 0 and not stopped:
+        return [], [f"git blame failed: {stderr.strip()}"]
+    if stopped and stop_after and len(covered) >= stop_after:
+        warnings.append(f"git blame stopped early after {stop_after} commits with >= {BLAME_STOP_MIN_LINES} lines each; line counts are partial")
     result = []
     for rec in records.values():
         rec["paths"] = sorted(rec["paths"])
@@ -303,44 +1080,560 @@ def blame_commits(root: Path, path: str, start: Optional[int], end: Optional[int
     return result, warnings
 
 
-def log_commits_for_path(root: Path, path: str, limit: int) -> List[Dict[str, Any]]:
-    fmt = "%H%x1f%h%x1f%ct%x1f%an%x1f%s"
-    cmd = ["git", "log", "--follow", "--find-renames=30%", f"--format={fmt}", f"-{limit}", "--", path]
-    code, out, err = run_optional(cmd, cwd=root, timeout=90)
-    if code != 0:
-        eprint(f"warning: git log --follow failed: {err.strip()}")
-        return []
-    rows = []
-    for line in out.splitlines():
-        parts = line.split("\x1f", 4)
-        if len(parts) != 5:
-            continue
-        ts = int(parts[2]) if parts[2].isdigit() else 0
-        rows.append({
-            "sha": parts[0],
-            "short_sha": parts[1],
+LINEAGE_LOG_LIMIT = 80
+PATH_HISTORY_MIN_SCORE = 30
+LINEAGE_MIN_SCORE = 20
+PICKAXE_WALK_TIMEOUT = 120
+
+
+IDENT_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]{2,}")
+
+
+def _unquote_git_path(p: str) -> str:
+    if len(p) >= 2 and p.startswith('"') and p.endswith('"'):
+        return codecs.escape_decode(p[1:-1].encode("utf-8"))[0].decode("utf-8", errors="replace")
+    return p
+
+
+class HistoryIndex:
+    """Incremental on-disk (SQLite) index of repository history.
+
+    Maps paths to commits, commits to changed files (with rename/copy edges and
+    similarity scores) and identifier tokens to the commits whose diff changed
+    how often they occur in a file, with that change in count. `git log -S`
+    matches substrings, so a pickaxe token is answered from every posted
+    identifier containing it. It covers every commit reachable from any ref,
+    and is only consulted while the refs still match the state it was built
+    from.
+    """
+
+    SCHEMA = "2"
+    TABLES = """
+        CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+        CREATE TABLE IF NOT EXISTS commits (
+            sha TEXT PRIMARY KEY, short_sha TEXT, timestamp INTEGER, author TEXT,
+            summary TEXT, parents TEXT, seq INTEGER
+        );
+        CREATE TABLE IF NOT EXISTS changes (sha TEXT, status TEXT, score INTEGER, path TEXT, old_path TEXT);
+        CREATE INDEX IF NOT EXISTS changes_path ON changes (path);
+        CREATE TABLE IF NOT EXISTS postings (token TEXT, path TEXT, sha TEXT, delta INTEGER);
+        CREATE INDEX IF NOT EXISTS postings_path ON postings (path, token);
+    """
+
+    def __init__(self, root: Path, db_path: Path):
+        self.root = root
+        self.db_path = db_path
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(str(db_path), check_same_thread=False)
+        self.lock = threading.Lock()
+        self._head_ancestors: Optional[set] = None
+        self.db.executescript(self.TABLES)
+
+    @classmethod
+    def open(cls, root: Path, create: bool = False) -> Optional["HistoryIndex"]:
+        base = history_dir(root)
+        if base is None:
+            return None
+        db_path = base / "index.sqlite"
+        if not create and not db_path.exists():
+            return None
+        return cls(root, db_path)
+
+    @classmethod
+    def open_fresh(cls, root: Path) -> Optional["HistoryIndex"]:
+        index = cls.open(root)
+        if index is not None and not index.is_fresh():
+            index.close()
+            return None
+        return index
+
+    def close(self) -> None:
+        self.db.close()
+
+    def _meta(self, key: str) -> Optional[str]:
+        row = self.db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _refs_state(self) -> Optional[Tuple[str, List[str]]]:
+        """(HEAD sha, sorted distinct ref tips) from one `git show-ref --head`."""
+        code, out, _ = run_optional(["git", "show-ref", "--head"], cwd=self.root, timeout=30)
+        if code != 0:
+            return None
+        head = None
+        tips = set()
+        for line in out.splitlines():
+            sha, _, ref = line.partition(" ")
+            if ref == "HEAD":
+                head = sha
+            tips.add(sha)
+        return (head, sorted(tips)) if head else None
+
+    def is_fresh(self) -> bool:
+        state = self._refs_state()
+        if state is None or self._meta("schema") != self.SCHEMA:
+            return False
+        return self._meta("tips") == json.dumps(state[1])
+
+    def build(self) -> Dict[str, Any]:
+        with self.lock:
+            # Dropped rather than emptied so an index from an older schema gets the current columns.
+            self.db.executescript("DROP TABLE IF EXISTS meta; DROP TABLE IF EXISTS commits; "
+                                  "DROP TABLE IF EXISTS changes; DROP TABLE IF EXISTS postings;" + self.TABLES)
+        return self._ingest(exclude=[])
+
+    def update(self) -> Dict[str, Any]:
+        if self._meta("schema") != self.SCHEMA or self._meta("tips") is None:
+            return self.build()
+        old_tips = json.loads(self._meta("tips") or "[]")
+        state = self._refs_state()
+        for tip in sorted(set(old_tips) - set(state[1] if state else [])):
+            # Commits only the vanished tip reached would linger in the index.
+            code, out, _ = run_optional(["git", "for-each-ref", "--count=1", "--contains", tip], cwd=self.root, timeout=60)
+            head_code, _, _ = run_optional(["git", "merge-base", "--is-ancestor", tip, "HEAD"], cwd=self.root, timeout=60)
+            if (code != 0 or not out.strip()) and head_code != 0:
+                return self.build()
+        try:
+            return self._ingest(exclude=old_tips)
+        except CommandError:
+            # An old tip was garbage-collected (e.g. after a force-push); start over.
+            return self.build()
+
+    def _ingest(self, exclude: Sequence[str]) -> Dict[str, Any]:
+        state = self._refs_state()
+        if state is None:
+            raise RuntimeError("Cannot index a repository without commits.")
+        cmd = [
+            "git", "log", "--all", "--stdin", "--reverse", "-p", "--unified=0", "--no-color", "--no-ext-diff",
+            # Pin the prefixes the header parsing strips; diff.noprefix / diff.mnemonicPrefix change them.
+            "--src-prefix=a/", "--dst-prefix=b/", "--find-renames=20%", "--find-copies=20%", "--format=%x1e%H%x1f%h%x1f%ct%x1f%an%x1f%P%x1f%s",
+        ]
+        PROFILE.spawned(cmd)
+        proc = subprocess.Popen(cmd, cwd=str(self.root), text=True, errors="replace", stdin=subprocess.PIPE,
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        assert proc.stdin is not None and proc.stdout is not None and proc.stderr is not None
+        proc.stdin.write("".join(f"^{sha}\n" for sha in exclude))
+        proc.stdin.close()
+        with self.lock:
+            seq = self.db.execute("SELECT COALESCE(MAX(seq), 0) FROM commits").fetchone()[0]
+            new_commits = 0
+            commit: Optional[List[str]] = None
+            change: Optional[Dict[str, Any]] = None
+            delta: Counter = Counter()
+            in_hunk = False
+
+            def flush_change() -> None:
+                if commit is None or change is None:
+                    return
+                path = change.get("new") or change.get("old")
+                if not path:
+                    return
+                status = change.get("status", "M")
+                self.db.execute(
+                    "INSERT INTO changes VALUES (?, ?, ?, ?, ?)",
+                    (commit[0], status, change.get("score"), path, change.get("old") if status in ("R", "C") else None),
+                )
+                self.db.executemany(
+                    "INSERT INTO postings VALUES (?, ?, ?, ?)",
+                    [(tok, path, commit[0], d) for tok, d in delta.items() if d],
+                )
+
+            for line in proc.stdout:
+                line = line.rstrip("\n")
+                if line.startswith("\x1e"):
+                    flush_change()
+                    change, in_hunk = None, False
+                    delta.clear()
+                    parts = line[1:].split("\x1f", 5)
+                    if len(parts) != 6:
+                        commit = None
+                        continue
+                    commit = parts
+                    seq += 1
+                    new_commits += 1
+                    ts = int(parts[2]) if parts[2].isdigit() else 0
+                    self.db.execute(
+                        "INSERT OR REPLACE INTO commits VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (parts[0], parts[1], ts, parts[3], parts[5], parts[4], seq),
+                    )
+                elif line.startswith("diff --git "):
+                    flush_change()
+                    delta.clear()
+                    in_hunk = False
+                    change = {"status": "M"}
+                    pair = line[len("diff --git "):]
+                    half = len(pair) // 2
+                    if pair[:half] and pair[:half][2:] == pair[half + 1:][2:]:
+                        change["old"] = change["new"] = _unquote_git_path(pair[:half])[2:]
+                elif change is None or in_hunk and line[:1] in ("+", "-"):
+                    if change is not None:
+                        sign = 1 if line[0] == "+" else -1
+                        for tok in IDENT_RE.findall(line, 1):
+                            delta[tok] += sign
+                elif line.startswith("@@"):
+                    in_hunk = True
+                elif line.startswith("new file mode"):
+                    change["status"] = "A"
+                elif line.startswith("deleted file mode"):
+                    change["status"] = "D"
+                elif line.startswith(("similarity index ", "dissimilarity index ")):
+                    change["score"] = int(re.sub(r"\D", "", line) or 0)
+                elif line.startswith(("rename from ", "copy from ")):
+                    change["status"] = "R" if line.startswith("rename") else "C"
+                    change["old"] = _unquote_git_path(line.split(" from ", 1)[1])
+                elif line.startswith(("rename to ", "copy to ")):
+                    change["new"] = _unquote_git_path(line.split(" to ", 1)[1])
+                elif line.startswith("--- ") and not line.startswith("--- /dev/null"):
+                    change["old"] = _unquote_git_path(line[4:].rstrip("\t"))[2:]
+                elif line.startswith("+++ ") and not line.startswith("+++ /dev/null"):
+                    change["new"] = _unquote_git_path(line[4:].rstrip("\t"))[2:]
+            flush_change()
+            stderr = proc.stderr.read()
+            if proc.wait() != 0:
+                self.db.rollback()
+                raise CommandError(cmd, proc.returncode, "", stderr)
+            self._repost_renames(first_seq=seq - new_commits + 1)
+            self.db.executemany(
+                "INSERT OR REPLACE INTO meta VALUES (?, ?)",
+                [("schema", self.SCHEMA), ("tips", json.dumps(state[1])), ("built_at", datetime.now(tz=timezone.utc).isoformat())],
+            )
+            self.db.commit()
+            total = self.db.execute("SELECT COUNT(*) FROM commits").fetchone()[0]
+        self._head_ancestors = None
+        return {"index": str(self.db_path), "new_commits": new_commits, "commits_indexed": total, "ref_tips": len(state[1])}
+
+    def _repost_renames(self, first_seq: int) -> None:
+        """Re-derive postings for renamed/copied files the way a path-limited `git log -S` sees them.
+
+        With a pathspec the other side of a rename is filtered out, so the new
+        path counts as added (and a renamed-away old path as deleted): every
+        token of the whole blob matches, not just those in the similarity diff.
+        """
+        edges = self.db.execute(
+            "SELECT ch.sha, ch.status, ch.path, ch.old_path, c.parents FROM changes ch JOIN commits c ON c.sha = ch.sha "
+            "WHERE c.seq >= ? AND ch.status IN ('R', 'C')",
+            (first_seq,),
+        ).fetchall()
+        if not edges:
+            return
+        wanted: List[Tuple[str, str, str, int]] = []
+        for sha, status, path, old_path, parents in edges:
+            wanted.append((sha, path, f"{sha}:{path}", 1))
+            if status == "R" and parents:
+                wanted.append((sha, old_path, f"{parents.split()[0]}:{old_path}", -1))
+        blobs = self._cat_blobs([spec for _, _, spec, _ in wanted])
+        for (sha, path, spec, sign), text in zip(wanted, blobs):
+            self.db.execute("DELETE FROM postings WHERE sha = ? AND path = ?", (sha, path))
+            if text:
+                self.db.executemany("INSERT INTO postings VALUES (?, ?, ?, ?)",
+                                    [(tok, path, sha, sign * n) for tok, n in Counter(IDENT_RE.findall(text)).items()])
+
+    def _cat_blobs(self, specs: Sequence[str]) -> List[Optional[str]]:
+        pool = CAT_FILE_POOLS.get(str(self.root))
+        if pool is not None:
+            return [obj[1].decode("utf-8", errors="replace") if obj and obj[0] == "blob" else None for obj in pool.read_many(specs)]
+        PROFILE.spawned(["git"])
+        proc = subprocess.run(
+            ["git", "cat-file", "--batch"], cwd=str(self.root), input="".join(f"{spec}\n" for spec in specs).encode("utf-8"),
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=300,
+        )
+        out: List[Optional[str]] = []
+        data, pos = proc.stdout, 0
+        for _ in specs:
+            eol = data.find(b"\n", pos)
+            if eol < 0:
+                out.append(None)
+                continue
+            header = data[pos:eol].split()
+            pos = eol + 1
+            if len(header) != 3 or header[1] != b"blob":
+                out.append(None)
+                continue
+            size = int(header[2])
+            out.append(data[pos:pos + size].decode("utf-8", errors="replace"))
+            pos += size + 1
+        return out
+
+    @staticmethod
+    def _row(r: Sequence[Any], reason: str) -> Dict[str, Any]:
+        ts = r[2] or 0
+        return {
+            "sha": r[0],
+            "short_sha": r[1],
             "timestamp": ts,
             "date": datetime.fromtimestamp(ts, tz=timezone.utc).isoformat() if ts else None,
-            "author": parts[3],
-            "summary": parts[4],
-            "reason": "path_history",
-        })
-    return rows
+            "author": r[3],
+            "summary": r[4],
+            "reason": reason,
+        }
+
+    def _ancestors_of_head(self) -> set:
+        if self._head_ancestors is None:
+            state = self._refs_state()
+            with self.lock:
+                parents = dict(self.db.execute("SELECT sha, parents FROM commits"))
+            seen: set = set()
+            stack = [state[0]] if state else []
+            while stack:
+                sha = stack.pop()
+                if sha in seen or sha not in parents:
+                    continue
+                seen.add(sha)
+                stack.extend((parents[sha] or "").split())
+            self._head_ancestors = seen
+        return self._head_ancestors
+
+    def follow(self, path: str, limit: int, min_score: int, copies: bool) -> List[Tuple[Dict[str, Any], Tuple[Any, ...]]]:
+        """Emulate `git log --follow` for HEAD: newest-first (commit row, change) pairs for `path`.
+
+        A rename (or copy, when `copies`) scoring at least `min_score` switches
+        the followed name to the old path for older commits.
+        """
+        ancestors = self._ancestors_of_head()
+        # A rename away from a path is that path's deletion, so it counts as touching it.
+        query = (
+            "SELECT c.sha, c.short_sha, c.timestamp, c.author, c.summary, ch.status, ch.score, ch.path, ch.old_path, c.seq, ch.rowid "
+            "FROM changes ch JOIN commits c ON c.sha = ch.sha "
+            "WHERE (ch.path = ? OR (ch.old_path = ? AND ch.status = 'R')) AND (c.timestamp < ? OR (c.timestamp = ? AND c.seq < ?)) "
+            "ORDER BY c.timestamp DESC, c.seq DESC"
+        )
+        inf = 2 ** 62
+        with self.lock:
+            pending = self.db.execute(query, (path, path, inf, inf, inf)).fetchall()
+        out: List[Tuple[Dict[str, Any], Tuple[Any, ...]]] = []
+        current = path
+        seen_rows: set = set()
+        while pending and len(out) < limit:
+            switched = None
+            for r in pending:
+                if r[10] in seen_rows or r[0] not in ancestors:
+                    continue
+                seen_rows.add(r[10])
+                out.append((self._row(r, "path_history"), r[5:9] if r[7] == current else ("D", None, current, None)))
+                status, score, old_path = r[5], r[6] or 0, r[8]
+                if len(out) >= limit:
+                    break
+                if r[7] == current and old_path and score >= min_score and (status == "R" or (copies and status == "C")):
+                    switched = (old_path, r[2], r[9])
+                    break
+            if not switched:
+                break
+            current, ts, seq = switched
+            with self.lock:
+                pending = self.db.execute(query, (current, current, ts, ts, seq)).fetchall()
+        return out
 
+    def log_commits_for_path(self, path: str, limit: int) -> List[Dict[str, Any]]:
+        return [row for row, _ in self.follow(path, limit, min_score=PATH_HISTORY_MIN_SCORE, copies=True)]
+
+    def rename_lineage(self, path: str, limit: int) -> Dict[str, Any]:
+        renames = []
+        for row, (status, score, new_path, old_path) in self.follow(path, limit, min_score=LINEAGE_MIN_SCORE, copies=True):
+            if status in ("R", "C") and old_path and (score or 0) >= LINEAGE_MIN_SCORE:
+                renames.append({"commit": row["sha"], "similarity": f"{score or 0:03d}", "from": old_path, "to": new_path,
+                                "kind": "rename" if status == "R" else "copy"})
+        return {"renames": renames, "warnings": []}
+
+    def pickaxe(self, path: str, token: str, limit: int) -> Optional[List[Dict[str, Any]]]:
+        """Commits (across all refs) whose diff of `path` changed the count of `token`; None if not indexable.
+
+        Every occurrence of an identifier-shaped string lies inside exactly one
+        IDENT_RE match, so its count change is the sum, over posted identifiers
+        containing it, of their count change times its occurrences in them.
+        """
+        if not IDENT_RE.fullmatch(token):
+            return None
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT c.sha, c.short_sha, c.timestamp, c.author, c.summary, c.seq FROM postings p "
+                "JOIN commits c ON c.sha = p.sha WHERE p.path = ? AND instr(p.token, ?) > 0 GROUP BY c.sha "
+                "HAVING SUM(p.delta * ((length(p.token) - length(replace(p.token, ?, ''))) / ?)) != 0 "
+                "ORDER BY c.timestamp DESC, c.seq DESC LIMIT ?",
+                (path, token, token, len(token), limit),
+            ).fetchall()
+        return [self._row(r, f"pickaxe:-S {token}") for r in rows]
+
+
+class LineageWalk:
+    """One `git log --follow --name-status` walk serving both path history and rename lineage.
+
+    The walk follows renames and copies down to LINEAGE_MIN_SCORE. Path
+    history uses the same commits but, like a `--follow` at
+    PATH_HISTORY_MIN_SCORE (which always looks for copies too), stops at the
+    first commit where the followed name came from a weaker rename or copy.
+    """
+
+    def __init__(self, entries: List[Tuple[Dict[str, Any], List[Tuple[str, int, str, Optional[str]]]]], error: Optional[str] = None):
+        self.entries = entries  # newest first: (commit row, [(status, score, path, old_path)])
+        self.error = error
+
+    @classmethod
+    def run(cls, root: Path, path: str, limit: int = LINEAGE_LOG_LIMIT) -> "LineageWalk":
+        cmd = [
+            "git", "log", "--follow", "--name-status",
+            f"--find-renames={LINEAGE_MIN_SCORE}%", f"--find-copies={LINEAGE_MIN_SCORE}%",
+            f"-{limit}", f"--format=%x1e{COMMIT_SUMMARY_FMT}", "--", path,
+        ]
+        code, out, err = run_optional(cmd, cwd=root, timeout=90)
+        if code != 0:
+            return cls([], err.strip())
+        entries: List[Tuple[Dict[str, Any], List[Tuple[str, int, str, Optional[str]]]]] = []
+        for line in out.split("\n"):  # not splitlines(): it also splits on the \x1e/\x1f separators
+            if line.startswith("\x1e"):
+                parts = line[1:].split("\x1f", 4)
+                if len(parts) == 5:
+                    ts = int(parts[2]) if parts[2].isdigit() else 0
+                    entries.append((HistoryIndex._row((parts[0], parts[1], ts, parts[3], parts[4]), "path_history"), []))
+                continue
+            fields = line.split("\t")
+            if not entries or len(fields) < 2 or not fields[0]:
+                continue
+            status = fields[0]
+            score = int(status[1:]) if status[1:].isdigit() else 0
+            paths = [_unquote_git_path(f) for f in fields[1:]]
+            entries[-1][1].append((status[0], score, paths[-1], paths[0] if len(paths) > 1 else None))
+        return cls(entries)
+
+    def path_history(self, limit: int) -> List[Dict[str, Any]]:
+        rows = []
+        for row, changes in self.entries[:limit]:
+            rows.append(row)
+            if any(st in ("R", "C") and score < PATH_HISTORY_MIN_SCORE for st, score, _, _ in changes):
+                break  # a weaker lineage step: the name was created here as far as path history is concerned
+        return rows
+
+    def rename_lineage(self, limit: int = LINEAGE_LOG_LIMIT) -> Dict[str, Any]:
+        renames = [
+            {"commit": row["sha"], "similarity": f"{score:03d}", "from": old, "to": new, "kind": "rename" if st == "R" else "copy"}
+            for row, changes in self.entries[:limit]
+            for st, score, new, old in changes
+            if st in ("R", "C") and old
+        ]
+        return {"renames": renames, "warnings": [f"rename lineage failed: {self.error}"] if self.error else []}
+
+
+def log_commits_for_path(
+    root: Path,
+    path: str,
+    limit: int,
+    index: Optional[HistoryIndex] = None,
+    walk: Optional[LineageWalk] = None,
+) -> List[Dict[str, Any]]:
+    if index is not None:
+        return index.log_commits_for_path(path, limit)
+    walk = walk or LineageWalk.run(root, path, limit)
+    if walk.error:
+        eprint(f"warning: git log --follow failed: {walk.error}")
+        return []
+    return walk.path_history(limit)
 
-def pickaxe_commits(root: Path, path: str, tokens: Sequence[str], limit_per_token: int = 8) -> List[Dict[str, Any]]:
+
+def _pickaxe_single_pass(root: Path, path: str, tokens: Sequence[str], limit_per_token: int) -> Optional[Dict[str, List[str]]]:
+    """Emulate one `git log --all -S<tok>` per token from a single `git log -p` walk.
+
+    -S matches a commit when a file's occurrence count of the string changes,
+    i.e. when its removed and added lines contain it a different number of
+    times. The walk stops as soon as every token has `limit_per_token` hits.
+    Returns {token: [log header lines]} in log order, or None if git failed.
+    """
+    wanted = list(dict.fromkeys(tokens))
+    hits: Dict[str, List[str]] = {tok: [] for tok in wanted}
+    any_token = re.compile("|".join(re.escape(t) for t in sorted(wanted, key=len, reverse=True)))
+    cmd = [
+        "git", "log", "--all", "-p", "--unified=0", "--no-color", "--no-ext-diff",
+        f"--format=%x1e{COMMIT_SUMMARY_FMT}", "--", path,
+    ]
+    PROFILE.spawned(cmd)
+    proc = subprocess.Popen(cmd, cwd=str(root), text=True, errors="replace", stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    header: Optional[str] = None
+    matched: set = set()
+    delta: Counter = Counter()
+    in_hunk = False
+
+    def close_file() -> None:
+        matched.update(tok for tok, d in delta.items() if d)
+        delta.clear()
+
+    def close_commit() -> bool:
+        close_file()
+        if header is not None:
+            for tok in wanted:
+                if tok in matched and len(hits[tok]) < limit_per_token:
+                    hits[tok].append(header)
+        matched.clear()
+        return all(len(v) >= limit_per_token for v in hits.values())
+
+    watchdog = Watchdog(proc, PICKAXE_WALK_TIMEOUT)
+    done = False
+    assert proc.stdout is not None
+    for line in proc.stdout:
+        line = line.rstrip("\n")
+        if line.startswith("\x1e"):
+            if close_commit():
+                done = True
+                break
+            header, in_hunk = line[1:], False
+        elif line.startswith("diff --git "):
+            close_file()
+            in_hunk = False
+        elif line.startswith("@@"):
+            in_hunk = True
+        elif in_hunk and line[:1] in ("+", "-") and any_token.search(line, 1):
+            sign = 1 if line[0] == "+" else -1
+            for tok in wanted:
+                n = line.count(tok, 1)
+                if n:
+                    delta[tok] += sign * n
+    if done:
+        proc.kill()
+    proc.stdout.close()
+    code = proc.wait()
+    watchdog.cancel()
+    if watchdog.fired and not done:
+        # The commit being read when the walk was killed may be cut short; drop it.
+        eprint("warning: single-pass pickaxe timed out; pickaxe hits may be incomplete")
+        return hits
+    if done:
+        return hits
+    close_commit()
+    return hits if code == 0 else None
+
+
+def pickaxe_commits(
+    root: Path,
+    path: str,
+    tokens: Sequence[str],
+    limit_per_token: int = 8,
+    single_pass: bool = True,
+    index: Optional[HistoryIndex] = None,
+) -> List[Dict[str, Any]]:
     out_rows: List[Dict[str, Any]] = []
     fmt = "%H%x1f%h%x1f%ct%x1f%an%x1f%s"
-    for tok in tokens[:8]:
-        if len(tok) < 3:
-            continue
-        # -S is literal-ish and safer than regex. Scope to path when possible.
-        cmd = ["git", "log", "--all", f"-S{tok}", f"--format={fmt}", f"-{limit_per_token}"]
-        if path:
-            cmd += ["--", path]
-        code, stdout, _ = run_optional(cmd, cwd=root, timeout=60)
-        if code != 0:
+    toks = [tok for tok in tokens[:8] if len(tok) >= 3]
+    indexed: Dict[str, List[Dict[str, Any]]] = {}
+    if index is not None and path:
+        for tok in toks:
+            rows = index.pickaxe(path, tok, limit_per_token)
+            if rows is not None:
+                indexed[tok] = rows
+        toks_for_git = [tok for tok in toks if tok not in indexed]
+    else:
+        toks_for_git = toks
+    # A pathless walk would render every diff in history; keep per-token -S there.
+    combined = _pickaxe_single_pass(root, path, toks_for_git, limit_per_token) if single_pass and path and toks_for_git else None
+    for tok in toks:
+        if tok in indexed:
+            out_rows.extend(indexed[tok])
             continue
+        if combined is not None:
+            stdout = "\n".join(combined[tok])
+        else:
+            # -S is literal-ish and safer than regex. Scope to path when possible.
+            cmd = ["git", "log", "--all", f"-S{tok}", f"--format={fmt}", f"-{limit_per_token}"]
+            if path:
+                cmd += ["--", path]
+            code, stdout, _ = run_optional(cmd, cwd=root, timeout=60)
+            if code != 0:
+                continue
         for line in stdout.splitlines():
             parts = line.split("\x1f", 4)
             if len(parts) != 5:
@@ -365,29 +1658,16 @@ def pickaxe_commits(root: Path, path: str, tokens: Sequence[str], limit_per_toke
     return uniq
 
 
-def rename_lineage(root: Path, path: str, limit: int = 80) -> Dict[str, Any]:
-    cmd = [
-        "git", "log", "--follow", "--name-status", "--find-renames=20%", "--find-copies=20%",
-        f"-{limit}", "--format=commit %H", "--", path,
-    ]
-    code, out, err = run_optional(cmd, cwd=root, timeout=90)
-    if code != 0:
-        return {"renames": [], "warnings": [f"rename lineage failed: {err.strip()}"]}
-    renames = []
-    current_commit = None
-    for line in out.splitlines():
-        if line.startswith("commit "):
-            current_commit = line.split()[1]
-            continue
-        parts = line.split("\t")
-        if not parts:
-            continue
-        status = parts[0]
-        if status.startswith("R") and len(parts) >= 3:
-            renames.append({"commit": current_commit, "similarity": status[1:], "from": parts[1], "to": parts[2], "kind": "rename"})
-        elif status.startswith("C") and len(parts) >= 3:
-            renames.append({"commit": current_commit, "similarity": status[1:], "from": parts[1], "to": parts[2], "kind": "copy"})
-    return {"renames": renames, "warnings": []}
+def rename_lineage(
+    root: Path,
+    path: str,
+    limit: int = LINEAGE_LOG_LIMIT,
+    index: Optional[HistoryIndex] = None,
+    walk: Optional[LineageWalk] = None,
+) -> Dict[str, Any]:
+    if index is not None:
+        return index.rename_lineage(path, limit)
+    return (walk or LineageWalk.run(root, path, limit)).rename_lineage(limit)
 
 
 def extract_keywords(question: str, symbols: Sequence[str]) -> List[str]:
@@ -411,13 +1691,248 @@ def pr_number_from_url(url: str) -> Optional[int]:
     return int(m.group(1)) if m else None
 
 
-def fetch_pr_bundle(repo: str, number: int, max_comments: int = 80) -> Dict[str, Any]:
-    pr = gh_api(f"repos/{repo}/pulls/{number}", repo, paginate=False)
-    files = gh_api(f"repos/{repo}/pulls/{number}/files", repo, paginate=True)
-    commits = gh_api(f"repos/{repo}/pulls/{number}/commits", repo, paginate=True)
-    reviews = gh_api(f"repos/{repo}/pulls/{number}/reviews", repo, paginate=True)
-    review_comments = gh_api(f"repos/{repo}/pulls/{number}/comments", repo, paginate=True)
-    issue_comments = gh_api(f"repos/{repo}/issues/{number}/comments", repo, paginate=True)
+def fetch_pr_bundle(repo: str, number: int, max_comments: int = 80, jobs: int = DEFAULT_GH_JOBS, path: Optional[str] = None) -> Dict[str, Any]:
+    result = fetch_pr_bundles(repo, [number], max_comments=max_comments, jobs=jobs, path=path)[number]
+    if isinstance(result, Exception):
+        raise result
+    return result
+
+
+def _touches_path(path: Optional[str]) -> Optional[Callable[[Dict[str, Any]], bool]]:
+    if not path:
+        return None
+    return lambda f: isinstance(f, dict) and path in (f.get("filename"), f.get("previous_filename"))
+
+
+def fetch_pr_list(repo: str, number: int, key: str, template: str, max_comments: int, path: Optional[str] = None) -> Tuple[List[Any], bool]:
+    """One bundle list endpoint with bounded pagination: comments stop at max_comments, files at `path`."""
+    endpoint = template.format(repo=repo, number=number)
+    if key == "files":
+        return gh_api_paged(endpoint, repo, until=_touches_path(path))
+    if key == "commits":
+        return gh_api_paged(endpoint, repo)
+    return gh_api_paged(endpoint, repo, limit=max_comments)
+
+
+def fetch_pr_bundles(
+    repo: str,
+    numbers: Sequence[int],
+    max_comments: int = 80,
+    jobs: int = DEFAULT_GH_JOBS,
+    path: Optional[str] = None,
+) -> Dict[int, Any]:
+    """Fetch several PR bundles with all their endpoints in one bounded worker pool.
+
+    Every (PR, endpoint) pair is an independent task, so one slow PR does not
+    hold up the others and `jobs` caps the number of concurrent `gh` processes.
+    List endpoints are read page by page only as far as needed (see
+    fetch_pr_list). Returns {number: bundle}, or {number: exception} for PRs
+    whose fetch failed.
+    """
+    numbers = list(dict.fromkeys(numbers))
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        futures = {
+            (n, key): (
+                pool.submit(fetch_pr_list, repo, n, key, template, max_comments, path)
+                if paged
+                else pool.submit(gh_api, template.format(repo=repo, number=n), repo)
+            )
+            for n in numbers
+            for key, template, paged in PR_BUNDLE_ENDPOINTS
+        }
+    results: Dict[int, Any] = {}
+    for n in numbers:
+        try:
+            raw: Dict[str, Any] = {"_exhausted": {}}
+            for key, _, paged in PR_BUNDLE_ENDPOINTS:
+                if paged:
+                    raw[key], raw["_exhausted"][key] = futures[(n, key)].result()
+                else:
+                    raw[key] = futures[(n, key)].result()
+            pr = raw["pr"] if isinstance(raw["pr"], dict) else {}
+            raw["_totals"] = {key: pr.get(field) for key, field in PR_TOTAL_FIELDS.items()}
+            results[n] = build_pr_bundle(n, raw, max_comments)
+        except Exception as ex:
+            results[n] = ex
+    return results
+
+
+GRAPHQL_PR_BATCH = 5
+_GQL_PAGE = "totalCount pageInfo { hasNextPage endCursor }"
+_GQL_REVIEW_COMMENT = (
+    "databaseId path line originalLine startLine originalStartLine "
+    "commit { oid } originalCommit { oid } author { login } body diffHunk url"
+)
+_GQL_NODES = {
+    "commits": "commit { oid message author { name date } }",
+    "reviews": "databaseId state author { login } body submittedAt url",
+    "reviewThreads": "id comments(first: 50) { " + _GQL_PAGE + " nodes { " + _GQL_REVIEW_COMMENT + " } }",
+    "comments": "databaseId author { login } body createdAt url",
+}
+_GQL_PR_SCALARS = "number title body state mergedAt url changedFiles mergeCommit { oid } author { login } baseRefName baseRefOid headRefName headRefOid"
+
+
+def _gql_connection(name: str, first: int, after: bool = False) -> str:
+    args = f"first: {first}" + (", after: $cursor" if after else "")
+    return name + "(" + args + ") { " + _GQL_PAGE + " nodes { " + _GQL_NODES[name] + " } }"
+
+
+def _gql_follow(owner: str, name: str, number: int, conn: str, page: Dict[str, Any], limit: int) -> List[Dict[str, Any]]:
+    """Collect a connection's nodes, paging with its cursor only while it overflows `limit`."""
+    nodes = list(page.get("nodes") or [])
+    info = page.get("pageInfo") or {}
+    query = (
+        "query($owner: String!, $name: String!, $number: Int!, $cursor: String!) { "
+        "repository(owner: $owner, name: $name) { pullRequest(number: $number) { "
+        + _gql_connection(conn, 100, after=True) + " } } }"
+    )
+    while info.get("hasNextPage") and len(nodes) < limit:
+        data = gh_graphql(query, {"owner": owner, "name": name, "number": number, "cursor": info.get("endCursor") or ""})
+        page = (((data["data"].get("repository") or {}).get("pullRequest") or {}).get(conn)) or {}
+        nodes.extend(page.get("nodes") or [])
+        info = page.get("pageInfo") or {}
+    return nodes[:limit]
+
+
+def _gql_thread_comments(thread: Optional[Dict[str, Any]], limit: int) -> List[Dict[str, Any]]:
+    """A review thread's comments, paging past the first 50 while the thread overflows `limit`.
+
+    REST returns every inline comment, so a long thread is followed by its own
+    cursor. Comments are chronological, so once a thread has `limit` of them
+    its later ones cannot make it into a bundle capped at `limit`.
+    """
+    page = (thread or {}).get("comments") or {}
+    nodes = list(page.get("nodes") or [])
+    info = page.get("pageInfo") or {}
+    query = (
+        "query($id: ID!, $cursor: String!) { node(id: $id) { ... on PullRequestReviewThread { "
+        "comments(first: 100, after: $cursor) { " + _GQL_PAGE + " nodes { " + _GQL_REVIEW_COMMENT + " } } } } }"
+    )
+    while info.get("hasNextPage") and len(nodes) < limit and (thread or {}).get("id"):
+        data = gh_graphql(query, {"id": thread["id"], "cursor": info.get("endCursor") or ""})
+        page = ((data["data"].get("node") or {}).get("comments")) or {}
+        nodes.extend(page.get("nodes") or [])
+        info = page.get("pageInfo") or {}
+    return nodes
+
+
+def _login(node: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    return {"login": (node or {}).get("login")}
+
+
+def _graphql_pr_to_rest(owner: str, name: str, node: Dict[str, Any], max_comments: int) -> Dict[str, Any]:
+    """Reshape one aliased GraphQL pullRequest into the raw REST payloads build_pr_bundle expects."""
+    number = node["number"]
+
+    def follow(conn: str, limit: int) -> List[Dict[str, Any]]:
+        return _gql_follow(owner, name, number, conn, node.get(conn) or {}, limit)
+
+    state = (node.get("state") or "").lower()
+    threads = follow("reviewThreads", max_comments)
+    inline = [c for t in threads for c in _gql_thread_comments(t, max_comments)]
+    inline.sort(key=lambda c: c.get("databaseId") or 0)  # REST lists inline comments in creation order
+    return {
+        "pr": {
+            "title": node.get("title"),
+            "body": node.get("body"),
+            "state": "closed" if state == "merged" else state,
+            "merged_at": node.get("mergedAt"),
+            "merge_commit_sha": (node.get("mergeCommit") or {}).get("oid"),
+            "user": _login(node.get("author")),
+            "html_url": node.get("url"),
+            "base": {"ref": node.get("baseRefName"), "sha": node.get("baseRefOid")},
+            "head": {"ref": node.get("headRefName"), "sha": node.get("headRefOid")},
+        },
+        "commits": [
+            {"sha": c["commit"].get("oid"), "commit": {"message": c["commit"].get("message"), "author": c["commit"].get("author")}}
+            for c in follow("commits", 10_000) if c.get("commit")
+        ],
+        "reviews": [
+            {"id": r.get("databaseId"), "state": r.get("state"), "user": _login(r.get("author")), "body": r.get("body"),
+             "submitted_at": r.get("submittedAt"), "html_url": r.get("url")}
+            for r in follow("reviews", max_comments)
+        ],
+        "review_comments": [
+            {"id": c.get("databaseId"), "path": c.get("path"), "line": c.get("line"), "original_line": c.get("originalLine"),
+             "start_line": c.get("startLine"), "original_start_line": c.get("originalStartLine"),
+             "commit_id": (c.get("commit") or {}).get("oid"), "original_commit_id": (c.get("originalCommit") or {}).get("oid"),
+             "user": _login(c.get("author")), "body": c.get("body"), "diff_hunk": c.get("diffHunk"), "html_url": c.get("url")}
+            for c in inline
+        ],
+        "issue_comments": [
+            {"id": c.get("databaseId"), "user": _login(c.get("author")), "body": c.get("body"),
+             "created_at": c.get("createdAt"), "html_url": c.get("url")}
+            for c in follow("comments", max_comments)
+        ],
+        "_totals": {
+            "files": node.get("changedFiles"),
+            "commits": (node.get("commits") or {}).get("totalCount"),
+            "reviews": (node.get("reviews") or {}).get("totalCount"),
+            "review_comments": sum(((t or {}).get("comments") or {}).get("totalCount") or 0 for t in threads),
+            "issue_comments": (node.get("comments") or {}).get("totalCount"),
+        },
+    }
+
+
+def fetch_pr_bundles_graphql(
+    repo: str,
+    numbers: Sequence[int],
+    max_comments: int = 80,
+    jobs: int = DEFAULT_GH_JOBS,
+    path: Optional[str] = None,
+) -> Dict[int, Any]:
+    """GraphQL transport for fetch_pr_bundles: one aliased query per GRAPHQL_PR_BATCH PRs.
+
+    Metadata, commits, reviews, review threads and issue comments come from the
+    batched query. GraphQL does not expose file patches, so each PR's file list
+    still comes from the REST files endpoint to keep hunk matching intact.
+    """
+    owner, _, name = repo.partition("/")
+    numbers = list(dict.fromkeys(numbers))
+    first = max(1, min(100, max_comments))
+    connections = " ".join(_gql_connection(conn, 100 if conn == "commits" else first) for conn in _GQL_NODES)
+    chunks = [numbers[i:i + GRAPHQL_PR_BATCH] for i in range(0, len(numbers), GRAPHQL_PR_BATCH)]
+
+    def fetch_chunk(chunk: Sequence[int]) -> Dict[int, Any]:
+        aliases = " ".join(f"pr{n}: pullRequest(number: {int(n)}) {{ {_GQL_PR_SCALARS} {connections} }}" for n in chunk)
+        query = "query($owner: String!, $name: String!) { repository(owner: $owner, name: $name) { " + aliases + " } }"
+        repo_data = gh_graphql(query, {"owner": owner, "name": name})["data"].get("repository") or {}
+        out: Dict[int, Any] = {}
+        for n in chunk:
+            node = repo_data.get(f"pr{n}")
+            out[n] = _graphql_pr_to_rest(owner, name, node, max_comments) if node else RuntimeError(f"PR #{n} not returned by GraphQL")
+        return out
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        chunk_futures = [pool.submit(fetch_chunk, chunk) for chunk in chunks]
+        file_futures = {n: pool.submit(fetch_pr_list, repo, n, "files", "repos/{repo}/pulls/{number}/files", max_comments, path) for n in numbers}
+    raw_by_number: Dict[int, Any] = {}
+    for chunk, fut in zip(chunks, chunk_futures):
+        try:
+            raw_by_number.update(fut.result())
+        except Exception as ex:
+            raw_by_number.update({n: ex for n in chunk})
+    results: Dict[int, Any] = {}
+    for n in numbers:
+        raw = raw_by_number.get(n)
+        try:
+            if isinstance(raw, Exception):
+                raise raw
+            raw["files"], files_exhausted = file_futures[n].result()
+            raw["_exhausted"] = {"files": files_exhausted}
+            results[n] = build_pr_bundle(n, raw, max_comments)
+        except Exception as ex:
+            results[n] = ex
+    return results
+
+
+def build_pr_bundle(number: int, raw: Dict[str, Any], max_comments: int = 80) -> Dict[str, Any]:
+    pr = raw["pr"]
+    files = raw.get("files")
+    commits = raw.get("commits")
+    reviews = raw.get("reviews")
+    review_comments = raw.get("review_comments")
+    issue_comments = raw.get("issue_comments")
     if not isinstance(files, list):
         files = []
     if not isinstance(commits, list):
@@ -498,16 +2013,26 @@ def fetch_pr_bundle(repo: str, number: int, max_comments: int = 80) -> Dict[str,
             }
             for c in issue_comments[:max_comments]
         ],
-        "api_counts": {
-            "files": len(files),
-            "commits": len(commits),
-            "reviews": len(reviews),
-            "review_comments": len(review_comments),
-            "issue_comments": len(issue_comments),
-        },
+        "api_counts": _api_counts(raw, {"files": files, "commits": commits, "reviews": reviews,
+                                        "review_comments": review_comments, "issue_comments": issue_comments}),
     }
 
 
+def _api_counts(raw: Dict[str, Any], lists: Dict[str, List[Any]]) -> Dict[str, Any]:
+    """GitHub's total per list where known (else the number fetched), plus which lists were cut short."""
+    totals = raw.get("_totals") or {}
+    exhausted = raw.get("_exhausted") or {}
+    counts: Dict[str, Any] = {}
+    truncated = []
+    for key, items in lists.items():
+        total = totals.get(key)
+        counts[key] = total if total is not None else len(items)
+        if (total is not None and len(items) < total) or exhausted.get(key) is False:
+            truncated.append(key)
+    counts["truncated"] = truncated
+    return counts
+
+
 def associated_prs_for_commit(repo: str, sha: str) -> List[Dict[str, Any]]:
     try:
         res = gh_api(f"repos/{repo}/commits/{sha}/pulls", repo, paginate=True)
@@ -532,6 +2057,62 @@ def associated_prs_for_commit(repo: str, sha: str) -> List[Dict[str, Any]]:
     return [x for x in out if x.get("number")]
 
 
+GRAPHQL_COMMIT_BATCH = 50
+
+
+def associated_prs_for_commits(repo: str, shas: Sequence[str], cache: Optional[GitObjectCache] = None) -> Dict[str, List[Dict[str, Any]]]:
+    """Batched associated_prs_for_commit: many commits per aliased GraphQL `object(oid:)` query.
+
+    Associations that include a merged PR cannot change any more, so they are
+    memoized in `cache` across invocations. Commits the GraphQL lookup could not
+    resolve fall back to the per-SHA REST endpoint.
+    """
+    owner, _, name = repo.partition("/")
+    results: Dict[str, List[Dict[str, Any]]] = {}
+    pending: List[str] = []
+    for sha in unique_preserve(shas):
+        hit = cache.get("commit_prs", sha, repo) if cache is not None else _MISS
+        if hit is not _MISS:
+            results[sha] = hit
+        elif SHA_RE.match(sha):
+            pending.append(sha)
+    node_fields = "associatedPullRequests(first: 20) { nodes { number title url state mergedAt } }"
+    for i in range(0, len(pending), GRAPHQL_COMMIT_BATCH):
+        chunk = pending[i:i + GRAPHQL_COMMIT_BATCH]
+        aliases = " ".join(f'c{j}: object(oid: "{sha}") {{ ... on Commit {{ {node_fields} }} }}' for j, sha in enumerate(chunk))
+        query = "query($owner: String!, $name: String!) { repository(owner: $owner, name: $name) { " + aliases + " } }"
+        try:
+            repo_data = gh_graphql(query, {"owner": owner, "name": name})["data"].get("repository") or {}
+        except Exception as ex:
+            eprint(f"warning: batched commit→PR lookup failed; falling back to per-commit REST: {ex}")
+            continue
+        for j, sha in enumerate(chunk):
+            node = repo_data.get(f"c{j}")
+            if not node or "associatedPullRequests" not in node:
+                continue
+            prs = []
+            for pr in (node["associatedPullRequests"] or {}).get("nodes") or []:
+                if not pr or not pr.get("number"):
+                    continue
+                state = (pr.get("state") or "").lower()
+                prs.append({
+                    "number": pr.get("number"),
+                    "title": pr.get("title"),
+                    "url": pr.get("url"),
+                    "state": "closed" if state == "merged" else state,
+                    "merged_at": pr.get("mergedAt"),
+                    "relation": "exact_commit_association",
+                    "source_commit": sha,
+                })
+            results[sha] = prs
+            if cache is not None and any(pr.get("merged_at") for pr in prs):
+                cache.put("commit_prs", sha, prs, repo)
+    for sha in unique_preserve(shas):
+        if sha not in results:
+            results[sha] = associated_prs_for_commit(repo, sha)
+    return results
+
+
 def build_candidate_search_queries(repo: str, path: str, symbols: Sequence[str], keywords: Sequence[str]) -> List[str]:
     terms: List[str] = []
     base = Path(path).name if path else ""
@@ -554,6 +2135,7 @@ def score_pr_bundle(
     keywords: Sequence[str],
     seed_commit_patches: Dict[str, List[str]],
     exact_sources: Sequence[str],
+    hunk_index: Optional[HunkSimilarityIndex] = None,
 ) -> Dict[str, Any]:
     reasons: List[str] = []
     warnings: List[str] = []
@@ -573,14 +2155,10 @@ def score_pr_bundle(
     if any(GENERATED_PATH_RE.search(p or "") for p in all_paths):
         warnings.append("generated/vendor/lock-file path present; downweight if this is not the true API surface")
 
-    body_text = " ".join([
-        bundle.get("title") or "",
-        bundle.get("body") or "",
-        " ".join(r.get("body") or "" for r in bundle.get("reviews", [])),
-        " ".join(c.get("body") or "" for c in bundle.get("review_comments", [])),
-        " ".join(c.get("body") or "" for c in bundle.get("issue_comments", [])),
-    ])
-    body_tokens = token_set(body_text)
+    annotate_comments(bundle)
+    discussion = bundle.get("reviews", []) + bundle.get("review_comments", []) + bundle.get("issue_comments", [])
+    head_text = (bundle.get("title") or "") + " " + (bundle.get("body") or "")
+    body_tokens = token_set(head_text).union(*(c["_tokens"] for c in discussion))
     query_tokens = {x.lower() for x in list(symbols) + list(keywords) if len(x) >= 3}
     semantic_overlap = len(body_tokens & query_tokens)
     if semantic_overlap:
@@ -588,8 +2166,7 @@ def score_pr_bundle(
         score += bump
         reasons.append(f"discussion/title/body matches {semantic_overlap} query token(s)")
 
-    risky_hits = RISKY_WORDS.findall(body_text)
-    if risky_hits:
+    if RISKY_WORDS.search(head_text) or any(c["_risky"] for c in discussion):
         score += 0.08
         reasons.append("discussion contains risk/constraint language")
 
@@ -597,13 +2174,9 @@ def score_pr_bundle(
     for f in bundle.get("files", []):
         if f.get("patch"):
             pr_patch_lines.extend(normalize_patch_lines(f["patch"]))
-    best_hunk = 0.0
-    best_sha = None
-    for sha, lines in seed_commit_patches.items():
-        sim = jaccard(lines, pr_patch_lines)
-        if sim > best_hunk:
-            best_hunk = sim
-            best_sha = sha
+    if hunk_index is None:
+        hunk_index = HunkSimilarityIndex(seed_commit_patches)
+    best_hunk, best_sha = hunk_index.best_match(pr_patch_lines)
     if best_hunk >= 0.65:
         score += 0.55
         relation = "probable_squash_or_patch_equivalent"
@@ -627,6 +2200,8 @@ def score_pr_bundle(
 
     if bundle.get("api_counts", {}).get("files", 0) >= 3000:
         warnings.append("PR files may be incomplete because GitHub PR file listing can be capped")
+    elif "files" in bundle.get("api_counts", {}).get("truncated", []):
+        warnings.append("PR file listing stopped at the target path; patches of later files are incomplete")
     if any((f.get("patch") is None and f.get("changes", 0)) for f in bundle.get("files", [])):
         warnings.append("one or more file patches are absent; patch evidence may be incomplete")
 
@@ -650,53 +2225,41 @@ def score_pr_bundle(
 
 def select_relevant_comments(bundle: Dict[str, Any], path: str, symbols: Sequence[str], keywords: Sequence[str], max_items: int) -> List[Dict[str, Any]]:
     qtokens = {t.lower() for t in list(symbols) + list(keywords) if len(t) >= 3}
-    items: List[Tuple[float, Dict[str, Any]]] = []
+    items: List[Tuple[float, str, Dict[str, Any]]] = []
+    annotate_comments(bundle)
 
-    def score_text(text: str, extra: float = 0.0) -> float:
-        toks = token_set(text)
-        score = extra + 0.05 * len(toks & qtokens)
-        if RISKY_WORDS.search(text or ""):
+    def score_comment(c: Dict[str, Any], extra: float = 0.0, hunk: bool = False) -> float:
+        hits = len(c["_tokens"] & qtokens) if not hunk else len((c["_tokens"] | c["_hunk_tokens"]) & qtokens)
+        score = extra + 0.05 * hits
+        if c["_risky"] or (hunk and c["_hunk_risky"]):
             score += 0.2
         return score
 
     for c in bundle.get("review_comments", []):
         extra = 0.25 if c.get("path") == path else 0.0
-        s = score_text((c.get("body") or "") + " " + (c.get("diff_hunk") or ""), extra)
+        s = score_comment(c, extra, hunk=True)
         if s > 0 or c.get("path") == path:
-            items.append((s, {"kind": "review_comment", **c}))
+            items.append((s, "review_comment", c))
     for c in bundle.get("issue_comments", []):
-        s = score_text(c.get("body") or "")
+        s = score_comment(c)
         if s > 0:
-            items.append((s, {"kind": "issue_comment", **c}))
+            items.append((s, "issue_comment", c))
     for r in bundle.get("reviews", []):
-        s = score_text(r.get("body") or "")
+        s = score_comment(r)
         if s > 0:
-            items.append((s, {"kind": "review", **r}))
+            items.append((s, "review", r))
     items.sort(key=lambda x: x[0], reverse=True)
-    return [x[1] for x in items[:max_items]]
+    # The cached `_atom` rides along for infer_decision_atoms; strip it with public_fields().
+    return [{"kind": kind, **public_fields(c), "_atom": comment_atom(c)} for _, kind, c in items[:max_items]]
 
 
 def infer_decision_atoms(comments: Sequence[Dict[str, Any]], pr_number: int, path: str, symbols: Sequence[str]) -> List[Dict[str, Any]]:
     atoms = []
-    patterns = [
-        ("compatibility_constraint", re.compile(r"compat|legacy|backwards?|breaking", re.I)),
-        ("security_invariant", re.compile(r"security|auth|permission|leak|secret|injection", re.I)),
-        ("performance_constraint", re.compile(r"perf|performance|alloc|allocation|hot path|latency", re.I)),
-        ("concurrency_invariant", re.compile(r"race|deadlock|lock|concurr|async|thread", re.I)),
-        ("rejected_approach", re.compile(r"reject|rejected|don'?t|do not|must not|avoid|not safe", re.I)),
-        ("test_requirement", re.compile(r"test|coverage|regression|flaky", re.I)),
-        ("known_bug_or_workaround", re.compile(r"workaround|known bug|hack|temporary|fix forward", re.I)),
-        ("constraint", re.compile(r"must|should|by design|invariant|required", re.I)),
-    ]
     for c in comments:
         body = c.get("body") or ""
         if not body:
             continue
-        matched = None
-        for typ, pat in patterns:
-            if pat.search(body):
-                matched = typ
-                break
+        matched = c["_atom"] if "_atom" in c else classify_atom(body)
         if not matched:
             continue
         claim = compact_text(body, 220)
@@ -719,10 +2282,255 @@ def infer_decision_atoms(comments: Sequence[Dict[str, Any]], pr_number: int, pat
     return atoms
 
 
+class FutureMemo:
+    """Thread-safe memo where concurrent askers for the same key wait on one computation.
+
+    Only successful, non-None results stay memoized: a lookup that raised or
+    came back empty (a timeout, a transient `gh` failure) is retried by the
+    next asker. With `max_entries`, the least recently used keys are dropped.
+    """
+
+    def __init__(self, max_entries: Optional[int] = None) -> None:
+        self.lock = threading.Lock()
+        self.max_entries = max_entries
+        self.futures: Dict[Tuple[str, Any], Future] = {}  # insertion order doubles as recency order
+
+    def get_many(self, kind: str, keys: Sequence[Any], compute: Callable[[List[Any]], Dict[Any, Any]], default: Any = None) -> Dict[Any, Any]:
+        """Return {key: value} for `keys`, computing only keys nobody has asked for yet.
+
+        Missing keys are computed together in one `compute(keys)` call; keys
+        another thread is already computing are waited on rather than repeated.
+        """
+        futures: Dict[Any, Future] = {}
+        mine: List[Any] = []
+        with self.lock:
+            for key in dict.fromkeys(keys):
+                fut = self.futures.pop((kind, key), None)
+                if fut is None:
+                    fut = Future()
+                    mine.append(key)
+                self.futures[(kind, key)] = futures[key] = fut
+            while self.max_entries is not None and len(self.futures) > self.max_entries:
+                del self.futures[next(iter(self.futures))]
+        PROFILE.count("shared_lookups", len(futures) - len(mine))
+        if mine:
+            try:
+                values = compute(mine)
+            except Exception as ex:
+                for key in mine:
+                    futures[key].set_exception(ex)
+            else:
+                for key in mine:
+                    futures[key].set_result(values.get(key, default))
+            with self.lock:
+                for key in mine:
+                    fut = futures[key]
+                    if (fut.exception() is not None or fut.result() is None) and self.futures.get((kind, key)) is fut:
+                        del self.futures[(kind, key)]
+        return {key: fut.result() for key, fut in futures.items()}
+
+
+class CatFilePool:
+    """Long-lived `git cat-file --batch` processes, checked out one request at a time.
+
+    Used by the daemon so object reads (index updates re-reading renamed
+    blobs) skip process startup. Registered per repository in CAT_FILE_POOLS.
+    """
+
+    def __init__(self, root: Path, size: int = 4):
+        self.root = root
+        self.size = size
+        self.idle: List[subprocess.Popen] = []
+        self.spawned = 0
+        self.cond = threading.Condition()
+
+    def _checkout(self) -> subprocess.Popen:
+        with self.cond:
+            while not self.idle and self.spawned >= self.size:
+                self.cond.wait()
+            if self.idle:
+                return self.idle.pop()
+            self.spawned += 1
+        cmd = ["git", "cat-file", "--batch"]
+        PROFILE.spawned(cmd)
+        return subprocess.Popen(cmd, cwd=str(self.root), stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+
+    def _checkin(self, proc: Optional[subprocess.Popen]) -> None:
+        with self.cond:
+            if proc is None:
+                self.spawned -= 1
+            else:
+                self.idle.append(proc)
+            self.cond.notify()
+
+    def read_many(self, specs: Sequence[str]) -> List[Optional[Tuple[str, bytes]]]:
+        """(object type, content) per spec, or None where the object is missing."""
+        proc: Optional[subprocess.Popen] = self._checkout()
+        try:
+            assert proc is not None and proc.stdin is not None and proc.stdout is not None
+            out: List[Optional[Tuple[str, bytes]]] = []
+            for spec in specs:
+                proc.stdin.write(f"{spec}\n".encode("utf-8"))
+                proc.stdin.flush()
+                header = proc.stdout.readline().split()
+                if len(header) != 3:
+                    if not header:
+                        raise OSError("git cat-file --batch exited")
+                    out.append(None)  # "<spec> missing" / "ambiguous"
+                    continue
+                data = proc.stdout.read(int(header[2]) + 1)[:-1]
+                out.append((header[1].decode(), data))
+            return out
+        except Exception:
+            if proc is not None:
+                proc.kill()
+                proc.wait()
+            proc = None
+            raise
+        finally:
+            self._checkin(proc)
+
+    def close(self) -> None:
+        with self.cond:
+            procs, self.idle = self.idle, []
+        for proc in procs:
+            proc.stdin.close()
+            proc.wait()
+
+
+CAT_FILE_POOLS: Dict[str, CatFilePool] = {}
+
+
+class RepoState:
+    """Warm per-repository state that `daemon serve` keeps across requests.
+
+    Holds the repository root, GitHub slugs, a periodically re-checked `gh`
+    authentication result, the object cache, an LRU-bounded memo of lookups on
+    immutable commits, the history index (updated in place when refs move) and
+    a pool of `git cat-file --batch` processes.
+    """
+
+    GH_RECHECK_SECONDS = 300
+    SHARED_MEMO_KINDS = frozenset({"commit", "patch_id"})
+    SHARED_MEMO_MAX_ENTRIES = 20000
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.lock = threading.Lock()
+        self.cache = GitObjectCache.for_repo(root)
+        self.memo = FutureMemo(self.SHARED_MEMO_MAX_ENTRIES)
+        self.slugs: Dict[Tuple[Optional[str], bool], Optional[str]] = {}
+        self.gh_checked: Optional[Tuple[float, bool]] = None
+        base = history_dir(root)
+        self.index_path = base / "index.sqlite" if base is not None else None
+        self._index: Optional[HistoryIndex] = None
+        self.cat_file = CAT_FILE_POOLS[str(root)] = CatFilePool(root)
+        self.started = time.time()
+        self.requests = 0
+
+    def slug(self, explicit: Optional[str], use_gh: bool) -> Optional[str]:
+        key = (explicit, use_gh)
+        with self.lock:
+            if key not in self.slugs:
+                self.slugs[key] = github_repo_slug(self.root, explicit, use_gh=use_gh)
+            return self.slugs[key]
+
+    def gh_available(self) -> bool:
+        with self.lock:
+            if self.gh_checked is None or time.time() - self.gh_checked[0] > self.GH_RECHECK_SECONDS:
+                code, _, _ = run_optional(["gh", "auth", "status"], cwd=self.root, timeout=20)
+                self.gh_checked = (time.time(), code == 0)
+            return self.gh_checked[1]
+
+    def index(self) -> Optional[HistoryIndex]:
+        """The history index, incrementally updated first if refs moved; None if never built."""
+        with self.lock:
+            if self._index is None and self.index_path is not None and self.index_path.exists():
+                self._index = HistoryIndex(self.root, self.index_path)
+            if self._index is not None and not self._index.is_fresh():
+                self._index.update()
+            return self._index
+
+    def close(self) -> None:
+        if self._index is not None:
+            self._index.close()
+        if self.cache is not None:
+            self.cache.prune()
+        self.cat_file.close()
+        CAT_FILE_POOLS.pop(str(self.root), None)
+
+
+class InspectContext:
+    """Work shared by every target of one `inspect` or `inspect-batch` run.
+
+    Resolves the repository, GitHub slug and `gh` authentication once, owns the
+    object cache and history index, and memoizes per-commit and per-PR lookups
+    so targets that share seed commits or candidate PRs pay for them once, even
+    while running in parallel. Under the daemon these come from its RepoState,
+    and lookups on immutable commits are memoized across requests.
+    """
+
+    def __init__(self, args: argparse.Namespace, batch: bool = False):
+        self.batch = batch
+        self.state: Optional[RepoState] = getattr(args, "state", None)
+        if self.state is None:
+            # PROFILE is process-wide; the daemon serves requests concurrently and never profiles them.
+            PROFILE.reset()
+        self._memo = FutureMemo()
+        if self.state is not None:
+            self.root = self.state.root
+            self.repo = self.state.slug(args.github_repo, use_gh=not args.no_gh)
+            self.gh_available = bool(self.repo) and not args.no_gh and self.state.gh_available()
+            self.cache = None if args.no_cache else self.state.cache
+            self.index = None if args.no_index else self.state.index()
+            return
+        self.root = repo_root(Path(args.repo_dir).resolve())
+        configure_http_cache(args, self.root)
+        self.repo = github_repo_slug(self.root, args.github_repo, use_gh=not args.no_gh and not args.replay)
+        self.gh_available = False
+        if self.repo and not args.no_gh:
+            if args.replay:
+                self.gh_available = True  # recorded responses stand in for GitHub
+            else:
+                code, _, _ = run_optional(["gh", "auth", "status"], cwd=self.root, timeout=20)
+                self.gh_available = code == 0
+        self.cache = None if args.no_cache else GitObjectCache.for_repo(self.root, args.cache_max_mb)
+        self.index = None if args.no_index else HistoryIndex.open_fresh(self.root)
+
+    def memo_many(self, kind: str, keys: Sequence[Any], compute: Callable[[List[Any]], Dict[Any, Any]], default: Any = None) -> Dict[Any, Any]:
+        shared = self.state is not None and kind in RepoState.SHARED_MEMO_KINDS
+        return (self.state.memo if shared else self._memo).get_many(kind, keys, compute, default)
+
+    def perf(self) -> Dict[str, Any]:
+        assert self.state is None, "--profile always runs locally"
+        perf = PROFILE.snapshot()
+        perf["cache"] = {"hits": self.cache.hits, "misses": self.cache.misses} if self.cache is not None else None
+        perf["rate_limit"] = gh_rate_limit() if self.repo and self.gh_available else None
+        return perf
+
+    def close(self) -> None:
+        if self.state is not None:
+            return  # the daemon owns the index and cache
+        if self.index is not None:
+            self.index.close()
+        if self.cache is not None:
+            self.cache.prune()
+
+
 def inspect(args: argparse.Namespace) -> Dict[str, Any]:
-    root = repo_root(Path(args.repo_dir).resolve())
+    ctx = InspectContext(args)
+    try:
+        report = inspect_target(args, ctx, getattr(args, "sink", None))
+    finally:
+        ctx.close()
+    if args.profile:
+        report["perf"] = ctx.perf()
+    return report
+
+
+def inspect_target(args: argparse.Namespace, ctx: InspectContext, sink: Optional[JsonlStream] = None) -> Dict[str, Any]:
+    root, repo, cache, index = ctx.root, ctx.repo, ctx.cache, ctx.index
     path = relpath(root, args.path)
-    repo = github_repo_slug(root, args.github_repo, use_gh=not args.no_gh)
     warnings: List[str] = []
     if GENERATED_PATH_RE.search(path):
         warnings.append("Target path looks generated/vendor/lock-like; downweight history unless it is the actual API surface.")
@@ -730,13 +2538,33 @@ def inspect(args: argparse.Namespace) -> Dict[str, Any]:
     keywords = extract_keywords(args.question or "", args.symbol or [])
     if args.keyword:
         keywords = unique_preserve(list(args.keyword) + keywords)
+    scope = {
+        "repo_dir": str(root),
+        "github_repo": repo,
+        "path": path,
+        "line_range": {"start": args.start, "end": args.end} if args.start is not None or args.end is not None else None,
+        "line_ranges": [{"start": lo, "end": hi} for lo, hi in args.line_range],
+        "symbols": args.symbol or [],
+        "question": args.question,
+        "keywords": keywords,
+    }
+    if sink is not None:
+        sink.emit_section("scope", scope)
 
-    blame, blame_warnings = blame_commits(root, path, args.start, args.end)
+    with PROFILE.stage("blame"):
+        blame, blame_warnings = blame_commits(root, path, args.start, args.end, args.line_range, args.blame_stop_after)
     warnings.extend(blame_warnings)
-    path_history = log_commits_for_path(root, path, args.max_commits)
-    pickaxe = pickaxe_commits(root, path, unique_preserve(list(args.symbol or []) + keywords), limit_per_token=5)
-    lineage = rename_lineage(root, path)
+    with PROFILE.stage("path_history"):
+        # One follow walk serves both path history and rename lineage when there is no index.
+        walk = None if index is not None else LineageWalk.run(root, path, max(args.max_commits, LINEAGE_LOG_LIMIT))
+        path_history = log_commits_for_path(root, path, args.max_commits, index, walk)
+    with PROFILE.stage("pickaxe"):
+        pickaxe = pickaxe_commits(root, path, unique_preserve(list(args.symbol or []) + keywords), limit_per_token=5, index=index)
+    with PROFILE.stage("lineage"):
+        lineage = rename_lineage(root, path, index=index, walk=walk)
     warnings.extend(lineage.get("warnings", []))
+    if sink is not None:
+        sink.emit_section("file_lineage", lineage)
 
     seed_reasons: Dict[str, List[str]] = defaultdict(list)
     for b in blame:
@@ -748,35 +2576,45 @@ def inspect(args: argparse.Namespace) -> Dict[str, Any]:
 
     seed_shas = list(seed_reasons.keys())[: args.max_commits]
     seed_commits = []
-    for sha in seed_shas:
-        summ = git_commit_summary(root, sha)
-        summ["reasons"] = seed_reasons[sha]
-        summ["changed_files"] = git_changed_files(root, sha)[:30]
-        summ["patch_id"] = git_patch_id(root, sha)
-        seed_commits.append(summ)
-
-    seed_commit_patches = {sha: normalize_patch_lines(git_patch(root, sha, path)) for sha in seed_shas[:20]}
+    with PROFILE.stage("seed_enrichment"):
+        batch = ctx.memo_many("commit", seed_shas, lambda shas: git_commit_batch(root, shas, cache))
+        patch_ids = ctx.memo_many("patch_id", seed_shas, lambda shas: git_patch_ids(root, shas, cache))
+        for sha in seed_shas:
+            meta = batch.get(sha)
+            summ = dict(meta["summary"]) if meta else git_commit_summary(root, sha, cache)
+            summ["reasons"] = seed_reasons[sha]
+            summ["changed_files"] = (meta["changed_files"] if meta else git_changed_files(root, sha, cache))[:30]
+            summ["patch_id"] = patch_ids[sha]
+            seed_commits.append(summ)
+            if sink is not None:
+                sink.emit("seed_commit", summ)
+
+        seed_commit_patches = {sha: normalize_patch_lines(git_patch(root, sha, path, cache)) for sha in seed_shas[:20]}
+        hunk_index = HunkSimilarityIndex(seed_commit_patches)
 
     pr_sources: Dict[int, List[str]] = defaultdict(list)
     pr_seed_relation: Dict[int, List[Dict[str, Any]]] = defaultdict(list)
-    gh_available = False
+    gh_available = ctx.gh_available
     if repo and not args.no_gh:
-        code, _, _ = run_optional(["gh", "auth", "status"], cwd=root, timeout=20)
-        gh_available = code == 0
         if not gh_available:
             warnings.append("gh is not authenticated or unavailable; GitHub PR evidence was not fetched.")
     elif not repo and not args.no_gh:
         warnings.append("Could not determine GitHub OWNER/REPO; pass --github-repo OWNER/REPO for PR evidence.")
 
     if repo and gh_available:
-        for sha in seed_shas[: args.max_commit_pr_lookups]:
-            for pr in associated_prs_for_commit(repo, sha):
+        lookup_shas = seed_shas[: args.max_commit_pr_lookups]
+        with PROFILE.stage("pr_association"):
+            associations = ctx.memo_many("commit_prs", lookup_shas, lambda shas: associated_prs_for_commits(repo, shas, cache), default=[])
+        for sha in lookup_shas:
+            for pr in associations[sha]:
                 pr_sources[int(pr["number"])].append(sha)
                 pr_seed_relation[int(pr["number"])].append(pr)
 
         # Search fallback for squash/lost PRs. Keep small for context and rate limits.
         for q in build_candidate_search_queries(repo, path, args.symbol or [], keywords)[: args.max_search_queries]:
-            for item in gh_search_issues(repo, q, per_page=args.search_per_page):
+            with PROFILE.stage("search"):
+                items = ctx.memo_many("search", [q], lambda qs: {qs[0]: gh_search_issues(repo, qs[0], per_page=args.search_per_page)})[q]
+            for item in items:
                 n = item.get("number") or pr_number_from_url(item.get("html_url", ""))
                 if n:
                     pr_seed_relation[int(n)].append({
@@ -793,16 +2631,38 @@ def inspect(args: argparse.Namespace) -> Dict[str, Any]:
     decision_atoms: List[Dict[str, Any]] = []
     relevant_comments_by_pr: Dict[str, Any] = {}
     if repo and gh_available:
+        fetch_bundles = fetch_pr_bundles_graphql if args.transport == "graphql" else fetch_pr_bundles
+        # A bundle shared across batch targets needs the full file listing, not one cut off at this path.
+        bundle_path = None if ctx.batch else path
+        with PROFILE.stage("bundle_fetch"):
+            fetched = ctx.memo_many(
+                "bundle",
+                candidate_numbers,
+                lambda ns: {
+                    n: annotate_comments(b) if isinstance(b, dict) else b
+                    for n, b in fetch_bundles(repo, ns, max_comments=args.max_comments, jobs=args.jobs, path=bundle_path).items()
+                },
+            )
         for n in candidate_numbers:
             try:
-                bundle = fetch_pr_bundle(repo, n, max_comments=args.max_comments)
-                bundle["_exact_commit_sources"] = pr_sources.get(n, [])
-                s = score_pr_bundle(bundle, path, args.symbol or [], keywords, seed_commit_patches, pr_sources.get(n, []))
-                comments = select_relevant_comments(bundle, path, args.symbol or [], keywords, max_items=args.max_comments_per_pr)
+                bundle = fetched[n]
+                if isinstance(bundle, Exception):
+                    raise bundle
+                if bundle is None:
+                    raise RuntimeError("no bundle returned")
+                bundle = dict(bundle, _exact_commit_sources=pr_sources.get(n, []))
+                with PROFILE.stage("scoring"):
+                    s = score_pr_bundle(bundle, path, args.symbol or [], keywords, seed_commit_patches, pr_sources.get(n, []), hunk_index)
+                    comments = select_relevant_comments(bundle, path, args.symbol or [], keywords, max_items=args.max_comments_per_pr)
+                    atoms = infer_decision_atoms(comments, n, path, args.symbol or [])
+                comments = [public_fields(c) for c in comments]
                 relevant_comments_by_pr[str(n)] = comments
-                atoms = infer_decision_atoms(comments, n, path, args.symbol or [])
                 decision_atoms.extend(atoms)
                 scored.append(s)
+                if sink is not None:
+                    sink.emit("relevant_pr", dict(s, relevant_comments=comments))
+                    for atom in atoms:
+                        sink.emit("decision_atom", atom)
                 # Keep a compact form only.
                 bundle_compact = {k: bundle[k] for k in ["number", "title", "body", "state", "merged_at", "merge_commit_sha", "author", "url", "base", "head", "api_counts"]}
                 bundle_compact["files"] = [
@@ -849,15 +2709,7 @@ def inspect(args: argparse.Namespace) -> Dict[str, Any]:
     report: Dict[str, Any] = {
         "schema_version": "1.0",
         "generated_at": datetime.now(tz=timezone.utc).isoformat(),
-        "scope": {
-            "repo_dir": str(root),
-            "github_repo": repo,
-            "path": path,
-            "line_range": {"start": args.start, "end": args.end} if args.start is not None or args.end is not None else None,
-            "symbols": args.symbol or [],
-            "question": args.question,
-            "keywords": keywords,
-        },
+        "scope": scope,
         "evidence_completeness": evidence_completeness,
         "seed_commits": seed_commits[: args.max_commits],
         "file_lineage": lineage,
@@ -872,10 +2724,83 @@ def inspect(args: argparse.Namespace) -> Dict[str, Any]:
         },
         "unknowns": unique_preserve(warnings)[:20],
     }
+    if sink is not None:
+        sink.emit_section("risk", report["risk"])
     return report
 
 
+def load_batch_targets(source: str) -> List[Dict[str, Any]]:
+    """Read inspect-batch targets from a JSON array or JSON Lines file (`-` for stdin)."""
+    text = sys.stdin.read() if source == "-" else Path(source).read_text(encoding="utf-8")
+    stripped = text.strip()
+    if stripped.startswith("["):
+        targets = json.loads(stripped)
+    else:
+        targets = [json.loads(line) for line in stripped.splitlines() if line.strip()]
+    for t in targets:
+        if not isinstance(t, dict) or not t.get("path"):
+            raise ValueError(f"each batch target needs a `path`: {t!r}")
+    return targets
+
+
+def _target_range(value: Any) -> Tuple[int, int]:
+    if isinstance(value, dict):
+        value = f"{value.get('start')},{value.get('end')}"
+    elif isinstance(value, (list, tuple)):
+        value = ",".join(str(v) for v in value)
+    return parse_line_range(str(value))
+
+
+def batch_target_args(args: argparse.Namespace, target: Dict[str, Any]) -> argparse.Namespace:
+    """Per-target copy of the batch options, shaped like `inspect` arguments."""
+    t = argparse.Namespace(**vars(args))
+    t.path = target["path"]
+    t.start = target.get("start")
+    t.end = target.get("end")
+    t.line_range = [_target_range(r) for r in target.get("line_ranges", [])]
+    t.symbol = list(target.get("symbols", []))
+    t.keyword = list(target.get("keywords", []))
+    t.question = target.get("question") or ""
+    return t
+
+
+def inspect_batch(args: argparse.Namespace) -> Dict[str, Any]:
+    targets = [batch_target_args(args, t) for t in load_batch_targets(args.targets)]
+    ctx = InspectContext(args, batch=True)
+    sink: Optional[JsonlStream] = getattr(args, "sink", None)
+
+    def run_target(i: int) -> Dict[str, Any]:
+        try:
+            report = inspect_target(targets[i], ctx)
+        except Exception as ex:
+            report = {"scope": {"github_repo": ctx.repo, "path": targets[i].path}, "error": str(ex)}
+        if sink is not None:
+            sink.emit("report", dict(report, target=i))
+        return report
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, args.parallel)) as pool:
+            reports = list(pool.map(run_target, range(len(targets))))
+    finally:
+        ctx.close()
+    data: Dict[str, Any] = {
+        "schema_version": "1.0",
+        "generated_at": datetime.now(tz=timezone.utc).isoformat(),
+        "repo_dir": str(ctx.root),
+        "github_repo": ctx.repo,
+        "reports": reports,
+    }
+    if args.profile:
+        data["perf"] = ctx.perf()
+    return data
+
+
 def as_markdown(report: Dict[str, Any]) -> str:
+    if "reports" in report:
+        return "\n\n".join(
+            f"## History context report\n\nScope inspected: `{r['scope'].get('path')}` — failed: {r['error']}" if "error" in r else as_markdown(r)
+            for r in report["reports"]
+        )
     scope = report["scope"]
     lines = []
     lines.append("## History context report")
@@ -884,6 +2809,9 @@ def as_markdown(report: Dict[str, Any]) -> str:
     if scope.get("line_range"):
         lr = scope["line_range"]
         lines.append(f"Lines: {lr.get('start')}–{lr.get('end')}")
+    if scope.get("line_ranges"):
+        extra = ", ".join(f"{r.get('start')}–{r.get('end')}" for r in scope["line_ranges"])
+        lines.append(f"Additional line ranges: {extra}")
     if scope.get("symbols"):
         lines.append(f"Symbols: {', '.join(scope['symbols'])}")
     if scope.get("question"):
@@ -957,30 +2885,394 @@ def as_markdown(report: Dict[str, Any]) -> str:
         for u in report["unknowns"][:8]:
             lines.append(f"  - {u}")
     lines.append("")
+    perf = report.get("perf")
+    if perf:
+        lines.append("### Performance")
+        lines.append("")
+        lines.append(
+            f"Wall time {perf['wall_seconds']:.2f}s; {perf['git_processes']} git processes; {perf['gh_calls']} gh calls"
+            + (f"; cache {perf['cache']['hits']} hits / {perf['cache']['misses']} misses" if perf.get("cache") else "")
+        )
+        for name, st in perf["stages"].items():
+            lines.append(f"- `{name}`: {st['seconds']:.3f}s over {st['calls']} call(s)")
+        for name, rl in (perf.get("rate_limit") or {}).items():
+            lines.append(f"- GitHub `{name}` budget: {rl.get('remaining')}/{rl.get('limit')} remaining")
+        lines.append("")
     lines.append("Use this report as evidence input. The agent must still synthesize a final history note and avoid high-confidence claims from weak evidence.")
     return "\n".join(lines)
 
 
 def cmd_commit_prs(args: argparse.Namespace) -> Dict[str, Any]:
-    root = repo_root(Path(args.repo_dir).resolve())
-    repo = github_repo_slug(root, args.github_repo, use_gh=not getattr(args, "no_gh", False))
+    state: Optional[RepoState] = getattr(args, "state", None)
+    if state is not None:
+        root, cache = state.root, state.cache
+        repo = state.slug(args.github_repo, use_gh=not getattr(args, "no_gh", False))
+    else:
+        root = repo_root(Path(args.repo_dir).resolve())
+        configure_http_cache(args, root)
+        repo = github_repo_slug(root, args.github_repo, use_gh=not getattr(args, "no_gh", False) and not args.replay)
+        cache = GitObjectCache.for_repo(root)
     if not repo:
         raise SystemExit("Could not determine GitHub repo. Pass --github-repo OWNER/REPO.")
+    associations = associated_prs_for_commits(repo, args.commit, cache)
     out = []
     for sha in args.commit:
-        out.append({"commit": sha, "associated_prs": associated_prs_for_commit(repo, sha)})
+        out.append({"commit": sha, "associated_prs": associations.get(sha, [])})
     return {"github_repo": repo, "results": out}
 
 
 def cmd_lineage(args: argparse.Namespace) -> Dict[str, Any]:
-    root = repo_root(Path(args.repo_dir).resolve())
+    state: Optional[RepoState] = getattr(args, "state", None)
+    root = state.root if state is not None else repo_root(Path(args.repo_dir).resolve())
     path = relpath(root, args.path)
-    return {"repo_dir": str(root), "path": path, "file_lineage": rename_lineage(root, path, args.limit)}
+    if args.no_index:
+        index = None
+    else:
+        index = state.index() if state is not None else HistoryIndex.open_fresh(root)
+    try:
+        lineage = rename_lineage(root, path, args.limit, index)
+        sink: Optional[JsonlStream] = getattr(args, "sink", None)
+        if sink is not None:
+            sink.emit_section("file_lineage", lineage)
+        return {"repo_dir": str(root), "path": path, "file_lineage": lineage}
+    finally:
+        if index is not None and state is None:
+            index.close()
+
+
+def cmd_index(args: argparse.Namespace) -> Dict[str, Any]:
+    root = repo_root(Path(args.repo_dir).resolve())
+    index = HistoryIndex.open(root, create=True)
+    if index is None:
+        raise SystemExit("Could not locate the repository's git directory.")
+    try:
+        return index.build() if args.action == "build" else index.update()
+    finally:
+        index.close()
+
+
+DAEMON_METHODS = ("inspect", "commit-prs", "lineage")
+DAEMON_CONNECT_TIMEOUT = 2.0
+# JSON-RPC error codes: standard ones, plus one for "run it locally instead".
+RPC_PARSE_ERROR = -32700
+RPC_METHOD_NOT_FOUND = -32601
+RPC_INVALID_PARAMS = -32602
+RPC_COMMAND_FAILED = -32000
+RPC_WRONG_REPO = -32001
+
+
+def daemon_socket_path(base: Path) -> Path:
+    """`daemon.sock` in the history directory, or a per-user temp path when that is too long for AF_UNIX."""
+    path = base / "daemon.sock"
+    if len(str(path).encode("utf-8")) < 100:
+        return path
+    digest = hashlib.sha256(str(base).encode("utf-8")).hexdigest()[:16]
+    return Path(tempfile.gettempdir()) / f"history-context-{os.getuid()}-{digest}.sock"
+
+
+def daemon_socket_for(repo_dir: str) -> Optional[Path]:
+    """Socket path for the repository containing `repo_dir`, from one `git rev-parse`."""
+    code, out, _ = run_optional(["git", "rev-parse", "--git-common-dir"], cwd=Path(repo_dir), timeout=10)
+    if code != 0 or not out.strip():
+        return None
+    git_dir = Path(out.strip())
+    if not git_dir.is_absolute():
+        git_dir = Path(repo_dir).resolve() / git_dir
+    return daemon_socket_path(git_dir.resolve() / "history-context")
+
+
+def daemon_call(sock_path: Path, method: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    """Send one JSON-RPC request over the daemon socket; raises OSError if nobody is listening."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(DAEMON_CONNECT_TIMEOUT)
+        sock.connect(str(sock_path))
+        sock.settimeout(None)
+        with sock.makefile("rwb") as f:
+            f.write(json.dumps({"jsonrpc": "2.0", "id": 1, "method": method, "params": params}).encode("utf-8") + b"\n")
+            f.flush()
+            line = f.readline()
+    if not line:
+        raise ConnectionError("daemon closed the connection")
+    return json.loads(line)
+
+
+def _runs_locally(args: argparse.Namespace) -> bool:
+    """Options whose effect is per-process (timing, streaming, cache location) bypass the daemon."""
+    return bool(
+        getattr(args, "no_daemon", False)
+        or getattr(args, "stream", False)
+        or getattr(args, "profile", False)
+        or getattr(args, "replay", None)
+        or getattr(args, "http_cache", None)
+        or getattr(args, "no_http_cache", False)
+        or getattr(args, "http_cache_ttl", DEFAULT_HTTP_CACHE_TTL) != DEFAULT_HTTP_CACHE_TTL
+    )
+
+
+def try_daemon(args: argparse.Namespace, argv: Sequence[str]) -> Optional[Tuple[int, Any]]:
+    """Run the command in a running daemon: (exit code, data or error message), or None to run locally."""
+    if args.cmd not in DAEMON_METHODS or _runs_locally(args) or not hasattr(socket, "AF_UNIX"):
+        return None
+    sock_path = daemon_socket_for(args.repo_dir)
+    if sock_path is None or not sock_path.exists():
+        return None
+    try:
+        resp = daemon_call(sock_path, args.cmd, {"argv": list(argv[1:]), "cwd": os.getcwd()})
+    except (OSError, ValueError):
+        return None  # stale socket or daemon went away: fall back to a local run
+    if "result" in resp:
+        return 0, resp["result"]
+    err = resp.get("error") or {}
+    if err.get("code") != RPC_COMMAND_FAILED:
+        return None
+    return int((err.get("data") or {}).get("exit_code", 1)), err.get("message", "daemon request failed")
+
+
+class DaemonServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Threaded Unix-socket JSON-RPC server answering inspect / commit-prs / lineage for one repository."""
+
+    daemon_threads = True
+
+    def __init__(self, sock_path: Path, state: RepoState):
+        self.state = state
+        self.sock_path = sock_path
+        old_umask = os.umask(0o077)  # socket usable by this user only
+        try:
+            super().__init__(str(sock_path), DaemonHandler)
+        finally:
+            os.umask(old_umask)
+
+    def dispatch(self, req: Any) -> Dict[str, Any]:
+        rid = req.get("id") if isinstance(req, dict) else None
+
+        def error(code: int, message: str, exit_code: Optional[int] = None) -> Dict[str, Any]:
+            err: Dict[str, Any] = {"code": code, "message": message}
+            if exit_code is not None:
+                err["data"] = {"exit_code": exit_code}
+            return {"jsonrpc": "2.0", "id": rid, "error": err}
+
+        if not isinstance(req, dict):
+            return error(RPC_PARSE_ERROR, "request must be a JSON object")
+        method, params = req.get("method"), req.get("params") or {}
+        if method == "status":
+            return {"jsonrpc": "2.0", "id": rid, "result": self.status()}
+        if method == "shutdown":
+            threading.Thread(target=self.shutdown, daemon=True).start()
+            return {"jsonrpc": "2.0", "id": rid, "result": {"stopping": True}}
+        if method not in DAEMON_METHODS:
+            return error(RPC_METHOD_NOT_FOUND, f"unknown method {method!r}")
+        argv, cwd = params.get("argv"), params.get("cwd") or "."
+        if not isinstance(argv, list) or not all(isinstance(a, str) for a in argv):
+            return error(RPC_INVALID_PARAMS, "params.argv must be a list of strings")
+        try:
+            args = build_parser().parse_args([method, *argv])
+        except SystemExit:
+            return error(RPC_INVALID_PARAMS, f"invalid arguments for {method}")
+        if _runs_locally(args):
+            return error(RPC_INVALID_PARAMS, "per-process options (--profile, --stream, --replay, --http-cache*) must run locally")
+        try:
+            if repo_root((Path(cwd) / args.repo_dir).resolve()) != self.state.root:
+                return error(RPC_WRONG_REPO, f"this daemon serves {self.state.root}")
+        except CommandError as ex:
+            return error(RPC_WRONG_REPO, str(ex))
+        args.state, args.sink = self.state, None
+        with self.state.lock:
+            self.state.requests += 1
+        try:
+            return {"jsonrpc": "2.0", "id": rid, "result": args.func(args)}
+        except CommandError as ex:
+            return error(RPC_COMMAND_FAILED, str(ex), 2)
+        except subprocess.TimeoutExpired as ex:
+            return error(RPC_COMMAND_FAILED, f"Timed out running command: {ex.cmd}", 3)
+        except SystemExit as ex:
+            return error(RPC_COMMAND_FAILED, str(ex.code), 1)
+        except Exception as ex:
+            return error(RPC_COMMAND_FAILED, f"error: {ex}", 1)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "running": True,
+            "pid": os.getpid(),
+            "repo_dir": str(self.state.root),
+            "socket": str(self.sock_path),
+            "uptime_seconds": round(time.time() - self.state.started, 1),
+            "requests": self.state.requests,
+        }
+
+
+class DaemonHandler(socketserver.StreamRequestHandler):
+    """One connection: newline-delimited JSON-RPC requests, one response line each."""
+
+    def handle(self) -> None:
+        for line in self.rfile:
+            try:
+                req = json.loads(line)
+            except ValueError:
+                resp: Dict[str, Any] = {"jsonrpc": "2.0", "id": None, "error": {"code": RPC_PARSE_ERROR, "message": "invalid JSON"}}
+            else:
+                resp = self.server.dispatch(req)  # type: ignore[attr-defined]
+            self.wfile.write(json.dumps(resp, ensure_ascii=False).encode("utf-8") + b"\n")
+            self.wfile.flush()
+
+
+def _daemon_status(sock_path: Path) -> Optional[Dict[str, Any]]:
+    if not sock_path.exists():
+        return None
+    try:
+        return daemon_call(sock_path, "status", {}).get("result")
+    except (OSError, ValueError):
+        return None
+
+
+def cmd_daemon(args: argparse.Namespace) -> Dict[str, Any]:
+    if not hasattr(socket, "AF_UNIX"):
+        raise SystemExit("daemon mode needs Unix domain sockets.")
+    root = repo_root(Path(args.repo_dir).resolve())
+    base = history_dir(root)
+    if base is None:
+        raise SystemExit("Could not locate the repository's git directory.")
+    sock_path = daemon_socket_path(base)
+    status = _daemon_status(sock_path)
+    if args.action == "status":
+        return status or {"running": False, "repo_dir": str(root), "socket": str(sock_path)}
+    if args.action == "stop":
+        if status is None:
+            return {"running": False, "repo_dir": str(root)}
+        daemon_call(sock_path, "shutdown", {})
+        return {"running": False, "stopped_pid": status.get("pid"), "repo_dir": str(root)}
+    if status is not None:
+        return status
+    if args.action == "start":
+        base.mkdir(parents=True, exist_ok=True)
+        cmd = [sys.executable, str(Path(__file__).resolve()), "daemon", "serve", "--repo-dir", str(root)]
+        if args.http_cache:
+            cmd += ["--http-cache", str(Path(args.http_cache).resolve())]
+        if args.no_http_cache:
+            cmd.append("--no-http-cache")
+        cmd += ["--http-cache-ttl", str(args.http_cache_ttl)]
+        with open(base / "daemon.log", "ab") as log:
+            subprocess.Popen(cmd, cwd=str(root), stdin=subprocess.DEVNULL, stdout=log, stderr=log, start_new_session=True)
+        deadline = time.monotonic() + 15
+        while time.monotonic() < deadline:
+            status = _daemon_status(sock_path)
+            if status is not None:
+                return status
+            time.sleep(0.05)
+        raise SystemExit(f"daemon did not come up; see {base / 'daemon.log'}")
+    # serve: run in the foreground until `daemon stop` or SIGTERM.
+    if sock_path.exists():
+        sock_path.unlink()  # stale: nothing answered above
+    base.mkdir(parents=True, exist_ok=True)
+    configure_http_cache(args, root)
+    state = RepoState(root)
+    server = DaemonServer(sock_path, state)
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown, daemon=True).start())
+    eprint(f"history_context daemon serving {root} on {sock_path}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        try:
+            sock_path.unlink()
+        except OSError:
+            pass
+        state.close()
+    return {"running": False, "repo_dir": str(root), "requests": state.requests}
+
+
+# Report keys that become one JSON Lines record per list item, and the record type used.
+JSONL_LIST_RECORDS = {
+    "seed_commits": "seed_commit",
+    "relevant_prs": "relevant_pr",
+    "decision_atoms": "decision_atom",
+    "results": "commit_prs",
+    "reports": "report",
+}
+# Report keys written as records; everything else goes into the closing `summary` record.
+JSONL_SECTIONS = ("scope", "file_lineage", "seed_commits", "relevant_prs", "decision_atoms", "risk", "results", "reports")
+
+
+def _section_records(key: str, value: Any) -> List[Dict[str, Any]]:
+    if key == "file_lineage":
+        return [{"record": "rename", **r} for r in value.get("renames", [])]
+    if key in JSONL_LIST_RECORDS:
+        return [{"record": JSONL_LIST_RECORDS[key], **item} for item in value]
+    return [{"record": key, **value}] if isinstance(value, dict) else []
+
+
+def _summary_record(data: Dict[str, Any]) -> Dict[str, Any]:
+    summary: Dict[str, Any] = {"record": "summary"}
+    for key, value in data.items():
+        if key == "file_lineage":
+            summary["lineage_warnings"] = value.get("warnings", [])
+        elif key == "relevant_prs":
+            summary["ranked_prs"] = [p.get("number") for p in value]
+        elif key not in JSONL_SECTIONS and key != "relevant_comments_by_pr":
+            summary[key] = value
+    return summary
+
+
+def jsonl_records(data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Flatten a report into JSON Lines records tagged by `record`, ending with a `summary` record."""
+    comments = data.get("relevant_comments_by_pr") or {}
+    out: List[Dict[str, Any]] = []
+    for key in JSONL_SECTIONS:
+        if key not in data:
+            continue
+        records = _section_records(key, data[key])
+        if key == "relevant_prs":
+            records = [dict(r, relevant_comments=comments.get(str(r.get("number")), [])) for r in records]
+        out.extend(records)
+    out.append(_summary_record(data))
+    return out
+
+
+class JsonlStream:
+    """`--format jsonl --stream`: write report records as soon as each stage produces them.
+
+    `relevant_pr` and `decision_atom` records are written per candidate as it is
+    scored; the terminating `summary` record carries the final `ranked_prs`
+    order (after the --max-prs cut) and every report key not streamed.
+    """
+
+    def __init__(self, out: TextIO, close: bool = False):
+        self.out = out
+        self.close_out = close
+        self.lock = threading.Lock()
+
+    @classmethod
+    def for_args(cls, args: argparse.Namespace) -> Optional["JsonlStream"]:
+        if getattr(args, "format", None) != "jsonl" or not getattr(args, "stream", False):
+            return None
+        if getattr(args, "output", None):
+            return cls(open(args.output, "w", encoding="utf-8"), close=True)
+        return cls(sys.stdout)
+
+    def emit(self, kind: str, record: Dict[str, Any]) -> None:
+        line = json.dumps({"record": kind, **record}, ensure_ascii=False)
+        with self.lock:
+            self.out.write(line + "\n")
+            self.out.flush()
+
+    def emit_section(self, key: str, value: Any) -> None:
+        for record in _section_records(key, value):
+            self.emit(record.pop("record"), record)
+
+    def finish(self, data: Dict[str, Any], args: argparse.Namespace) -> None:
+        summary = _summary_record(data)
+        summary.pop("record")
+        self.emit("summary", summary)
+        if self.close_out:
+            self.out.close()
+            eprint(f"wrote {args.output}")
 
 
 def write_output(data: Dict[str, Any], args: argparse.Namespace) -> None:
     fmt = getattr(args, "format", "json")
-    text = as_markdown(data) if fmt == "markdown" else json_dump(data)
+    if fmt == "jsonl":
+        text = "\n".join(json.dumps(r, ensure_ascii=False) for r in jsonl_records(data))
+    else:
+        text = as_markdown(data) if fmt == "markdown" else json_dump(data)
     if getattr(args, "output", None):
         Path(args.output).write_text(text, encoding="utf-8")
         eprint(f"wrote {args.output}")
@@ -999,27 +3291,50 @@ def build_parser() -> argparse.ArgumentParser:
     common = argparse.ArgumentParser(add_help=False)
     common.add_argument("--repo-dir", default=".", help="Local git repository directory to inspect.")
     common.add_argument("--github-repo", help="GitHub slug OWNER/REPO. Auto-detected via gh or origin remote if omitted.")
-    common.add_argument("--format", choices=["json", "markdown"], default="json", help="Output format.")
+    common.add_argument("--format", choices=["json", "markdown", "jsonl"], default="json", help="Output format. `jsonl` writes one record per line, tagged by `record` and ending with a `summary` record.")
+    common.add_argument("--stream", action="store_true", help="With --format jsonl, write each stage's records as soon as they are available (inspect, lineage; inspect-batch writes each report as its target finishes).")
     common.add_argument("--output", help="Write output to this file instead of stdout.")
-
-    i = sub.add_parser("inspect", parents=[common], help="Inspect code provenance for a path/line/symbol/question.")
+    common.add_argument("--no-daemon", action="store_true", help="Run in this process even if a `daemon` is serving the repository.")
+
+    http = argparse.ArgumentParser(add_help=False)
+    http.add_argument("--http-cache", metavar="DIR", help="GitHub response cache directory (default: history-context/http under the repository's git directory).")
+    http.add_argument("--http-cache-ttl", type=int, default=DEFAULT_HTTP_CACHE_TTL, help="Seconds a cached response is served without revalidation; older entries are revalidated by ETag.")
+    http.add_argument("--no-http-cache", action="store_true", help="Do not keep our own response cache; rely on `gh --cache` only.")
+    http.add_argument("--replay", metavar="DIR", help="Serve every GitHub response from this recorded cache/fixture directory and never call GitHub.")
+
+    analysis = argparse.ArgumentParser(add_help=False)
+    analysis.add_argument("--blame-stop-after", type=int, help=f"Stop blame once this many commits each own >= {BLAME_STOP_MIN_LINES} lines (faster on huge ranges; counts become partial).")
+    analysis.add_argument("--max-commits", type=int, default=30, help="Maximum seed commits to summarize.")
+    analysis.add_argument("--max-prs", type=int, default=12, help="Maximum PR candidates to include.")
+    analysis.add_argument("--max-comments", type=int, default=80, help="Maximum raw comments to fetch per PR endpoint before compacting.")
+    analysis.add_argument("--max-comments-per-pr", type=int, default=6, help="Maximum selected relevant comments per PR in output.")
+    analysis.add_argument("--max-commit-pr-lookups", type=int, default=20, help="Maximum seed commits for exact commit→PR lookup.")
+    analysis.add_argument("--max-search-queries", type=int, default=8, help="Maximum GitHub issue-search queries for fuzzy PR candidates.")
+    analysis.add_argument("--search-per-page", type=int, default=10, help="Search results per query.")
+    analysis.add_argument("--no-gh", action="store_true", help="Skip GitHub CLI calls and return local Git evidence only.")
+    analysis.add_argument("--transport", choices=["rest", "graphql"], default="rest", help="How to fetch PR bundles: six REST endpoints per PR, or batched aliased GraphQL queries plus the REST files endpoint.")
+    analysis.add_argument("--jobs", type=int, default=DEFAULT_GH_JOBS, help="Maximum concurrent `gh` calls when fetching PR bundles.")
+    analysis.add_argument("--no-index", action="store_true", help="Ignore the local history index even when it is fresh.")
+    analysis.add_argument("--profile", action="store_true", help="Add a `perf` section: per-stage wall time and calls, git/gh process counts, cache hits, remaining rate limit.")
+    analysis.add_argument("--no-cache", action="store_true", help="Do not read or write the per-commit cache under the repository's git directory.")
+    analysis.add_argument("--cache-max-mb", type=int, default=DEFAULT_CACHE_MAX_MB, help="Size bound for the per-commit cache; least-recently-used entries are evicted.")
+
+    i = sub.add_parser("inspect", parents=[common, http, analysis], help="Inspect code provenance for a path/line/symbol/question.")
     i.add_argument("--path", required=True, help="Repository-relative file path to inspect.")
     i.add_argument("--start", type=int, help="Start line for blame.")
     i.add_argument("--end", type=int, help="End line for blame.")
+    i.add_argument("--line-range", action="append", type=parse_line_range, default=[], metavar="START,END", help="Additional line range for blame. Repeatable; all ranges share one blame run.")
     i.add_argument("--symbol", action="append", default=[], help="Symbol/function/class/API name. Repeatable.")
     i.add_argument("--keyword", action="append", default=[], help="Additional keyword for pickaxe/search. Repeatable.")
     i.add_argument("--question", default="", help="Natural-language question/change being investigated.")
-    i.add_argument("--max-commits", type=int, default=30, help="Maximum seed commits to summarize.")
-    i.add_argument("--max-prs", type=int, default=12, help="Maximum PR candidates to include.")
-    i.add_argument("--max-comments", type=int, default=80, help="Maximum raw comments to fetch per PR endpoint before compacting.")
-    i.add_argument("--max-comments-per-pr", type=int, default=6, help="Maximum selected relevant comments per PR in output.")
-    i.add_argument("--max-commit-pr-lookups", type=int, default=20, help="Maximum seed commits for exact commit→PR lookup.")
-    i.add_argument("--max-search-queries", type=int, default=8, help="Maximum GitHub issue-search queries for fuzzy PR candidates.")
-    i.add_argument("--search-per-page", type=int, default=10, help="Search results per query.")
-    i.add_argument("--no-gh", action="store_true", help="Skip GitHub CLI calls and return local Git evidence only.")
     i.set_defaults(func=inspect)
 
-    c = sub.add_parser("commit-prs", parents=[common], help="List GitHub PRs associated with one or more commits.")
+    b = sub.add_parser("inspect-batch", parents=[common, http, analysis], help="Inspect many targets in one run, sharing git/GitHub lookups between them.")
+    b.add_argument("--targets", required=True, metavar="FILE", help="JSON array or JSON Lines of {path, start, end, line_ranges, symbols, keywords, question} objects; `-` reads stdin.")
+    b.add_argument("--parallel", type=int, default=4, help="Targets inspected concurrently.")
+    b.set_defaults(func=inspect_batch)
+
+    c = sub.add_parser("commit-prs", parents=[common, http], help="List GitHub PRs associated with one or more commits.")
     c.add_argument("--commit", action="append", required=True, help="Commit SHA. Repeatable.")
     c.add_argument("--no-gh", action="store_true", help="Skip `gh` for slug auto-detection; rely on `git remote` only.")
     c.set_defaults(func=cmd_commit_prs)
@@ -1027,17 +3342,39 @@ def build_parser() -> argparse.ArgumentParser:
     l = sub.add_parser("lineage", parents=[common], help="Show rename/copy lineage for a path.")
     l.add_argument("--path", required=True, help="Repository-relative file path.")
     l.add_argument("--limit", type=int, default=80, help="Maximum git log entries to inspect.")
+    l.add_argument("--no-index", action="store_true", help="Ignore the local history index even when it is fresh.")
     l.set_defaults(func=cmd_lineage)
 
+    x = sub.add_parser("index", parents=[common], help="Build or incrementally update the local commit-history index.")
+    x.add_argument("action", choices=["build", "update"], help="`build` re-indexes all history; `update` only adds commits newer than the indexed ref tips.")
+    x.set_defaults(func=cmd_index)
+
+    d = sub.add_parser("daemon", parents=[common, http], help="Keep a warm per-repository server that inspect, commit-prs and lineage use automatically.")
+    d.add_argument("action", choices=["start", "serve", "stop", "status"], help="`start` launches `serve` in the background; `serve` runs in the foreground.")
+    d.set_defaults(func=cmd_daemon)
+
     return p
 
 
 def main(argv: Optional[Sequence[str]] = None) -> int:
     parser = build_parser()
+    argv = list(sys.argv[1:] if argv is None else argv)
     args = parser.parse_args(argv)
     try:
+        served = try_daemon(args, argv)
+        if served is not None:
+            code, data = served
+            if code:
+                eprint(data)
+            else:
+                write_output(data, args)
+            return code
+        args.sink = JsonlStream.for_args(args)
         data = args.func(args)
-        write_output(data, args)
+        if args.sink is not None:
+            args.sink.finish(data, args)
+        else:
+            write_output(data, args)
         return 0
     except CommandError as ex:
         eprint(str(ex))
@@ -15,8 +15,10 @@ import json
 import os
 import re
 import shutil
+import socket
 import subprocess
 import sys
+import time
 import unittest
 from pathlib import Path
 
@@ -24,6 +26,10 @@ ROOT = Path(__file__).resolve().parent.parent
 SCRIPTS = ROOT / "scripts"
 REFERENCES = ROOT / "references"
 
+sys.path.insert(0, str(SCRIPTS))
+import compact_pr  # noqa: E402
+import history_context  # noqa: E402
+
 
 def run(cmd, cwd=None, timeout=60):
     return subprocess.run(
@@ -134,7 +140,7 @@ class TestScriptHelp(unittest.TestCase):
     def test_history_context_help(self):
         proc = run([sys.executable, str(SCRIPTS / "history_context.py"), "--help"])
         self.assertEqual(proc.returncode, 0)
-        for sub in ("inspect", "commit-prs", "lineage"):
+        for sub in ("inspect", "inspect-batch", "commit-prs", "lineage", "index", "daemon"):
             self.assertIn(sub, proc.stdout)
 
     def test_compact_pr_help(self):
@@ -221,6 +227,7 @@ class TestSmokeLocalOnly(unittest.TestCase):
                 "--repo-dir", str(self.tmpdir),
                 "--path", "src/foo.py",
                 "--start", "2", "--end", "4",
+                "--line-range", "5,5",
                 "--no-gh",
                 "--format", "markdown",
             ],
@@ -228,8 +235,127 @@ class TestSmokeLocalOnly(unittest.TestCase):
         )
         self.assertEqual(proc.returncode, 0)
         self.assertIn("History context report", proc.stdout)
+        self.assertIn("Additional line ranges: 5–5", proc.stdout)
         self.assertIn("Seed commits", proc.stdout)
 
+    def test_inspect_profile_reports_perf_section(self):
+        proc = run(
+            [
+                sys.executable, str(SCRIPTS / "history_context.py"), "inspect",
+                "--repo-dir", str(self.tmpdir),
+                "--path", "src/foo.py",
+                "--start", "2", "--end", "4",
+                "--symbol", "legacy",
+                "--no-gh",
+                "--profile",
+                "--format", "json",
+            ],
+            timeout=120,
+        )
+        self.assertEqual(proc.returncode, 0, f"non-zero exit:\n{proc.stderr}")
+        perf = json.loads(proc.stdout)["perf"]
+        for stage in ("blame", "path_history", "pickaxe", "lineage", "seed_enrichment"):
+            self.assertEqual(perf["stages"][stage]["calls"], 1)
+        self.assertGreater(perf["git_processes"], 3)
+        self.assertEqual(perf["gh_calls"], 0)
+        self.assertIsNone(perf["rate_limit"])
+        self.assertIn("hits", perf["cache"])
+
+    def test_inspect_jsonl_stream_matches_buffered_records(self):
+        def records(*extra):
+            proc = run(
+                [
+                    sys.executable, str(SCRIPTS / "history_context.py"), "inspect",
+                    "--repo-dir", str(self.tmpdir), "--path", "src/foo.py", "--start", "2", "--end", "4",
+                    "--no-gh", "--format", "jsonl", *extra,
+                ],
+                timeout=120,
+            )
+            self.assertEqual(proc.returncode, 0, f"non-zero exit:\n{proc.stderr}")
+            return [json.loads(line) for line in proc.stdout.splitlines()]
+
+        streamed = records("--stream")
+        self.assertEqual(streamed[0]["record"], "scope")
+        self.assertEqual(streamed[0]["path"], "src/foo.py")
+        self.assertEqual(streamed[-1]["record"], "summary")
+        self.assertIn("evidence_completeness", streamed[-1])
+        self.assertIn("seed_commit", {r["record"] for r in streamed})
+        self.assertEqual(sum(r["record"] == "risk" for r in streamed), 1)
+        buffered = records()
+        self.assertEqual(sorted(r["record"] for r in streamed), sorted(r["record"] for r in buffered))
+
+    def test_inspect_batch_shares_lookups_across_targets(self):
+        import tempfile
+        fd, targets = tempfile.mkstemp(suffix=".jsonl")
+        os.close(fd)
+        self.addCleanup(os.unlink, targets)
+        Path(targets).write_text(
+            json.dumps({"path": "src/foo.py", "start": 2, "end": 4}) + "\n"
+            + json.dumps({"path": "src/foo.py", "symbols": ["legacy"], "line_ranges": [[1, 2], "3,4"]}) + "\n",
+            encoding="utf-8",
+        )
+        proc = run(
+            [
+                sys.executable, str(SCRIPTS / "history_context.py"), "inspect-batch",
+                "--repo-dir", str(self.tmpdir), "--targets", targets, "--no-gh", "--no-cache", "--profile",
+            ],
+            timeout=120,
+        )
+        self.assertEqual(proc.returncode, 0, f"non-zero exit:\n{proc.stderr}")
+        data = json.loads(proc.stdout)
+        self.assertEqual([r["scope"]["path"] for r in data["reports"]], ["src/foo.py", "src/foo.py"])
+        self.assertEqual(data["reports"][1]["scope"]["symbols"], ["legacy"])
+        self.assertEqual(data["reports"][1]["scope"]["line_ranges"], [{"start": 1, "end": 2}, {"start": 3, "end": 4}])
+        self.assertTrue(all(r["seed_commits"] for r in data["reports"]))
+        self.assertGreater(data["perf"]["shared_lookups"], 0)
+        self.assertEqual(data["perf"]["stages"]["blame"]["calls"], 2)
+
+    @unittest.skipUnless(hasattr(socket, "AF_UNIX"), "daemon needs Unix sockets")
+    def test_daemon_serves_cli_requests_concurrently(self):
+        from concurrent.futures import ThreadPoolExecutor
+        script = [sys.executable, str(SCRIPTS / "history_context.py")]
+        daemon = [*script, "daemon", "--repo-dir", str(self.tmpdir)]
+        proc = run([*daemon, "start"], timeout=30)
+        self.assertEqual(proc.returncode, 0, proc.stderr)
+        self.addCleanup(run, [*daemon, "stop"], None, 30)
+        self.assertTrue(json.loads(proc.stdout)["running"])
+
+        inspect = [*script, "inspect", "--repo-dir", str(self.tmpdir), "--path", "src/foo.py", "--start", "2", "--end", "4", "--no-gh"]
+        served, local = run(inspect, timeout=60), run([*inspect, "--no-daemon"], timeout=60)
+        self.assertEqual(served.returncode, 0, served.stderr)
+        a, b = json.loads(served.stdout), json.loads(local.stdout)
+        a.pop("generated_at"), b.pop("generated_at")
+        self.assertEqual(a, b)
+
+        sock = history_context.daemon_socket_for(str(self.tmpdir))
+        params = {"argv": ["--repo-dir", str(self.tmpdir), "--path", "src/foo.py"], "cwd": str(self.tmpdir)}
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            responses = list(pool.map(lambda _: history_context.daemon_call(sock, "lineage", params), range(4)))
+        self.assertTrue(all(r["result"]["path"] == "src/foo.py" for r in responses))
+        self.assertEqual(history_context.daemon_call(sock, "nope", {})["error"]["code"], history_context.RPC_METHOD_NOT_FOUND)
+        profiled = {**params, "argv": [*params["argv"], "--profile"]}
+        rejected = history_context.daemon_call(sock, "inspect", profiled)["error"]
+        self.assertEqual(rejected["code"], history_context.RPC_INVALID_PARAMS)
+        self.assertIn("must run locally", rejected["message"])
+        status = json.loads(run([*daemon, "status"]).stdout)
+        self.assertEqual(status["requests"], 5)
+
+        run([*daemon, "stop"], timeout=30)
+        deadline = time.monotonic() + 5
+        while sock.exists() and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertFalse(json.loads(run([*daemon, "status"]).stdout)["running"])
+
+    def test_cat_file_pool_reads_objects_and_reports_missing(self):
+        pool = history_context.CatFilePool(self.tmpdir, size=2)
+        self.addCleanup(pool.close)
+        blob, missing = pool.read_many(["HEAD:src/foo.py", "HEAD:no/such/file"])
+        self.assertEqual(blob[0], "blob")
+        self.assertIn(b"def hello", blob[1])
+        self.assertIsNone(missing)
+        self.assertEqual(pool.read_many(["HEAD"])[0][0], "commit")
+        self.assertEqual(pool.spawned, 1)
+
     def test_commit_prs_subcommand_runs(self):
         """Regression: cmd_commit_prs used to crash on `args.no_gh` for non-inspect parsers."""
         proc = run(
@@ -250,6 +376,127 @@ class TestSmokeLocalOnly(unittest.TestCase):
         # or a clean RuntimeError, but never an AttributeError.
         self.assertNotIn("AttributeError", proc.stderr)
 
+    def test_inspect_replays_fixture_directory_offline(self):
+        import tempfile
+        fixtures = Path(tempfile.mkdtemp(prefix="rhi-replay-"))
+        self.addCleanup(shutil.rmtree, fixtures, True)
+        head = subprocess.run(["git", "rev-parse", "HEAD"], cwd=str(self.tmpdir), text=True,
+                              stdout=subprocess.PIPE, check=True).stdout.strip()
+        page = "@page=1&per_page=100"
+        responses = {
+            f"repos/o/r/commits/{head}/pulls": [{"number": 7, "title": "Guard legacy callers", "state": "closed",
+                                                 "merged_at": "2024-01-02T00:00:00Z", "html_url": "https://github.com/o/r/pull/7"}],
+            "repos/o/r/pulls/7": {"number": 7, "title": "Guard legacy callers", "body": "Keep int return for legacy callers.",
+                                  "state": "closed", "user": {"login": "dev"}, "changed_files": 1, "comments": 0,
+                                  "review_comments": 1, "commits": 1},
+            f"repos/o/r/pulls/7/files{page}": [{"filename": "src/foo.py", "status": "modified", "changes": 3,
+                                                "patch": "@@ -1,2 +1,5 @@\n def hello():\n+    # legacy compatibility check\n"}],
+            f"repos/o/r/pulls/7/commits{page}": [{"sha": head, "commit": {"message": "compat", "author": {"name": "T"}}}],
+            f"repos/o/r/pulls/7/reviews{page}": [],
+            f"repos/o/r/pulls/7/comments{page}": [{"id": 1, "path": "src/foo.py", "user": {"login": "rev"},
+                                                   "body": "Must keep this for backward compatibility."}],
+            f"repos/o/r/issues/7/comments{page}": [],
+        }
+        for name, body in responses.items():
+            target = fixtures / f"{name}.json"
+            target.parent.mkdir(parents=True, exist_ok=True)
+            target.write_text(json.dumps({"body": body}), encoding="utf-8")
+        proc = run(
+            [
+                sys.executable, str(SCRIPTS / "history_context.py"), "inspect",
+                "--repo-dir", str(self.tmpdir), "--path", "src/foo.py", "--start", "2", "--end", "4",
+                "--github-repo", "o/r", "--replay", str(fixtures), "--profile", "--format", "json",
+            ],
+            timeout=120,
+        )
+        self.assertEqual(proc.returncode, 0, f"non-zero exit:\n{proc.stderr}")
+        data = json.loads(proc.stdout)
+        self.assertEqual(data["perf"]["gh_calls"], 0)
+        self.assertEqual(data["relevant_prs"][0]["number"], 7)
+        self.assertEqual(data["relevant_prs"][0]["relation"], "exact_commit_association")
+        for comments in data["relevant_comments_by_pr"].values():
+            self.assertFalse([k for c in comments for k in c if k.startswith("_")])
+        self.assertTrue(any("--replay: no recorded response" in n for n in data["evidence_completeness"]["notes"] + [proc.stderr]))
+
+    def test_inspect_populates_git_object_cache(self):
+        cmd = [
+            sys.executable, str(SCRIPTS / "history_context.py"), "inspect",
+            "--repo-dir", str(self.tmpdir),
+            "--path", "src/foo.py",
+            "--start", "2", "--end", "4",
+            "--no-gh",
+            "--format", "json",
+        ]
+        first = run(cmd, timeout=120)
+        self.assertEqual(first.returncode, 0, first.stderr)
+        objects = self.tmpdir / ".git" / "history-context" / "objects"
+        self.assertTrue(any(objects.glob("*/*.json")), "expected cached commit entries under .git")
+        second = run(cmd, timeout=120)
+        self.assertEqual(second.returncode, 0, second.stderr)
+        self.assertEqual(json.loads(first.stdout)["seed_commits"], json.loads(second.stdout)["seed_commits"])
+
+    def test_commit_batch_matches_per_sha_lookups(self):
+        log = subprocess.run(["git", "log", "--format=%H"], cwd=str(self.tmpdir), text=True,
+                             stdout=subprocess.PIPE, check=True)
+        shas = log.stdout.split()
+        batch = history_context.git_commit_batch(self.tmpdir, shas)
+        self.assertEqual(sorted(batch), sorted(shas))
+        self.assertNotIn("0" * 40, history_context.git_commit_batch(self.tmpdir, shas + ["0" * 40]))
+        for sha in shas:
+            self.assertEqual(batch[sha]["summary"], history_context.git_commit_summary(self.tmpdir, sha))
+            self.assertEqual(batch[sha]["changed_files"], history_context.git_changed_files(self.tmpdir, sha))
+
+    def test_streaming_blame_multiple_ranges_and_early_stop(self):
+        blame, warnings = history_context.blame_commits(self.tmpdir, "src/foo.py", 1, 1, [(2, 3), (4, 5)])
+        self.assertEqual(warnings, [])
+        self.assertEqual(sum(r["line_count"] for r in blame), 5)
+        self.assertEqual([r["summary"] for r in blame], ["compat: enforce int return for legacy callers", "initial: add hello"])
+        self.assertEqual(blame[0]["paths"], ["src/foo.py"])
+
+        stopped, warnings = history_context.blame_commits(self.tmpdir, "src/foo.py", 1, 5, stop_after=1)
+        self.assertEqual(len(stopped), 1)
+        self.assertTrue(any("stopped early" in w for w in warnings))
+
+    def fake_git(self, script):
+        bin_dir = self.tmpdir / "fake-bin"
+        bin_dir.mkdir(exist_ok=True)
+        (bin_dir / "git").write_text("#!/bin/sh\n" + script, encoding="utf-8")
+        (bin_dir / "git").chmod(0o755)
+        return {"PATH": f"{bin_dir}{os.pathsep}{os.environ['PATH']}"}
+
+    def test_blame_watchdog_kills_silent_process_and_stderr_cannot_stall(self):
+        from unittest import mock
+        with mock.patch.dict(os.environ, self.fake_git("exec sleep 30\n")), \
+                mock.patch.object(history_context, "BLAME_TIMEOUT", 0.5):
+            started = time.monotonic()
+            blame, warnings = history_context.blame_commits(self.tmpdir, "src/foo.py", 1, 5)
+        self.assertLess(time.monotonic() - started, 10)
+        self.assertEqual(blame, [])
+        self.assertTrue(any("timed out" in w for w in warnings))
+
+        with mock.patch.dict(os.environ, self.fake_git("head -c 1000000 /dev/zero | tr '\\0' x >&2\nexit 1\n")):
+            blame, warnings = history_context.blame_commits(self.tmpdir, "src/foo.py", 1, 5)
+        self.assertEqual(blame, [])
+        self.assertTrue(warnings[0].startswith("git blame failed: xxx"))
+
+    def test_single_pass_pickaxe_matches_per_token_pickaxe(self):
+        tokens = ["hello", "legacy", "TypeError", "isinstance", "missing_token"]
+        for limit in (1, 5):
+            single = history_context.pickaxe_commits(self.tmpdir, "src/foo.py", tokens, limit_per_token=limit)
+            per_token = history_context.pickaxe_commits(self.tmpdir, "src/foo.py", tokens, limit_per_token=limit,
+                                                        single_pass=False)
+            self.assertEqual(single, per_token)
+        self.assertTrue(any(r["reason"] == "pickaxe:-S legacy" for r in single))
+
+    def test_single_pass_pickaxe_watchdog_kills_silent_walk(self):
+        from unittest import mock
+        with mock.patch.dict(os.environ, self.fake_git("exec sleep 30\n")), \
+                mock.patch.object(history_context, "PICKAXE_WALK_TIMEOUT", 0.5):
+            started = time.monotonic()
+            hits = history_context._pickaxe_single_pass(self.tmpdir, "src/foo.py", ["hello"], 5)
+        self.assertLess(time.monotonic() - started, 10)
+        self.assertEqual(hits, {"hello": []})
+
     def test_lineage_subcommand(self):
         proc = run(
             [
@@ -265,5 +512,730 @@ class TestSmokeLocalOnly(unittest.TestCase):
         self.assertIn("file_lineage", data)
 
 
+@unittest.skipUnless(shutil.which("git"), "git not available")
+class HistoryRepoMixin:
+    """A small repository with a rename, shared by the index and lineage tests."""
+
+    def setUp(self):
+        import tempfile
+        self.tmpdir = Path(tempfile.mkdtemp(prefix="rhi-index-"))
+        self.env = os.environ.copy()
+        self.env.update(GIT_AUTHOR_NAME="Test User", GIT_AUTHOR_EMAIL="test@example.com",
+                        GIT_COMMITTER_NAME="Test User", GIT_COMMITTER_EMAIL="test@example.com")
+        self.git("init", "-q", "-b", "main")
+        self.git("config", "commit.gpgsign", "false")
+        body = "".join(f"def step_{i}(budget):\n    return budget - {i}\n" for i in range(12))
+        (self.tmpdir / "old.py").write_text(body, encoding="utf-8")
+        self.commit("add steps", 1)
+        (self.tmpdir / "old.py").write_text(body + "RETRY_LIMIT = 3\n", encoding="utf-8")
+        self.commit("add retry limit", 2)
+        self.git("mv", "old.py", "new name.py")
+        self.commit("rename module", 3)
+        (self.tmpdir / "new name.py").write_text(body.replace("step_4", "stage_4"), encoding="utf-8")
+        self.commit("drop retry limit, rename step_4", 4)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def git(self, *args, **env):
+        return subprocess.run(["git", *args], cwd=str(self.tmpdir), env={**self.env, **env},
+                              text=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+
+    def commit(self, message, second):
+        date = f"2024-01-01T00:00:{second:02d}"
+        self.git("add", "-A")
+        self.git("commit", "-q", "-m", message, GIT_AUTHOR_DATE=date, GIT_COMMITTER_DATE=date)
+
+
+class TestHistoryIndex(HistoryRepoMixin, unittest.TestCase):
+    """The SQLite history index must answer the same questions git does."""
+
+    def assert_matches_git(self, index):
+        for path in ("new name.py", "old.py"):
+            self.assertEqual(history_context.log_commits_for_path(self.tmpdir, path, 20, index),
+                             history_context.log_commits_for_path(self.tmpdir, path, 20))
+            self.assertEqual(history_context.rename_lineage(self.tmpdir, path, index=index),
+                             history_context.rename_lineage(self.tmpdir, path))
+            tokens = ["step", "LIMIT", "RETRY_LIMIT", "step_4", "stage_4", "budget"]
+            self.assertEqual(history_context.pickaxe_commits(self.tmpdir, path, tokens, 5, index=index),
+                             history_context.pickaxe_commits(self.tmpdir, path, tokens, 5))
+
+    def test_build_matches_git_and_tracks_freshness(self):
+        index = history_context.HistoryIndex.open(self.tmpdir, create=True)
+        self.addCleanup(index.close)
+        stats = index.build()
+        self.assertEqual(stats["commits_indexed"], 4)
+        self.assertTrue(index.is_fresh())
+        self.assertTrue((self.tmpdir / ".git" / "history-context" / "index.sqlite").is_file())
+        self.assert_matches_git(index)
+        self.assertEqual(index.rename_lineage("new name.py", 80)["renames"][0]["from"], "old.py")
+
+        (self.tmpdir / "new name.py").write_text("RETRY_LIMIT = 5\n", encoding="utf-8")
+        self.commit("reintroduce retry limit", 5)
+        self.assertFalse(index.is_fresh())
+        self.assertIsNone(history_context.HistoryIndex.open_fresh(self.tmpdir))
+        self.assertEqual(index.update()["new_commits"], 1)
+        self.assertTrue(index.is_fresh())
+        self.assert_matches_git(index)
+
+    def test_substring_tokens_and_unprefixed_diffs(self):
+        self.git("config", "diff.noprefix", "true")
+        self.git("config", "diff.mnemonicPrefix", "true")
+        index = history_context.HistoryIndex.open(self.tmpdir, create=True)
+        self.addCleanup(index.close)
+        index.build()
+        # "step" only ever occurs inside longer identifiers such as step_4.
+        rows = index.pickaxe("new name.py", "step", 10)
+        self.assertEqual([r["summary"] for r in rows], ["drop retry limit, rename step_4", "rename module"])
+        self.assertEqual([r["summary"] for r in index.log_commits_for_path("old.py", 10)],
+                         ["rename module", "add retry limit", "add steps"])
+        self.assert_matches_git(index)
+
+    def test_index_subcommand_and_rebuild_after_history_rewrite(self):
+        script = [sys.executable, str(SCRIPTS / "history_context.py"), "index"]
+        proc = run([*script, "update", "--repo-dir", str(self.tmpdir)])
+        self.assertEqual(proc.returncode, 0, proc.stderr)
+        self.assertEqual(json.loads(proc.stdout)["commits_indexed"], 4)
+
+        self.git("reset", "-q", "--hard", "HEAD~1")
+        proc = run([*script, "update", "--repo-dir", str(self.tmpdir)])
+        self.assertEqual(proc.returncode, 0, proc.stderr)
+        self.assertEqual(json.loads(proc.stdout)["commits_indexed"], 3)
+        self.git("reflog", "expire", "--expire=now", "--all")
+        self.git("gc", "-q", "--prune=now")
+        proc = run([*script, "update", "--repo-dir", str(self.tmpdir)])
+        self.assertEqual(proc.returncode, 0, proc.stderr)
+        self.assertEqual(json.loads(proc.stdout)["new_commits"], 0)
+        index = history_context.HistoryIndex.open_fresh(self.tmpdir)
+        self.assertIsNotNone(index)
+        self.addCleanup(index.close)
+        self.assert_matches_git(index)
+
+
+class TestLineageWalk(HistoryRepoMixin, unittest.TestCase):
+    """One follow walk must reproduce both former `git log --follow` runs across weak renames and copies."""
+
+    def setUp(self):
+        super().setUp()
+        kept = (self.tmpdir / "new name.py").read_text(encoding="utf-8").splitlines(keepends=True)[:6]
+        (self.tmpdir / "mid.py").write_text("".join(kept + [f"value_{i} = {i} * factor\n" for i in range(16)]), encoding="utf-8")
+        (self.tmpdir / "new name.py").unlink()
+        self.commit("weak rename into mid.py", 5)
+        self.git("mv", "mid.py", "strong.py")
+        self.commit("strong rename", 6)
+        text = (self.tmpdir / "strong.py").read_text(encoding="utf-8")
+        (self.tmpdir / "final.py").write_text(text + "extra = 1\n", encoding="utf-8")
+        (self.tmpdir / "strong.py").write_text(text.replace("value_0", "source_0"), encoding="utf-8")
+        self.commit("copy strong.py to final.py", 7)
+        (self.tmpdir / "final.py").write_text(text + "extra = 2\n", encoding="utf-8")
+        self.commit("tune final", 8)
+
+    def test_single_walk_matches_separate_follow_runs(self):
+        for path in ("final.py", "strong.py", "mid.py"):
+            follow30 = self.git("log", "--follow", "--find-renames=30%", "--format=%H", "-30", "--", path).stdout.split()
+            walk = history_context.LineageWalk.run(self.tmpdir, path)
+            self.assertEqual([r["sha"] for r in walk.path_history(30)], follow30)
+            old = self.git("log", "--follow", "--name-status", "--find-renames=20%", "--find-copies=20%",
+                           "--format=commit %H", "--", path).stdout
+            steps = [line.split("\t") for line in old.splitlines() if line[:1] in ("R", "C")]
+            self.assertEqual([(r["similarity"], r["from"], r["to"]) for r in walk.rename_lineage()["renames"]],
+                             [(st[1:], a, b) for st, a, b in steps])
+        steps = [(r["kind"], r["to"], int(r["similarity"])) for r in history_context.rename_lineage(self.tmpdir, "final.py")["renames"]]
+        self.assertEqual([s[:2] for s in steps][:3], [("copy", "final.py"), ("rename", "strong.py"), ("rename", "mid.py")])
+        self.assertLess(steps[2][2], 30)  # weak rename: lineage follows it, path history stops there
+
+    def test_index_agrees_with_walk(self):
+        index = history_context.HistoryIndex.open(self.tmpdir, create=True)
+        self.addCleanup(index.close)
+        index.build()
+        for path in ("final.py", "strong.py", "mid.py"):
+            self.assertEqual(history_context.log_commits_for_path(self.tmpdir, path, 20, index),
+                             history_context.log_commits_for_path(self.tmpdir, path, 20))
+            self.assertEqual(history_context.rename_lineage(self.tmpdir, path, index=index),
+                             history_context.rename_lineage(self.tmpdir, path))
+
+
+class TestPatchIds(HistoryRepoMixin, unittest.TestCase):
+    """Batched patch-ids must equal `git show | git patch-id --stable` per commit."""
+
+    def setUp(self):
+        super().setUp()
+        self.git("commit", "-q", "--allow-empty", "-m", "empty", GIT_AUTHOR_DATE="2024-01-01T00:00:05", GIT_COMMITTER_DATE="2024-01-01T00:00:05")
+        self.git("checkout", "-q", "-b", "side", "HEAD~1")
+        (self.tmpdir / "side.py").write_text("SIDE = 1\n", encoding="utf-8")
+        self.commit("side change", 6)
+        self.git("checkout", "-q", "main")
+        self.git("merge", "-q", "--no-ff", "-m", "merge side", "side", GIT_AUTHOR_DATE="2024-01-01T00:00:07", GIT_COMMITTER_DATE="2024-01-01T00:00:07")
+
+    def per_commit(self, sha):
+        patch = self.git("show", "--format=", *history_context.PATCH_ID_DIFF_OPTS, sha).stdout
+        out = subprocess.run(["git", "patch-id", "--stable"], cwd=str(self.tmpdir), input=patch, text=True, stdout=subprocess.PIPE).stdout
+        return out.split()[0] if out.strip() else None
+
+    def test_one_pipeline_matches_per_commit_ids(self):
+        shas = self.git("rev-list", "--all").stdout.split()
+        history_context.PROFILE.reset()
+        ids = history_context.git_patch_ids(self.tmpdir, shas)
+        self.assertEqual(history_context.PROFILE.snapshot()["git_processes"], 2)
+        self.assertEqual(ids, {sha: self.per_commit(sha) for sha in shas})
+        merge, empty = self.git("rev-parse", "HEAD", "HEAD^1").stdout.split()
+        self.assertIsNone(ids[merge])
+        self.assertIsNone(ids[empty])
+        self.assertEqual(sum(v is not None for v in ids.values()), len(shas) - 2)
+
+    def test_bad_revision_falls_back_and_cache_skips_processes(self):
+        head = self.git("rev-parse", "HEAD~1").stdout.strip()
+        first = self.git("rev-list", "--max-parents=0", "HEAD").stdout.strip()
+        cache = history_context.GitObjectCache(self.tmpdir / ".git" / "history-context" / "objects")
+        ids = history_context.git_patch_ids(self.tmpdir, [first, "0" * 40], cache)
+        self.assertEqual(ids, {first: self.per_commit(first)})
+        history_context.git_patch_ids(self.tmpdir, [head], cache)
+        history_context.PROFILE.reset()
+        self.assertEqual(history_context.git_patch_ids(self.tmpdir, [first, head], cache), {first: self.per_commit(first), head: None})
+        self.assertEqual(history_context.PROFILE.snapshot()["git_processes"], 0)
+
+    def test_abbreviated_shas_and_other_revisions_resolve(self):
+        first = self.git("rev-list", "--max-parents=0", "HEAD").stdout.strip()
+        self.git("tag", "v1", first)
+        expected = self.per_commit(first)
+        self.assertIsNotNone(expected)
+        self.assertEqual(history_context.git_patch_id(self.tmpdir, first[:10]), expected)
+        ids = history_context.git_patch_ids(self.tmpdir, [first[:7], "v1", first, "HEAD", "no-such-rev"])
+        self.assertEqual(ids, {first[:7]: expected, "v1": expected, first: expected, "HEAD": None})
+
+
+class TestHunkSimilarityIndex(unittest.TestCase):
+    def setUp(self):
+        import random
+        self.rng = random.Random(7)
+        self.pool = [f"+value_{i}=compute({i})" for i in range(60000)]
+        self.base = self.rng.sample(self.pool, 2500)
+
+    def patch(self, keep, extra):
+        return [x for x in self.base if self.rng.random() < keep] + self.rng.sample(self.pool, extra)
+
+    @staticmethod
+    def exhaustive(seeds, lines):
+        best, best_sha = 0.0, None
+        for sha, seed in seeds.items():
+            sim = history_context.jaccard(seed, lines)
+            if sim > best:
+                best, best_sha = sim, sha
+        return best, best_sha
+
+    def test_decision_bands_match_exhaustive_jaccard(self):
+        seeds = {f"{i:040x}": self.patch(self.rng.random(), self.rng.choice([20, 600, 3000])) for i in range(16)}
+        index = history_context.HunkSimilarityIndex(seeds)
+        sig = next(s for s in index.signatures.values() if s is not None)
+        self.assertEqual((sig.typecode, len(sig)), ("Q", history_context.HunkSimilarityIndex.BINS))
+        banded = 0
+        for _ in range(40):
+            lines = self.patch(self.rng.random(), self.rng.choice([5, 400, 2500]))
+            fast, fast_sha = index.best_match(lines)
+            slow, slow_sha = self.exhaustive(seeds, lines)
+            if slow >= 0.25:
+                banded += 1
+                self.assertEqual((fast_sha, round(fast, 12)), (slow_sha, round(slow, 12)))
+            else:
+                self.assertLess(fast, 0.25)
+        self.assertGreater(banded, 5)
+
+    def test_band_edges_match_exhaustive_jaccard(self):
+        cls = history_context.HunkSimilarityIndex
+        size = 2000
+        for cutoff in (cls.FLOOR, 0.65):
+            for step in range(-5, 6):
+                want = cutoff + step * cls.MARGIN / 5
+                shared = round(2 * size * want / (1 + want))  # J = shared / (2 * size - shared)
+                lines = self.rng.sample(self.pool, 2 * size - shared)
+                seed, target = lines[:size], lines[:shared] + lines[size:]
+                index = cls({"a" * 40: seed})
+                fast, _ = index.best_match(target)
+                slow = history_context.jaccard(seed, target)
+                self.assertAlmostEqual(slow, want, delta=0.001)
+                self.assertLessEqual(fast, slow)
+                for band in (cls.FLOOR, 0.65):
+                    self.assertEqual(fast >= band, slow >= band, f"J={slow:.4f} near {band}")
+                if slow >= cls.FLOOR:
+                    self.assertEqual(fast, slow)
+
+    def test_score_pr_bundle_uses_shared_index(self):
+        seed = self.patch(1.0, 0)
+        patch = "\n".join(["@@ -1 +1 @@"] + [f"+{line[1:]}" for line in seed])
+        bundle = {"number": 1, "files": [{"filename": "x.py", "patch": patch}]}
+        index = history_context.HunkSimilarityIndex({"a" * 40: history_context.normalize_patch_lines(patch)})
+        scored = history_context.score_pr_bundle(bundle, "x.py", [], [], {}, [], index)
+        self.assertEqual(scored["relation"], "probable_squash_or_patch_equivalent")
+        self.assertEqual(scored["best_hunk_similarity"], 1.0)
+
+
+class TestFutureMemo(unittest.TestCase):
+    def test_concurrent_targets_compute_each_key_once(self):
+        import threading
+        from concurrent.futures import ThreadPoolExecutor
+        memo = history_context.FutureMemo()
+        calls = []
+        started = threading.Barrier(4)
+
+        def compute(keys):
+            calls.extend(keys)
+            return {k: k * 10 for k in keys if k != 3}
+
+        def target(keys):
+            started.wait()
+            return memo.get_many("bundle", keys, compute, default="missing")
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            results = list(pool.map(target, [[1, 2, 3], [2, 3, 4], [1, 4], [4, 1, 2]]))
+        self.assertEqual(sorted(calls), [1, 2, 3, 4])
+        self.assertEqual(results[1], {2: 20, 3: "missing", 4: 40})
+        self.assertEqual(results[3], {4: 40, 1: 10, 2: 20})
+
+    def test_failed_and_empty_results_are_recomputed_and_size_is_bounded(self):
+        memo = history_context.FutureMemo(max_entries=2)
+        calls = []
+
+        def flaky(keys):
+            calls.extend(keys)
+            if len(calls) == 1:
+                raise RuntimeError("timed out")
+            return {k: None if k == "b" else k.upper() for k in keys}
+
+        with self.assertRaises(RuntimeError):
+            memo.get_many("patch_id", ["a"], flaky)
+        self.assertEqual(memo.get_many("patch_id", ["a", "b"], flaky), {"a": "A", "b": None})
+        self.assertEqual(memo.get_many("patch_id", ["a", "b"], flaky), {"a": "A", "b": None})
+        self.assertEqual(calls, ["a", "a", "b", "b"])
+        memo.get_many("patch_id", ["c", "d"], flaky)
+        self.assertEqual(list(memo.futures), [("patch_id", "c"), ("patch_id", "d")])
+
+
+class TestCommentFeatures(unittest.TestCase):
+    def test_atom_type_keeps_first_priority_match(self):
+        self.assertEqual(history_context.classify_atom("You must keep the legacy path"), "compatibility_constraint")
+        self.assertEqual(history_context.classify_atom("must not take the lock here"), "concurrency_invariant")
+        self.assertEqual(history_context.classify_atom("This must hold"), "constraint")
+        self.assertIsNone(history_context.classify_atom("LGTM"))
+
+    def test_annotated_pipeline_matches_per_pass_reference(self):
+        sys.path.insert(0, str(ROOT / "benchmarks"))
+        try:
+            import comment_scoring
+        finally:
+            sys.path.remove(str(ROOT / "benchmarks"))
+        result = comment_scoring.compare(comments=300, targets=3, repeat=1)
+        self.assertTrue(result["identical"])
+
+    def test_selected_comments_carry_only_public_fields_after_stripping(self):
+        bundle = {"review_comments": [{"id": 1, "path": "a.py", "body": "Keep for backwards compat", "diff_hunk": "@@"}],
+                  "issue_comments": [], "reviews": []}
+        comments = history_context.select_relevant_comments(bundle, "a.py", [], ["compat"], max_items=5)
+        atoms = history_context.infer_decision_atoms(comments, 3, "a.py", [])
+        self.assertEqual(atoms[0]["type"], "compatibility_constraint")
+        self.assertEqual(bundle["review_comments"][0]["_atom"], "compatibility_constraint")
+        self.assertEqual(history_context.public_fields(comments[0]),
+                         {"kind": "review_comment", "id": 1, "path": "a.py", "body": "Keep for backwards compat", "diff_hunk": "@@"})
+
+
+@unittest.skipUnless(shutil.which("git") and hasattr(os, "wait4"), "git and os.wait4 needed")
+class TestInspectBenchmarkSuite(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        sys.path.insert(0, str(ROOT / "benchmarks"))
+        try:
+            import inspect_suite
+        finally:
+            sys.path.remove(str(ROOT / "benchmarks"))
+        cls.suite = inspect_suite
+        params = {"commits": 12, "files": 3, "renames": 1, "blame_lines": 30, "comments": 6}
+        cls.result = inspect_suite.run_suite(params, repeat=1, modes=("git",))
+
+    def test_replayed_inspect_reports_stages_processes_and_memory(self):
+        cold = self.result["scenarios"]["git/cold"]
+        self.assertEqual(cold["exit_code"], 0, cold.get("error"))
+        self.assertEqual(cold["gh_calls"], 0)
+        self.assertGreater(cold["relevant_prs"], 0)
+        self.assertEqual(cold["renames"], 1)
+        self.assertGreater(cold["peak_rss_kb"], 0)
+        for stage in ("blame", "pickaxe", "scoring"):
+            self.assertIn(stage, cold["stages"])
+        self.assertLess(self.result["scenarios"]["git/warm"]["git_processes"], cold["git_processes"])
+
+    def test_baseline_comparison_flags_slower_stages_and_more_processes(self):
+        baseline = json.loads(json.dumps(self.result))
+        warm = baseline["scenarios"]["git/warm"]
+        warm["stages"]["blame"] = 0.0
+        warm["git_processes"] -= 1
+        comparison = self.suite.compare(self.result, baseline, tolerance=0.25, min_delta=0.0)
+        flagged = {(r["scenario"], r["metric"]) for r in comparison["regressions"]}
+        self.assertIn(("git/warm", "stages.blame"), flagged)
+        self.assertIn(("git/warm", "git_processes"), flagged)
+        self.assertEqual(self.suite.compare(self.result, self.result)["regressions"], [])
+        baseline["params"]["commits"] += 1
+        self.assertFalse(self.suite.compare(self.result, baseline)["comparable"])
+
+
+class TestGitObjectCache(unittest.TestCase):
+    def setUp(self):
+        import tempfile
+        self.tmpdir = Path(tempfile.mkdtemp(prefix="rhi-cache-"))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_round_trip_keyed_by_path_and_options(self):
+        cache = history_context.GitObjectCache(self.tmpdir)
+        sha = "a" * 40
+        cache.put("patch", sha, "diff text", "src/foo.py", ["--unified=2"])
+        self.assertEqual(cache.get("patch", sha, "src/foo.py", ["--unified=2"]), "diff text")
+        self.assertIs(cache.get("patch", sha, None, ["--unified=2"]), history_context._MISS)
+        self.assertEqual(cache.hits, 1)
+
+    def test_abbreviated_shas_are_not_cached(self):
+        cache = history_context.GitObjectCache(self.tmpdir)
+        cache.put("summary", "abc1234", {"sha": "abc1234"})
+        self.assertIs(cache.get("summary", "abc1234"), history_context._MISS)
+
+    def test_prune_evicts_least_recently_used(self):
+        cache = history_context.GitObjectCache(self.tmpdir, max_bytes=600)
+        for i in range(6):
+            cache.put("patch", f"{i:040x}", "x" * 150)
+            entry = cache._entry("patch", f"{i:040x}", ())
+            os.utime(entry, (1000 + i, 1000 + i))
+        cache.prune()
+        self.assertIs(cache.get("patch", f"{0:040x}"), history_context._MISS)
+        self.assertEqual(cache.get("patch", f"{5:040x}"), "x" * 150)
+
+
+class TestConcurrentPrFetch(unittest.TestCase):
+    def fake_gh_api(self, endpoint, repo, paginate=False, **kwargs):
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(0.02)
+        with self.lock:
+            self.active -= 1
+        if endpoint.endswith("/pulls/13"):
+            raise RuntimeError("boom")
+        if "?" not in endpoint:
+            number = int(endpoint.rsplit("/", 1)[1])
+            return {"title": f"PR {number}", "body": "", "user": {"login": "dev"}}
+        return [{"id": 1, "body": endpoint}]
+
+    def setUp(self):
+        import threading
+        from unittest import mock
+        self.lock = threading.Lock()
+        self.active = 0
+        self.peak = 0
+        patcher = mock.patch.object(history_context, "gh_api", side_effect=self.fake_gh_api)
+        self.gh_api = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_bundles_fetched_concurrently_under_cap(self):
+        results = history_context.fetch_pr_bundles("o/r", [11, 12, 13, 11], jobs=3)
+        self.assertEqual(list(results), [11, 12, 13])
+        self.assertEqual(self.gh_api.call_count, 3 * len(history_context.PR_BUNDLE_ENDPOINTS))
+        self.assertLessEqual(self.peak, 3)
+        self.assertGreater(self.peak, 1)
+        self.assertEqual(results[12]["title"], "PR 12")
+        self.assertEqual(results[12]["api_counts"]["reviews"], 1)
+        self.assertIsInstance(results[13], RuntimeError)
+
+    def test_run_gh_retries_after_rate_limit(self):
+        from unittest import mock
+        err = history_context.CommandError(["gh"], 1, "", "gh: API rate limit exceeded (HTTP 403)")
+        with mock.patch.object(history_context, "run", side_effect=[err, "{}"]) as run_mock, \
+                mock.patch.object(history_context, "_back_off") as back_off:
+            self.assertEqual(history_context.run_gh(["gh", "api", "x"]), "{}")
+        self.assertEqual(run_mock.call_count, 2)
+        back_off.assert_called_once_with(0)
+
+
+class TestBoundedPagination(unittest.TestCase):
+    """List endpoints are read one 100-item page at a time, only as far as needed."""
+
+    TOTAL = 2000
+
+    def fake_gh_api(self, endpoint, repo, paginate=False, **kwargs):
+        self.assertFalse(paginate)
+        if "?" not in endpoint:
+            return {"title": "Busy PR", "user": {"login": "dev"}, "changed_files": 450, "comments": self.TOTAL,
+                    "review_comments": self.TOTAL, "commits": 3}
+        base, query = endpoint.split("?")
+        params = dict(kv.split("=") for kv in query.split("&"))
+        per_page, page = int(params["per_page"]), int(params["page"])
+        if base.endswith("/files"):
+            total, item = 450, lambda i: {"filename": f"src/f{i:04d}.py", "patch": "@@ -1 +1 @@\n+x"}
+        elif base.endswith("/commits"):
+            total, item = 3, lambda i: {"sha": f"{i:040x}"}
+        else:
+            total, item = self.TOTAL, lambda i: {"id": i, "body": "ok"}
+        start = (page - 1) * per_page
+        return [item(i) for i in range(start, min(total, start + per_page))]
+
+    def setUp(self):
+        from unittest import mock
+        patcher = mock.patch.object(history_context, "gh_api", side_effect=self.fake_gh_api)
+        self.gh_api = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def pages(self, suffix):
+        return [c.args[0] for c in self.gh_api.call_args_list if c.args[0].split("?")[0].endswith(suffix)]
+
+    def test_comment_lists_stop_at_max_comments(self):
+        bundle = history_context.fetch_pr_bundle("o/r", 5, max_comments=80, path="src/f0150.py")
+        self.assertEqual(len(self.pages("/pulls/5/comments")), 1)
+        self.assertEqual(len(self.pages("/issues/5/comments")), 1)
+        self.assertEqual(len(self.pages("/reviews")), 1)
+        self.assertEqual(len(bundle["review_comments"]), 80)
+        counts = bundle["api_counts"]
+        self.assertEqual((counts["issue_comments"], counts["reviews"], counts["commits"]), (self.TOTAL, 100, 3))
+        self.assertEqual(sorted(counts["truncated"]), ["files", "issue_comments", "review_comments", "reviews"])
+
+    def test_files_stream_until_target_path(self):
+        bundle = history_context.fetch_pr_bundle("o/r", 5, path="src/f0150.py")
+        self.assertEqual(len(self.pages("/files")), 2)
+        self.assertEqual(len(bundle["files"]), 200)
+        self.assertEqual(bundle["api_counts"]["files"], 450)
+        scored = history_context.score_pr_bundle(bundle, "src/f0150.py", [], [], {}, [])
+        self.assertTrue(any("stopped at the target path" in w for w in scored["warnings"]))
+
+        full = history_context.fetch_pr_bundle("o/r", 5, path="src/missing.py")
+        self.assertEqual(len(full["files"]), 450)
+        self.assertNotIn("files", full["api_counts"]["truncated"])
+
+
+class TestHttpCache(unittest.TestCase):
+    def setUp(self):
+        import tempfile
+        from unittest import mock
+        self.tmpdir = Path(tempfile.mkdtemp(prefix="rhi-http-"))
+        self.addCleanup(shutil.rmtree, self.tmpdir, True)
+        patcher = mock.patch.object(history_context, "HTTP_CACHE", history_context.HttpCache(self.tmpdir, ttl=60))
+        self.cache = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_entries_named_after_request(self):
+        self.assertEqual(self.cache.path_for("repos/o/r/pulls/7/files?per_page=100&page=2"),
+                         self.tmpdir / "repos" / "o" / "r" / "pulls" / "7" / "files@page=2&per_page=100.json")
+        hashed = self.cache.path_for("search/issues", {"q": 'repo:o/r is:pr "x y"'})
+        self.assertRegex(hashed.name, r"^issues@[0-9a-f]{16}\.json$")
+
+    def test_etag_revalidation_and_replay(self):
+        from unittest import mock
+        ok = 'HTTP/2.0 200 OK\nEtag: W/"abc"\nContent-Type: application/json\n\n{"title": "PR"}'
+        not_modified = history_context.CommandError(["gh"], 1, 'HTTP/2.0 304 Not Modified\nEtag: W/"abc"\n\n', "")
+        with mock.patch.object(history_context, "run", side_effect=[ok, not_modified]) as gh:
+            self.assertEqual(history_context.gh_api("repos/{repo}/pulls/7", "o/r"), {"title": "PR"})
+            self.assertEqual(history_context.gh_api("repos/{repo}/pulls/7", "o/r"), {"title": "PR"})  # fresh: no call
+            self.assertEqual(gh.call_count, 1)
+            entry = self.cache.path_for("repos/o/r/pulls/7")
+            stale = json.loads(entry.read_text())
+            stale["fetched_at"] = 0
+            entry.write_text(json.dumps(stale))
+            self.assertEqual(history_context.gh_api("repos/{repo}/pulls/7", "o/r"), {"title": "PR"})
+        self.assertIn('If-None-Match: W/"abc"', gh.call_args_list[1].args[0])
+        self.assertGreater(json.loads(entry.read_text())["fetched_at"], 0)
+
+        self.cache.replay = True
+        with mock.patch.object(history_context, "run") as gh:
+            self.assertEqual(history_context.gh_api("repos/{repo}/pulls/7", "o/r"), {"title": "PR"})
+            with self.assertRaisesRegex(RuntimeError, "--replay"):
+                history_context.gh_api("repos/{repo}/pulls/8", "o/r")
+        gh.assert_not_called()
+
+
+class TestCompactPrConcurrent(unittest.TestCase):
+    def fake_gh_api(self, endpoint, paginate=False, cache="1h"):
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        # Later PRs finish first, so completion order differs from --pr order.
+        time.sleep(0.1 * (5 - int(endpoint.split("/")[4].split("?")[0])))
+        with self.lock:
+            self.active -= 1
+        if endpoint == "repos/o/r/pulls/3":
+            raise RuntimeError("not found")
+        if "?" not in endpoint:
+            return {"title": endpoint, "user": {"login": "dev"}, "changed_files": 1}
+        return [{"filename": "a.py", "body": "ok"}]
+
+    def setUp(self):
+        import threading
+        from unittest import mock
+        self.lock = threading.Lock()
+        self.active = 0
+        self.peak = 0
+        self.gh_patcher = mock.patch.object(compact_pr, "gh_api", side_effect=self.fake_gh_api)
+        self.gh_patcher.start()
+        self.addCleanup(self.gh_patcher.stop)
+
+    def run_main(self, *extra):
+        import contextlib
+        import io
+        buf = io.StringIO()
+        with contextlib.redirect_stdout(buf), contextlib.redirect_stderr(io.StringIO()):
+            code = compact_pr.main(["--github-repo", "o/r", "--pr", "1", "--pr", "2", "--pr", "3", "--pr", "4", *extra])
+        return code, buf.getvalue()
+
+    def test_jsonl_streams_in_completion_or_requested_order(self):
+        code, out = self.run_main("--format", "jsonl", "--jobs", "20")
+        records = [json.loads(line) for line in out.splitlines()]
+        self.assertEqual(code, 1)
+        self.assertEqual([r["number"] for r in records], [4, 3, 2, 1])
+        self.assertEqual([r["number"] for r in records if "error" in r], [3])
+        self.assertGreater(self.peak, 5)
+
+        code, out = self.run_main("--format", "jsonl", "--ordered", "--jobs", "4")
+        self.assertEqual([json.loads(line)["number"] for line in out.splitlines()], [1, 2, 3, 4])
+
+    def test_json_document_keeps_pr_order(self):
+        import contextlib
+        import io
+        buf = io.StringIO()
+        with contextlib.redirect_stdout(buf):
+            code = compact_pr.main(["--github-repo", "o/r", "--pr", "4", "--pr", "2", "--jobs", "8"])
+        self.assertEqual(code, 0)
+        self.assertEqual([p["number"] for p in json.loads(buf.getvalue())["pull_requests"]], [4, 2])
+
+    def test_response_cache_on_by_default_in_history_context_location(self):
+        self.addCleanup(setattr, history_context, "HTTP_CACHE", None)
+        self.run_main("--repo-dir", str(ROOT))
+        self.assertEqual(history_context.HTTP_CACHE.directory, history_context.history_dir(ROOT) / "http")
+        self.run_main("--repo-dir", str(ROOT), "--no-http-cache")
+        self.assertIsNone(history_context.HTTP_CACHE)
+
+    def test_gh_retries_after_secondary_rate_limit(self):
+        from unittest import mock
+        self.gh_patcher.stop()
+        limited = history_context.CommandError(["gh"], 1, "", "gh: You have exceeded a secondary rate limit (HTTP 403)")
+        with mock.patch.object(history_context, "HTTP_CACHE", None), \
+                mock.patch.object(history_context, "run", side_effect=[limited, '[{"id": 1}]']) as gh, \
+                mock.patch.object(history_context, "_back_off") as back_off:
+            self.assertEqual(compact_pr.gh_api("repos/o/r/pulls/1/comments"), [{"id": 1}])
+        self.gh_patcher.start()
+        self.assertEqual(gh.call_count, 2)
+        back_off.assert_called_once_with(0)
+
+
+class TestGraphQLTransport(unittest.TestCase):
+    PR_NODE = {
+        "number": 7, "title": "Keep legacy flag", "body": "Compat shim", "state": "MERGED",
+        "mergedAt": "2024-01-02T00:00:00Z", "url": "https://github.com/o/r/pull/7",
+        "mergeCommit": {"oid": "m" * 40}, "author": {"login": "dev"},
+        "baseRefName": "main", "baseRefOid": "b" * 40, "headRefName": "feat", "headRefOid": "h" * 40,
+        "commits": {"totalCount": 1, "pageInfo": {"hasNextPage": False}, "nodes": [
+            {"commit": {"oid": "c" * 40, "message": "Add flag\n\nbody", "author": {"name": "Dev", "date": "2024-01-01"}}}]},
+        "reviews": {"totalCount": 250, "pageInfo": {"hasNextPage": True, "endCursor": "r1"}, "nodes": [
+            {"databaseId": 1, "state": "APPROVED", "author": {"login": "rev"}, "body": "must stay", "submittedAt": "t", "url": "u1"}]},
+        "reviewThreads": {"totalCount": 1, "pageInfo": {"hasNextPage": False}, "nodes": [
+            {"comments": {"totalCount": 2, "nodes": [
+                {"databaseId": 9, "path": "a.py", "line": 3, "originalLine": 3, "startLine": None, "originalStartLine": None,
+                 "commit": {"oid": "c" * 40}, "originalCommit": {"oid": "c" * 40}, "author": {"login": "rev"},
+                 "body": "second", "diffHunk": "@@", "url": "u9"},
+                {"databaseId": 8, "path": "a.py", "line": 2, "originalLine": 2, "startLine": None, "originalStartLine": None,
+                 "commit": {"oid": "c" * 40}, "originalCommit": {"oid": "c" * 40}, "author": {"login": "rev"},
+                 "body": "first", "diffHunk": "@@", "url": "u8"}]}}]},
+        "comments": {"totalCount": 0, "pageInfo": {"hasNextPage": False}, "nodes": []},
+    }
+
+    def test_graphql_bundle_matches_rest_shape(self):
+        from unittest import mock
+        files = [{"filename": "a.py", "status": "modified", "additions": 1, "deletions": 0, "changes": 1, "patch": "+x"}]
+        queries = []
+
+        def fake_graphql(query, variables):
+            queries.append(query)
+            return {"data": {"repository": {"pr7": self.PR_NODE, "pr8": None}}}
+
+        with mock.patch.object(history_context, "gh_graphql", side_effect=fake_graphql), \
+                mock.patch.object(history_context, "gh_api", return_value=files):
+            results = history_context.fetch_pr_bundles_graphql("o/r", [7, 8], max_comments=1)
+        self.assertEqual(len(queries), 1, "reviews overflowed only past max_comments, so no follow-up page")
+        self.assertIsInstance(results[8], RuntimeError)
+        bundle = results[7]
+        self.assertEqual(bundle["state"], "closed")
+        self.assertEqual(bundle["merge_commit_sha"], "m" * 40)
+        self.assertEqual(bundle["commits"][0]["message"], "Add flag")
+        self.assertEqual([c["id"] for c in bundle["review_comments"]], [8])
+        self.assertEqual(bundle["api_counts"]["reviews"], 250)
+        self.assertEqual(bundle["api_counts"]["review_comments"], 2)
+        self.assertEqual(bundle["files"][0]["patch"], "+x")
+        rest = history_context.build_pr_bundle(7, {"pr": {}, "files": [], "commits": [], "reviews": [],
+                                                   "review_comments": [], "issue_comments": []})
+        self.assertEqual(set(bundle), set(rest))
+        self.assertEqual(set(bundle["review_comments"][0]), set(history_context.build_pr_bundle(
+            7, {"pr": {}, "files": [], "commits": [], "reviews": [], "review_comments": [{}], "issue_comments": []}
+        )["review_comments"][0]))
+
+    def test_review_thread_over_fifty_comments_is_paged(self):
+        from unittest import mock
+
+        def comment(i):
+            return {"databaseId": i, "path": "a.py", "line": 1, "originalLine": 1, "startLine": None, "originalStartLine": None,
+                    "commit": {"oid": "c" * 40}, "originalCommit": {"oid": "c" * 40}, "author": {"login": "rev"},
+                    "body": f"note {i}", "diffHunk": "@@", "url": f"u{i}"}
+
+        thread = {"id": "T1", "comments": {"totalCount": 51, "pageInfo": {"hasNextPage": True, "endCursor": "c50"},
+                                           "nodes": [comment(i) for i in range(1, 51)]}}
+        node = {**self.PR_NODE, "reviewThreads": {"totalCount": 1, "pageInfo": {"hasNextPage": False}, "nodes": [thread]}}
+        calls = []
+
+        def fake_graphql(query, variables):
+            calls.append(variables)
+            if "id" in variables:
+                self.assertEqual(variables, {"id": "T1", "cursor": "c50"})
+                return {"data": {"node": {"comments": {"totalCount": 51, "pageInfo": {"hasNextPage": False},
+                                                       "nodes": [comment(51)]}}}}
+            return {"data": {"repository": {"pr7": node}}}
+
+        with mock.patch.object(history_context, "gh_graphql", side_effect=fake_graphql), \
+                mock.patch.object(history_context, "gh_api", return_value=[]):
+            bundle = history_context.fetch_pr_bundles_graphql("o/r", [7], max_comments=80)[7]
+        self.assertEqual(len(calls), 3, "one batch query, one thread page, one reviews page")
+        self.assertEqual([c["id"] for c in bundle["review_comments"]], list(range(1, 52)))
+        self.assertEqual(bundle["api_counts"]["review_comments"], 51)
+
+
+class TestBatchedCommitPrLookup(unittest.TestCase):
+    def setUp(self):
+        import tempfile
+        self.tmpdir = Path(tempfile.mkdtemp(prefix="rhi-assoc-"))
+        self.addCleanup(shutil.rmtree, self.tmpdir, True)
+        self.cache = history_context.GitObjectCache(self.tmpdir)
+        self.shas = ["a" * 40, "b" * 40]
+
+    @staticmethod
+    def fake_graphql(query, variables):
+        return {"data": {"repository": {
+            "c0": {"associatedPullRequests": {"nodes": [
+                {"number": 5, "title": "t", "url": "u", "state": "MERGED", "mergedAt": "2024-01-01T00:00:00Z"}]}},
+            "c1": {"associatedPullRequests": {"nodes": [
+                {"number": 6, "title": "t", "url": "u", "state": "OPEN", "mergedAt": None}]}},
+        }}}
+
+    def test_one_query_for_many_commits_and_merged_results_memoized(self):
+        from unittest import mock
+        with mock.patch.object(history_context, "gh_graphql", side_effect=self.fake_graphql) as gql, \
+                mock.patch.object(history_context, "associated_prs_for_commit") as rest:
+            first = history_context.associated_prs_for_commits("o/r", self.shas, self.cache)
+            self.assertEqual(gql.call_count, 1)
+            rest.assert_not_called()
+            self.assertEqual(first["a" * 40][0]["state"], "closed")
+            self.assertEqual(first["b" * 40][0]["source_commit"], "b" * 40)
+            history_context.associated_prs_for_commits("o/r", self.shas, self.cache)
+            self.assertIn('"' + "b" * 40 + '"', gql.call_args[0][0])
+            self.assertNotIn('"' + "a" * 40 + '"', gql.call_args[0][0], "merged association should come from cache")
+
+    def test_falls_back_to_rest_when_graphql_fails(self):
+        from unittest import mock
+        with mock.patch.object(history_context, "gh_graphql", side_effect=RuntimeError("no graphql")), \
+                mock.patch.object(history_context, "associated_prs_for_commit", return_value=[]) as rest:
+            out = history_context.associated_prs_for_commits("o/r", self.shas, self.cache)
+        self.assertEqual(rest.call_count, 2)
+        self.assertEqual(out, {sha: [] for sha in self.shas})
+
+
 if __name__ == "__main__":
     unittest.main(verbosity=2)
@@ -18,14 +18,22 @@ Output JSON schema:
           "citationCount": 123,
           "authors": [{"name": "..."}],
           "venue": "...",
-          "depth": 1
+          "depth": 1,
+          "abstract": "...",                 # hydrated fields (omitted with --no-hydrate)
+          "tldr": {"text": "..."},
+          "externalIds": {"DOI": "...", "ArXiv": "..."},
+          "influentialCitationCount": 7
         }
       },
       "edges": [
         {"src": "<paperId>", "dst": "<paperId>", "direction": "citation|reference"}
-      ]
+      ],
+      "stats": {"total_nodes": 200, "total_edges": 512, "truncated": true, "hydrated": 198}
     }
 
+Hops request only light fields; once the graph is complete, every node is
+hydrated with --hydrate-fields through /paper/batch (500 ids per request).
+
 Directions:
     forward   — follow *citations* (who cites this paper). Good for tracking impact.
     backward  — follow *references* (what this paper cites). Good for literature grounding.
@@ -36,12 +44,17 @@ from __future__ import annotations
 import argparse
 import json
 import sys
-from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).parent))
 import ss_client  # type: ignore
 
+# Requests in flight per BFS level; ss_client's rate limiter sets the actual pace.
+DEFAULT_WORKERS = 4
+# Filled in for every node after the crawl, so per-hop payloads stay light.
+HYDRATE_FIELDS = "abstract,tldr,externalIds,influentialCitationCount"
+
 
 def _extract_neighbor(entry: dict, key: str) -> dict | None:
     node = entry.get(key)
@@ -52,6 +65,23 @@ def _extract_neighbor(entry: dict, key: str) -> dict | None:
     return node
 
 
+def _fetch_hop(paper_id: str, kind: str, per_hop_limit: int) -> dict:
+    fetch = ss_client.citations if kind == "citation" else ss_client.references
+    return fetch(paper_id, limit=per_hop_limit)
+
+
+def hydrate(nodes: dict[str, dict], fields: str, *, workers: int = DEFAULT_WORKERS) -> int:
+    """Merge `fields` into every node via chunked /paper/batch lookups; returns the number hydrated."""
+    ids = list(nodes)
+    hydrated = 0
+    for paper_id, info in zip(ids, ss_client.iter_batch(ids, fields=f"paperId,{fields}", workers=workers)):
+        if not info:
+            continue
+        nodes[paper_id].update({k: v for k, v in info.items() if k != "paperId"})
+        hydrated += 1
+    return hydrated
+
+
 def traverse(
     seed: str,
     *,
@@ -59,7 +89,19 @@ def traverse(
     depth: int = 2,
     max_nodes: int = 200,
     per_hop_limit: int = 50,
+    workers: int = DEFAULT_WORKERS,
+    hydrate_fields: str | None = HYDRATE_FIELDS,
 ) -> dict:
+    """Level-synchronous BFS: all citation/reference requests of one level run concurrently.
+
+    Responses are merged in the order a one-at-a-time BFS would visit them
+    (frontier order; citations before references), so `max_nodes` truncation
+    picks the same nodes and edges regardless of which request finishes first.
+    Requests still queued once the graph is full are cancelled. Afterwards
+    all nodes are hydrated with `hydrate_fields` (skipped when empty/None);
+    a failed hydration leaves the light nodes and is noted in
+    `stats.hydration_error`.
+    """
     assert direction in {"forward", "backward", "both"}
     seed_info = ss_client.paper(
         seed,
@@ -69,34 +111,52 @@ def traverse(
 
     nodes: dict[str, dict] = {seed_id: {**seed_info, "depth": 0}}
     edges: list[dict] = []
-    queue: deque[tuple[str, int]] = deque([(seed_id, 0)])
-
-    while queue and len(nodes) < max_nodes:
-        paper_id, cur_depth = queue.popleft()
-        if cur_depth >= depth:
-            continue
-
-        if direction in {"forward", "both"}:
-            resp = ss_client.citations(paper_id, limit=per_hop_limit)
-            for entry in resp.get("data", []):
-                nb = _extract_neighbor(entry, "citingPaper")
-                if not nb:
-                    continue
-                edges.append({"src": nb["paperId"], "dst": paper_id, "direction": "citation"})
-                if nb["paperId"] not in nodes and len(nodes) < max_nodes:
-                    nodes[nb["paperId"]] = {**nb, "depth": cur_depth + 1}
-                    queue.append((nb["paperId"], cur_depth + 1))
-
-        if direction in {"backward", "both"} and len(nodes) < max_nodes:
-            resp = ss_client.references(paper_id, limit=per_hop_limit)
-            for entry in resp.get("data", []):
-                nb = _extract_neighbor(entry, "citedPaper")
-                if not nb:
-                    continue
-                edges.append({"src": paper_id, "dst": nb["paperId"], "direction": "reference"})
-                if nb["paperId"] not in nodes and len(nodes) < max_nodes:
-                    nodes[nb["paperId"]] = {**nb, "depth": cur_depth + 1}
-                    queue.append((nb["paperId"], cur_depth + 1))
+    kinds = [k for k, d in (("citation", "forward"), ("reference", "backward")) if direction in {d, "both"}]
+    frontier = [seed_id]
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for cur_depth in range(depth):
+            if not frontier or len(nodes) >= max_nodes:
+                break
+            futures = [
+                (paper_id, kind, pool.submit(_fetch_hop, paper_id, kind, per_hop_limit))
+                for paper_id in frontier
+                for kind in kinds
+            ]
+            next_frontier: list[str] = []
+            try:
+                for paper_id, kind, future in futures:
+                    if len(nodes) >= max_nodes:
+                        break
+                    resp = future.result()
+                    key = "citingPaper" if kind == "citation" else "citedPaper"
+                    for entry in resp.get("data", []):
+                        nb = _extract_neighbor(entry, key)
+                        if not nb:
+                            continue
+                        if kind == "citation":
+                            edges.append({"src": nb["paperId"], "dst": paper_id, "direction": "citation"})
+                        else:
+                            edges.append({"src": paper_id, "dst": nb["paperId"], "direction": "reference"})
+                        if nb["paperId"] not in nodes and len(nodes) < max_nodes:
+                            nodes[nb["paperId"]] = {**nb, "depth": cur_depth + 1}
+                            next_frontier.append(nb["paperId"])
+            finally:
+                for _, _, future in futures:
+                    future.cancel()
+            frontier = next_frontier
+
+    stats: dict = {
+        "total_nodes": len(nodes),
+        "total_edges": len(edges),
+        "truncated": len(nodes) >= max_nodes,
+    }
+    if hydrate_fields:
+        try:
+            stats["hydrated"] = hydrate(nodes, hydrate_fields, workers=workers)
+        except ss_client.SemanticScholarError as e:
+            stats["hydrated"] = 0
+            stats["hydration_error"] = str(e)
 
     return {
         "seed": seed_id,
@@ -104,24 +164,24 @@ def traverse(
         "depth": depth,
         "nodes": nodes,
         "edges": edges,
-        "stats": {
-            "total_nodes": len(nodes),
-            "total_edges": len(edges),
-            "truncated": len(nodes) >= max_nodes,
-        },
+        "stats": stats,
     }
 
 
 def _main(argv: list[str]) -> int:
-    p = argparse.ArgumentParser(description="Citation graph BFS on Semantic Scholar")
+    p = argparse.ArgumentParser(description="Citation graph BFS on Semantic Scholar", parents=[ss_client.cache_arguments()])
     p.add_argument("seed", help="paperId (supports DOI:, ARXIV:, CorpusId: prefixes)")
     p.add_argument("--direction", choices=["forward", "backward", "both"], default="both")
     p.add_argument("--depth", type=int, default=2)
     p.add_argument("--max-nodes", type=int, default=200)
     p.add_argument("--per-hop-limit", type=int, default=50)
+    p.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="concurrent requests per BFS level")
+    p.add_argument("--hydrate-fields", default=HYDRATE_FIELDS, help="fields batch-fetched for every node after the crawl")
+    p.add_argument("--no-hydrate", action="store_true", help="keep the light per-hop nodes only")
     p.add_argument("--output", help="write JSON here instead of stdout")
 
     args = p.parse_args(argv)
+    ss_client.configure_cache(args.cache_dir, enabled=not args.no_cache)
 
     try:
         graph = traverse(
@@ -130,6 +190,8 @@ def _main(argv: list[str]) -> int:
             depth=args.depth,
             max_nodes=args.max_nodes,
             per_hop_limit=args.per_hop_limit,
+            workers=args.workers,
+            hydrate_fields=None if args.no_hydrate else args.hydrate_fields,
         )
     except ss_client.SemanticScholarError as e:
         print(f"error: {e}", file=sys.stderr)
@@ -8,26 +8,38 @@ CLI:
     python3 ss_client.py references <paperId> --limit 100
     python3 ss_client.py recommendations <paperId> --limit 20
     python3 ss_client.py batch <id1> <id2> ... --fields paperId,title,year,citationCount
+    python3 ss_client.py batch --input ids.txt --format jsonl   # any number of ids, one per line
     python3 ss_client.py author-search "Ashish Vaswani"
     python3 ss_client.py author <authorId>
     python3 ss_client.py snippets "retrieval augmented generation"
 
 Env:
     SEMANTIC_SCHOLAR_API_KEY — optional; higher rate limits when set.
+    SEMANTIC_SCHOLAR_RPS     — optional; requests/second granted to your key (default 1).
+    SEMANTIC_SCHOLAR_CACHE_DIR — optional; response cache location
+                               (default ~/.cache/semantic-scholar-deep; --cache-dir / --no-cache).
 
 All commands print JSON to stdout. Non-zero exit on terminal errors.
 """
 from __future__ import annotations
 
 import argparse
+import base64
+import gzip
+import hashlib
+import http.client
 import json
 import os
+import re
+import sqlite3
+import ssl
 import sys
+import threading
 import time
-import urllib.error
 import urllib.parse
 import urllib.request
-from typing import Any
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Iterator
 
 GRAPH_BASE = "https://api.semanticscholar.org/graph/v1"
 RECS_BASE = "https://api.semanticscholar.org/recommendations/v1"
@@ -37,20 +49,348 @@ DEFAULT_PAPER_FIELDS = (
     "referenceCount,influentialCitationCount,externalIds,openAccessPdf,tldr"
 )
 LIGHT_PAPER_FIELDS = "paperId,title,year,authors.name,citationCount,venue"
+BATCH_MAX_IDS = 500  # per POST /paper/batch
+DEFAULT_BATCH_WORKERS = 4
+
+# Anonymous and keyed requests both start at 1 RPS; the only difference is
+# that a key may be granted more, which SEMANTIC_SCHOLAR_RPS declares.
+DEFAULT_RPS = 1.0
 
 
 class SemanticScholarError(RuntimeError):
     pass
 
 
+class TokenBucket:
+    """Thread-safe token bucket: `rate` requests per second, bursts of up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float = 1.0) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self) -> None:
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def defer(self, seconds: float) -> None:
+        """Hold back every caller for `seconds`, e.g. after a 429 with Retry-After."""
+        with self.lock:
+            self._refill()
+            self.tokens = min(self.tokens, 1 - seconds * self.rate)
+
+
+_limiters: dict[str, TokenBucket] = {}
+_limiters_lock = threading.Lock()
+
+
+def rate_limiter() -> TokenBucket:
+    """The process-wide bucket for the current credentials (keyed or anonymous)."""
+    keyed = bool(os.environ.get("SEMANTIC_SCHOLAR_API_KEY"))
+    rps = float(os.environ.get("SEMANTIC_SCHOLAR_RPS") or DEFAULT_RPS) if keyed else DEFAULT_RPS
+    name = f"keyed:{rps}" if keyed else "anonymous"
+    with _limiters_lock:
+        if name not in _limiters:
+            _limiters[name] = TokenBucket(rps, capacity=max(1.0, rps))
+        return _limiters[name]
+
+
 def _headers() -> dict[str, str]:
-    h = {"User-Agent": "semantic-scholar-deep/1.0"}
+    h = {"User-Agent": "semantic-scholar-deep/1.0", "Accept-Encoding": "gzip"}
     api_key = os.environ.get("SEMANTIC_SCHOLAR_API_KEY")
     if api_key:
         h["x-api-key"] = api_key
     return h
 
 
+class ConnectionPool:
+    """Idle keep-alive connections per (scheme, host), shared by all threads.
+
+    A connection is checked out for exactly one request/response and handed
+    back only if the server left it open. HTTPS_PROXY / NO_PROXY are honored
+    as urllib does, by tunnelling through the proxy with CONNECT.
+    """
+
+    def __init__(self, max_idle_per_host: int = 8) -> None:
+        self.max_idle_per_host = max_idle_per_host
+        self.idle: dict[tuple[str, str], list[http.client.HTTPConnection]] = {}
+        self.lock = threading.Lock()
+        self.context = ssl.create_default_context()
+
+    def acquire(self, scheme: str, netloc: str, timeout: float, *, fresh: bool = False) -> tuple[http.client.HTTPConnection, bool]:
+        """Return (connection, reused); `fresh` skips the idle connections."""
+        conn = None
+        if not fresh:
+            with self.lock:
+                idle = self.idle.get((scheme, netloc))
+                conn = idle.pop() if idle else None
+        if conn is not None:
+            conn.timeout = timeout
+            if conn.sock is not None:
+                conn.sock.settimeout(timeout)
+            return conn, True
+        return self._connect(scheme, netloc, timeout), False
+
+    def release(self, scheme: str, netloc: str, conn: http.client.HTTPConnection) -> None:
+        with self.lock:
+            idle = self.idle.setdefault((scheme, netloc), [])
+            if len(idle) < self.max_idle_per_host:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def close(self) -> None:
+        with self.lock:
+            conns = [c for idle in self.idle.values() for c in idle]
+            self.idle.clear()
+        for conn in conns:
+            conn.close()
+
+    def _connect(self, scheme: str, netloc: str, timeout: float) -> http.client.HTTPConnection:
+        if scheme != "https":
+            return http.client.HTTPConnection(netloc, timeout=timeout)
+        proxy = urllib.request.getproxies().get("https")
+        if not proxy or urllib.request.proxy_bypass(urllib.parse.urlsplit(f"//{netloc}").hostname or netloc):
+            return http.client.HTTPSConnection(netloc, timeout=timeout, context=self.context)
+        p = urllib.parse.urlsplit(proxy if "://" in proxy else f"http://{proxy}")
+        conn = http.client.HTTPSConnection(p.hostname, p.port or 80, timeout=timeout, context=self.context)
+        tunnel_headers = {}
+        if p.username:
+            creds = f"{urllib.parse.unquote(p.username)}:{urllib.parse.unquote(p.password or '')}"
+            tunnel_headers["Proxy-Authorization"] = "Basic " + base64.b64encode(creds.encode()).decode()
+        conn.set_tunnel(netloc, headers=tunnel_headers)
+        return conn
+
+
+_POOL = ConnectionPool()
+# What a server closing an idle keep-alive socket looks like; anything else is not retried here.
+STALE_CONNECTION_ERRORS = (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError)
+
+
+def _send(method: str, url: str, data: bytes | None, headers: dict[str, str], timeout: float) -> tuple[int, Any, bytes]:
+    """One request over a pooled connection; returns (status, headers, decoded body).
+
+    A reused connection the server has already closed is retried once on a
+    fresh connection. Other failures propagate, so a POST body is never
+    replayed after the server may have acted on it.
+    """
+    parts = urllib.parse.urlsplit(url)
+    target = parts.path + (f"?{parts.query}" if parts.query else "")
+    conn, reused = _POOL.acquire(parts.scheme, parts.netloc, timeout)
+    while True:
+        try:
+            conn.request(method, target, body=data, headers=headers)
+            resp = conn.getresponse()
+            body = resp.read()
+            break
+        except STALE_CONNECTION_ERRORS:
+            conn.close()
+            if not reused:
+                raise
+            conn, reused = _POOL.acquire(parts.scheme, parts.netloc, timeout, fresh=True)
+        except (http.client.HTTPException, OSError):
+            conn.close()
+            raise
+    if resp.will_close:
+        conn.close()
+    else:
+        _POOL.release(parts.scheme, parts.netloc, conn)
+    if (resp.getheader("Content-Encoding") or "").lower() == "gzip":
+        body = gzip.decompress(body)
+    return resp.status, resp.headers, body
+
+
+DAY = 24 * 3600
+# First match wins; endpoints not listed (search, snippets, author search) are never cached.
+CACHE_TTLS = [
+    (re.compile(r"/paper/batch$"), 7 * DAY),
+    (re.compile(r"/paper/.+/citations$"), 1 * DAY),
+    (re.compile(r"/paper/.+/references$"), 30 * DAY),
+    (re.compile(r"/paper/(?!search(/|$)).+$"), 7 * DAY),  # ids may contain "/" (DOI:10.18653/v1/...)
+    (re.compile(r"/papers/forpaper/[^/]+$"), 1 * DAY),
+    (re.compile(r"/author/[^/]+/papers$"), 1 * DAY),
+    (re.compile(r"/author/(?!search)[^/]+$"), 7 * DAY),
+]
+ENTITY_TTL = 7 * DAY
+DEFAULT_CACHE_MAX_MB = 256
+PAPER_ID_RE = re.compile(r"^[0-9a-f]{40}$")
+
+
+def cache_ttl(url: str) -> int:
+    path = urllib.parse.urlsplit(url).path
+    for pattern, ttl in CACHE_TTLS:
+        if pattern.search(path):
+            return ttl
+    return 0
+
+
+def _field_set(fields: str) -> set[str]:
+    return {f.strip() for f in fields.split(",") if f.strip()} | {"paperId"}
+
+
+def _top(field: str) -> str:
+    return field.split(".", 1)[0]
+
+
+class ResponseCache:
+    """SQLite cache of API responses plus a per-paperId entity table.
+
+    `responses` is keyed by method + URL + body, with a TTL per endpoint
+    (CACHE_TTLS). `papers` holds each paper seen through `paper()` or
+    `batch()` with the set of fields it was fetched with, so a later request
+    for a subset of those fields needs no network call. Both tables are
+    evicted least-recently-used once the file grows past `max_bytes`.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_CACHE_MAX_MB * 1024 * 1024) -> None:
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, "responses.sqlite")
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, body BLOB NOT NULL,"
+            " expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS papers (paper_id TEXT PRIMARY KEY, fields TEXT NOT NULL, body TEXT NOT NULL,"
+            " expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+
+    @staticmethod
+    def key(method: str, url: str, data: bytes | None) -> str:
+        h = hashlib.sha256(f"{method} {url}\n".encode("utf-8"))
+        h.update(data or b"")
+        return h.hexdigest()
+
+    def get(self, key: str) -> bytes | None:
+        now = time.time()
+        with self.lock:
+            row = self.db.execute("SELECT body, expires_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or row[1] < now:
+                return None
+            self.db.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+        return row[0]
+
+    def put(self, key: str, body: bytes, ttl: int) -> None:
+        now = time.time()
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)", (key, body, now + ttl, now))
+        self._evict()
+
+    def get_paper(self, paper_id: str, fields: str) -> dict | None:
+        """The cached paper projected onto `fields`, if every requested field was fetched before."""
+        now = time.time()
+        with self.lock:
+            row = self.db.execute("SELECT fields, body, expires_at FROM papers WHERE paper_id = ?", (paper_id,)).fetchone()
+            if row is None or row[2] < now:
+                return None
+            wanted = _field_set(fields)
+            have = set(json.loads(row[0]))
+            if not all(f in have or _top(f) in have for f in wanted):
+                return None
+            self.db.execute("UPDATE papers SET accessed_at = ? WHERE paper_id = ?", (now, paper_id))
+        body = json.loads(row[1])
+        tops = {_top(f) for f in wanted}
+        return {k: v for k, v in body.items() if k in tops}
+
+    def put_papers(self, papers: list[Any], fields: str) -> None:
+        """Merge papers into the entity table; fields of the new fetch replace those they overlap."""
+        new_fields = _field_set(fields)
+        new_tops = {_top(f) for f in new_fields}
+        now = time.time()
+        with self.lock:
+            for item in papers:
+                if not isinstance(item, dict) or not item.get("paperId"):
+                    continue
+                row = self.db.execute("SELECT fields, body, expires_at FROM papers WHERE paper_id = ?", (item["paperId"],)).fetchone()
+                merged_fields, body = set(new_fields), {}
+                if row is not None and row[2] >= now:
+                    merged_fields |= {f for f in json.loads(row[0]) if _top(f) not in new_tops}
+                    body = {k: v for k, v in json.loads(row[1]).items() if k not in new_tops}
+                body.update({k: v for k, v in item.items() if k in new_tops})
+                self.db.execute(
+                    "INSERT OR REPLACE INTO papers VALUES (?, ?, ?, ?, ?)",
+                    (item["paperId"], json.dumps(sorted(merged_fields)), json.dumps(body, ensure_ascii=False), now + ENTITY_TTL, now),
+                )
+        self._evict()
+
+    def _evict(self) -> None:
+        """Drop expired rows, then the least recently used quarter, while live pages exceed max_bytes."""
+        with self.lock:
+            (pages,) = self.db.execute("PRAGMA page_count").fetchone()
+            (free,) = self.db.execute("PRAGMA freelist_count").fetchone()
+            (page_size,) = self.db.execute("PRAGMA page_size").fetchone()
+            if (pages - free) * page_size <= self.max_bytes:
+                return
+            now = time.time()
+            for table in ("responses", "papers"):
+                self.db.execute(f"DELETE FROM {table} WHERE expires_at < ?", (now,))
+                (count,) = self.db.execute(f"SELECT COUNT(*) FROM {table}").fetchone()
+                self.db.execute(
+                    f"DELETE FROM {table} WHERE rowid IN (SELECT rowid FROM {table} ORDER BY accessed_at LIMIT ?)",
+                    (count // 4,),
+                )
+
+    def close(self) -> None:
+        with self.lock:
+            self.db.close()
+
+
+def default_cache_dir() -> str:
+    return os.environ.get("SEMANTIC_SCHOLAR_CACHE_DIR") or os.path.join(
+        os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"), "semantic-scholar-deep"
+    )
+
+
+_cache: ResponseCache | None = None
+_cache_configured = False
+_cache_lock = threading.Lock()
+
+
+def configure_cache(directory: str | None = None, *, enabled: bool = True) -> None:
+    """Select the response cache for this process (default directory unless given; none when disabled)."""
+    global _cache, _cache_configured
+    with _cache_lock:
+        if _cache is not None:
+            _cache.close()
+        _cache = None
+        _cache_configured = True
+        if enabled:
+            try:
+                _cache = ResponseCache(directory or default_cache_dir())
+            except (OSError, sqlite3.Error) as e:
+                print(f"warning: response cache disabled: {e}", file=sys.stderr)
+
+
+def cache_arguments() -> argparse.ArgumentParser:
+    """Parent parser with --cache-dir / --no-cache, shared by the CLIs."""
+    p = argparse.ArgumentParser(add_help=False)
+    p.add_argument("--cache-dir", help=f"response cache directory (default: {default_cache_dir()})")
+    p.add_argument("--no-cache", action="store_true", help="neither read nor write the response cache")
+    return p
+
+
+def response_cache() -> ResponseCache | None:
+    if not _cache_configured:
+        configure_cache()
+    return _cache
+
+
 def _request(
     method: str,
     url: str,
@@ -71,31 +411,44 @@ def _request(
         data = json.dumps(json_body).encode("utf-8")
         headers["Content-Type"] = "application/json"
 
-    req = urllib.request.Request(url, data=data, method=method, headers=headers)
+    cache = response_cache()
+    ttl = cache_ttl(url) if cache is not None else 0
+    cache_key = ResponseCache.key(method, url, data) if ttl else ""
+    if ttl:
+        cached = cache.get(cache_key)  # type: ignore[union-attr]
+        if cached is not None:
+            return json.loads(cached) if cached else None
 
+    limiter = rate_limiter()
     backoff = 1.0
     for attempt in range(max_retries + 1):
+        limiter.acquire()
         try:
-            with urllib.request.urlopen(req, timeout=timeout) as resp:
-                body = resp.read()
-                return json.loads(body) if body else None
-        except urllib.error.HTTPError as e:
-            if e.code == 429 or 500 <= e.code < 600:
-                if attempt == max_retries:
-                    raise SemanticScholarError(
-                        f"HTTP {e.code} after {max_retries} retries: {url}"
-                    ) from e
-                retry_after = e.headers.get("Retry-After")
-                wait = float(retry_after) if retry_after else backoff
-                time.sleep(wait)
-                backoff = min(backoff * 2, 30)
-                continue
-            raise SemanticScholarError(f"HTTP {e.code}: {e.read().decode(errors='replace')}") from e
-        except urllib.error.URLError as e:
+            status, resp_headers, body = _send(method, url, data, headers, timeout)
+        except (http.client.HTTPException, OSError) as e:
             if attempt == max_retries:
-                raise SemanticScholarError(f"Network error: {e.reason}") from e
+                raise SemanticScholarError(f"Network error: {e}") from e
             time.sleep(backoff)
             backoff = min(backoff * 2, 30)
+            continue
+        if status < 300:
+            result = json.loads(body) if body else None
+            if ttl:
+                cache.put(cache_key, body, ttl)  # type: ignore[union-attr]
+            return result
+        if status == 429 or 500 <= status < 600:
+            if attempt == max_retries:
+                raise SemanticScholarError(f"HTTP {status} after {max_retries} retries: {url}")
+            retry_after = resp_headers.get("Retry-After")
+            wait = float(retry_after) if retry_after else backoff
+            if status == 429:
+                # Throttling applies to every worker sharing the budget, not just this one.
+                limiter.defer(wait)
+            else:
+                time.sleep(wait)
+            backoff = min(backoff * 2, 30)
+            continue
+        raise SemanticScholarError(f"HTTP {status}: {body.decode(errors='replace')}")
 
 
 def search(
@@ -128,7 +481,15 @@ def search(
 
 
 def paper(paper_id: str, *, fields: str = DEFAULT_PAPER_FIELDS) -> dict:
-    return _request("GET", f"{GRAPH_BASE}/paper/{paper_id}", params={"fields": fields})
+    cache = response_cache()
+    if cache is not None and PAPER_ID_RE.match(paper_id):
+        hit = cache.get_paper(paper_id, fields)
+        if hit is not None:
+            return hit
+    result = _request("GET", f"{GRAPH_BASE}/paper/{paper_id}", params={"fields": fields})
+    if cache is not None:
+        cache.put_papers([result], fields)
+    return result
 
 
 def citations(
@@ -161,15 +522,59 @@ def recommendations(
     )
 
 
-def batch(ids: list[str], *, fields: str = DEFAULT_PAPER_FIELDS) -> list:
-    if len(ids) > 500:
-        raise ValueError("batch supports up to 500 ids")
-    return _request(
+def _batch_chunk(ids: list[str], fields: str) -> list:
+    fetched = _request(
         "POST",
         f"{GRAPH_BASE}/paper/batch",
         params={"fields": fields},
         json_body={"ids": ids},
-    )
+    ) or []
+    cache = response_cache()
+    if cache is not None:
+        cache.put_papers(fetched, fields)
+    return list(fetched[: len(ids)]) + [None] * (len(ids) - len(fetched))
+
+
+def iter_batch(ids: list[str], *, fields: str = DEFAULT_PAPER_FIELDS, workers: int = DEFAULT_BATCH_WORKERS) -> Iterator[dict | None]:
+    """Yield one paper (or None when S2 does not know the id) per input id, in input order.
+
+    Ids the entity cache can answer are served locally; the rest are
+    deduplicated and fetched in BATCH_MAX_IDS chunks, `workers` at a time
+    under the rate limiter. Results are yielded as soon as every earlier id
+    is resolved, so callers can stream them.
+    """
+    cache = response_cache()
+    hits: dict[str, dict] = {}
+    if cache is not None:
+        for paper_id in dict.fromkeys(ids):
+            hit = cache.get_paper(paper_id, fields) if PAPER_ID_RE.match(paper_id) else None
+            if hit is not None:
+                hits[paper_id] = hit
+    missing = [paper_id for paper_id in dict.fromkeys(ids) if paper_id not in hits]
+    chunks = [missing[i:i + BATCH_MAX_IDS] for i in range(0, len(missing), BATCH_MAX_IDS)]
+    chunk_of = {paper_id: n for n, chunk in enumerate(chunks) for paper_id in chunk}
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures: list[Future] = [pool.submit(_batch_chunk, chunk, fields) for chunk in chunks]
+        resolved: dict[str, dict | None] = {}
+        done = 0
+        try:
+            for paper_id in ids:
+                if paper_id in hits:
+                    yield hits[paper_id]
+                    continue
+                n = chunk_of[paper_id]
+                while done <= n:
+                    resolved.update(zip(chunks[done], futures[done].result()))
+                    done += 1
+                yield resolved[paper_id]
+        finally:
+            for future in futures:
+                future.cancel()
+
+
+def batch(ids: list[str], *, fields: str = DEFAULT_PAPER_FIELDS, workers: int = DEFAULT_BATCH_WORKERS) -> list:
+    """Papers for any number of ids, in input order with None for unknown ids (see iter_batch)."""
+    return list(iter_batch(ids, fields=fields, workers=workers))
 
 
 def author_search(query: str, *, limit: int = 20, fields: str = "authorId,name,affiliations,paperCount,citationCount,hIndex") -> dict:
@@ -210,8 +615,9 @@ def _emit(obj: Any) -> None:
 def _main(argv: list[str]) -> int:
     p = argparse.ArgumentParser(description="Semantic Scholar API client")
     sub = p.add_subparsers(dest="cmd", required=True)
+    cache_opts = cache_arguments()
 
-    sp = sub.add_parser("search")
+    sp = sub.add_parser("search", parents=[cache_opts])
     sp.add_argument("query")
     sp.add_argument("--limit", type=int, default=20)
     sp.add_argument("--offset", type=int, default=0)
@@ -223,44 +629,49 @@ def _main(argv: list[str]) -> int:
     sp.add_argument("--open-access-pdf", action="store_true")
     sp.add_argument("--bulk", action="store_true")
 
-    pp = sub.add_parser("paper")
+    pp = sub.add_parser("paper", parents=[cache_opts])
     pp.add_argument("paper_id")
     pp.add_argument("--fields", default=DEFAULT_PAPER_FIELDS)
 
     for name in ("citations", "references"):
-        cp = sub.add_parser(name)
+        cp = sub.add_parser(name, parents=[cache_opts])
         cp.add_argument("paper_id")
         cp.add_argument("--limit", type=int, default=100)
         cp.add_argument("--offset", type=int, default=0)
         cp.add_argument("--fields", default=LIGHT_PAPER_FIELDS)
 
-    rp = sub.add_parser("recommendations")
+    rp = sub.add_parser("recommendations", parents=[cache_opts])
     rp.add_argument("paper_id")
     rp.add_argument("--limit", type=int, default=100)
     rp.add_argument("--fields", default=LIGHT_PAPER_FIELDS)
     rp.add_argument("--pool", choices=["recent", "all-cs"], default="recent")
 
-    bp = sub.add_parser("batch")
-    bp.add_argument("ids", nargs="+")
+    bp = sub.add_parser("batch", parents=[cache_opts])
+    bp.add_argument("ids", nargs="*", help="ids to resolve; read from --input or stdin when omitted")
+    bp.add_argument("--input", help="file with one id per line ('-' for stdin)")
     bp.add_argument("--fields", default=DEFAULT_PAPER_FIELDS)
+    bp.add_argument("--workers", type=int, default=DEFAULT_BATCH_WORKERS, help="concurrent 500-id requests")
+    bp.add_argument("--format", choices=["json", "jsonl"], default="json",
+                    help="jsonl streams one line per input id, in order (null if not found)")
 
-    asp = sub.add_parser("author-search")
+    asp = sub.add_parser("author-search", parents=[cache_opts])
     asp.add_argument("query")
     asp.add_argument("--limit", type=int, default=20)
 
-    ap = sub.add_parser("author")
+    ap = sub.add_parser("author", parents=[cache_opts])
     ap.add_argument("author_id")
 
-    app = sub.add_parser("author-papers")
+    app = sub.add_parser("author-papers", parents=[cache_opts])
     app.add_argument("author_id")
     app.add_argument("--limit", type=int, default=100)
     app.add_argument("--offset", type=int, default=0)
 
-    snp = sub.add_parser("snippets")
+    snp = sub.add_parser("snippets", parents=[cache_opts])
     snp.add_argument("query")
     snp.add_argument("--limit", type=int, default=10)
 
     args = p.parse_args(argv)
+    configure_cache(args.cache_dir, enabled=not args.no_cache)
 
     try:
         if args.cmd == "search":
@@ -279,7 +690,22 @@ def _main(argv: list[str]) -> int:
         elif args.cmd == "recommendations":
             _emit(recommendations(args.paper_id, limit=args.limit, fields=args.fields, pool=args.pool))
         elif args.cmd == "batch":
-            _emit(batch(args.ids, fields=args.fields))
+            ids = list(args.ids)
+            if args.input and args.input != "-":
+                with open(args.input, encoding="utf-8") as f:
+                    lines = f.read().splitlines()
+            elif args.input or not ids:
+                lines = sys.stdin.read().splitlines()
+            else:
+                lines = []
+            ids += [line.strip() for line in lines if line.strip() and not line.lstrip().startswith("#")]
+            results = iter_batch(ids, fields=args.fields, workers=args.workers)
+            if args.format == "jsonl":
+                for item in results:
+                    sys.stdout.write(json.dumps(item, ensure_ascii=False) + "\n")
+                    sys.stdout.flush()
+            else:
+                _emit(list(results))
         elif args.cmd == "author-search":
             _emit(author_search(args.query, limit=args.limit))
         elif args.cmd == "author":
@@ -0,0 +1,339 @@
+"""Self-contained test suite for the semantic-scholar-deep skill.
+
+No network access: every test stubs the Semantic Scholar calls it exercises.
+Run from the skill root:
+
+    python3 -m unittest tests.test_skill -v
+
+or:
+
+    python3 tests/test_skill.py
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sys
+import threading
+import time
+import unittest
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+SCRIPTS = ROOT / "scripts"
+
+sys.path.insert(0, str(SCRIPTS))
+import citation_graph  # noqa: E402
+import ss_client  # noqa: E402
+
+
+class TestCitationGraphTraverse(unittest.TestCase):
+    """Seed S has 5 citing and 5 cited papers; every other paper has 5 of each too."""
+
+    def setUp(self):
+        from unittest import mock
+        self.lock = threading.Lock()
+        self.calls = []
+        patcher = mock.patch.object(ss_client, "paper", return_value={"paperId": "S", "title": "seed"})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def fake_hop(self, delays):
+        def hop(paper_id, kind, per_hop_limit):
+            with self.lock:
+                self.calls.append((paper_id, kind))
+            time.sleep(delays(paper_id, kind))
+            key = "citingPaper" if kind == "citation" else "citedPaper"
+            prefix = f"{paper_id}{'c' if kind == 'citation' else 'r'}"
+            return {"data": [{key: {"paperId": f"{prefix}{i}"}} for i in range(per_hop_limit)]}
+        return hop
+
+    def traverse(self, delays, **kwargs):
+        from unittest import mock
+        self.calls = []
+        with mock.patch.object(citation_graph, "_fetch_hop", side_effect=self.fake_hop(delays)):
+            return citation_graph.traverse("S", per_hop_limit=5, hydrate_fields=None, **kwargs)
+
+    def test_out_of_order_responses_match_serial_run(self):
+        # Later requests of each level finish first.
+        order = {}
+
+        def reversed_delays(paper_id, kind):
+            with self.lock:
+                n = order.setdefault((paper_id, kind), len(order))
+            return 0.2 / (1 + n % 10)
+
+        for max_nodes in (8, 25, 200):
+            order.clear()
+            serial = self.traverse(lambda *_: 0, depth=2, max_nodes=max_nodes, workers=1)
+            order.clear()
+            concurrent = self.traverse(reversed_delays, depth=2, max_nodes=max_nodes, workers=8)
+            self.assertEqual(list(concurrent["nodes"].items()), list(serial["nodes"].items()))
+            self.assertEqual(concurrent["edges"], serial["edges"])
+            self.assertEqual(concurrent["stats"], serial["stats"])
+        self.assertEqual(len(serial["nodes"]), 1 + 10 + 100)
+        self.assertEqual(len(self.traverse(lambda *_: 0, depth=2, max_nodes=25)["nodes"]), 25)
+
+    def test_queued_requests_cancelled_once_graph_full(self):
+        # Level 1 queues 20 requests; the first response alone fills the graph.
+        graph = self.traverse(lambda *_: 0.05, depth=2, max_nodes=14, workers=1)
+        self.assertEqual(len(graph["nodes"]), 14)
+        self.assertTrue(graph["stats"]["truncated"])
+        level_one = [c for c in self.calls if c[0] != "S"]
+        self.assertEqual(level_one[0], ("Sc0", "citation"))
+        self.assertLessEqual(len(level_one), 2)
+
+
+class TestKeepAliveReconnect(unittest.TestCase):
+    """_send against a local server that drops keep-alive sockets after each response."""
+
+    def setUp(self):
+        import http.server
+        from unittest import mock
+        test = self
+        self.requests = []
+        self.mode = "drop-after-response"
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def handle_one_request(self):
+                self.drop = True
+                super().handle_one_request()
+                if self.drop:
+                    self.close_connection = True  # advertised keep-alive, but the socket is gone
+
+            def respond(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                test.requests.append((self.command, body))
+                self.drop = test.mode != "keep-alive"
+                if test.mode == "hang-up":
+                    return
+                if test.mode == "slow":
+                    time.sleep(0.5)
+                payload = b'{"ok": true}'
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            do_GET = do_POST = respond
+
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.server.handle_error = lambda request, client_address: None  # the client timed out first
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/paper/batch"
+        patcher = mock.patch.object(ss_client, "_POOL", ss_client.ConnectionPool())
+        self.pool = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.pool.close)
+
+    def send(self, method="POST", timeout=5.0):
+        return ss_client._send(method, self.url, b'{"ids": ["a"]}', {"Content-Type": "application/json"}, timeout)
+
+    def idle_connections(self):
+        return sum(len(conns) for conns in self.pool.idle.values())
+
+    def test_stale_keep_alive_retried_once_on_fresh_connection(self):
+        for _ in range(3):
+            status, _, body = self.send()
+            self.assertEqual((status, body), (200, b'{"ok": true}'))
+            self.assertEqual(self.idle_connections(), 1)
+            time.sleep(0.05)  # let the server close its end
+        self.assertEqual(len(self.requests), 3)
+
+    def test_fresh_connection_failure_not_retried(self):
+        self.send()
+        time.sleep(0.05)
+        self.mode = "hang-up"
+        with self.assertRaises(ss_client.STALE_CONNECTION_ERRORS):
+            self.send()
+        self.assertEqual(len(self.requests), 2)  # the stale socket never reached the handler
+
+    def test_post_not_replayed_after_timeout_on_live_connection(self):
+        self.mode = "keep-alive"
+        self.send(method="GET")
+        self.mode = "slow"
+        with self.assertRaises(OSError) as caught:
+            self.send(timeout=0.1)
+        self.assertNotIsInstance(caught.exception, ss_client.STALE_CONNECTION_ERRORS)
+        time.sleep(0.6)
+        self.assertEqual([m for m, _ in self.requests], ["GET", "POST"])
+
+
+class TestResponseCache(unittest.TestCase):
+    """_request / paper() / batch() against a temp cache dir with _send stubbed out."""
+
+    PAPER_ID = "204e3073870fae3d05bcbc2f6a8e263d9b72e776"
+
+    def setUp(self):
+        import shutil
+        import tempfile
+        from unittest import mock
+        self.tmpdir = tempfile.mkdtemp(prefix="s2-cache-")
+        self.addCleanup(shutil.rmtree, self.tmpdir, True)
+        ss_client.configure_cache(self.tmpdir)
+        self.addCleanup(ss_client.configure_cache, enabled=False)
+        self.sent = []
+        for patcher in (
+            mock.patch.object(ss_client, "rate_limiter", return_value=ss_client.TokenBucket(1e6, capacity=1e6)),
+            mock.patch.object(ss_client, "_send", side_effect=self.fake_send),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def fake_send(self, method, url, data, headers, timeout):
+        self.sent.append((method, url))
+        path = url.split("?", 1)[0]
+        if path.endswith("/paper/batch"):
+            ids = json.loads(data)["ids"]
+            body = [{"paperId": i, "title": f"T {i}", "year": 2017} for i in ids]
+        elif path.endswith(("/citations", "/references")) or "/search" in path:
+            body = {"data": [{"paperId": "x"}]}
+        else:
+            body = {"paperId": self.PAPER_ID, "title": "Attention", "abstract": "..."}
+        return 200, {}, json.dumps(body).encode()
+
+    def test_entries_expire_by_endpoint_ttl(self):
+        from unittest import mock
+        for _ in range(2):
+            ss_client.citations(self.PAPER_ID)
+            ss_client.references(self.PAPER_ID)
+        self.assertEqual(len(self.sent), 2)
+        later = time.time() + 2 * ss_client.DAY  # citations live 1 day, references 30
+        with mock.patch.object(ss_client.time, "time", return_value=later):
+            ss_client.citations(self.PAPER_ID)
+            ss_client.references(self.PAPER_ID)
+        self.assertEqual([url.split("?")[0].rsplit("/", 1)[1] for _, url in self.sent], ["citations", "references", "citations"])
+
+    def test_search_never_stored(self):
+        for _ in range(2):
+            ss_client.search("attention")
+            ss_client.author_search("vaswani")
+            ss_client.snippet_search("retrieval")
+        self.assertEqual(len(self.sent), 6)
+        self.assertEqual(ss_client.cache_ttl(f"{ss_client.GRAPH_BASE}/paper/search/bulk"), 0)
+        (rows,) = ss_client.response_cache().db.execute("SELECT COUNT(*) FROM responses").fetchone()
+        self.assertEqual(rows, 0)
+
+    def test_lru_eviction_keeps_size_bound(self):
+        cache = ss_client.ResponseCache(os.path.join(self.tmpdir, "small"), max_bytes=256 * 1024)
+        self.addCleanup(cache.close)
+        body = b"x" * 8192
+        cache.put("hot", body, 3600)
+        for n in range(200):
+            cache.put(f"cold-{n}", body, 3600)
+            self.assertEqual(cache.get("hot"), body)
+            (pages,) = cache.db.execute("PRAGMA page_count").fetchone()
+            (free,) = cache.db.execute("PRAGMA freelist_count").fetchone()
+            (page_size,) = cache.db.execute("PRAGMA page_size").fetchone()
+            self.assertLessEqual((pages - free) * page_size, cache.max_bytes + 2 * len(body))
+        self.assertIsNone(cache.get("cold-0"))
+        self.assertEqual(cache.get("cold-199"), body)
+
+    def test_paper_answered_from_batch_entity_only_for_field_subset(self):
+        import contextlib
+        import io
+        other = "0" * 40
+        self.assertEqual([p["title"] for p in ss_client.batch([self.PAPER_ID, other], fields="paperId,title,year")],
+                         [f"T {self.PAPER_ID}", f"T {other}"])
+        self.assertEqual(len(self.sent), 1)
+
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            self.assertEqual(ss_client._main(["paper", self.PAPER_ID, "--fields", "title", "--cache-dir", self.tmpdir]), 0)
+        self.assertEqual(json.loads(out.getvalue()), {"paperId": self.PAPER_ID, "title": f"T {self.PAPER_ID}"})
+        self.assertEqual(len(self.sent), 1)
+
+        self.assertEqual(ss_client.paper(self.PAPER_ID, fields="title,abstract")["abstract"], "...")
+        self.assertEqual(len(self.sent), 2)
+        self.assertEqual(self.sent[1][1].split("?")[0], f"{ss_client.GRAPH_BASE}/paper/{self.PAPER_ID}")
+
+
+class TestBatch(unittest.TestCase):
+    """iter_batch / batch / the batch CLI with _request stubbed and the cache off."""
+
+    def setUp(self):
+        from unittest import mock
+        ss_client.configure_cache(enabled=False)
+        self.lock = threading.Lock()
+        self.chunks = []
+        self.delays = {}
+        self.blocked = None
+        self.release = threading.Event()
+        patcher = mock.patch.object(ss_client, "_request", side_effect=self.fake_request)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def fake_request(self, method, url, *, params=None, json_body=None, **kwargs):
+        ids = json_body["ids"]
+        with self.lock:
+            self.chunks.append(ids)
+        if ids[0] == self.blocked:
+            self.release.wait(5)
+        time.sleep(self.delays.get(ids[0], 0))
+        found = [None if i.startswith("missing") else {"paperId": i, "fields": params["fields"]} for i in ids]
+        return found[:-1] if ids[-1] == "unknown-tail" else found  # S2 may also return a short list
+
+    def test_more_than_500_ids_chunked_out_of_order_in_input_order(self):
+        ids = [f"id-{n}" for n in range(1203)]
+        self.delays = {"id-0": 0.2, "id-500": 0.1}  # the last chunk finishes first
+        result = ss_client.batch(ids, fields="paperId,title", workers=3)
+        self.assertEqual([p["paperId"] for p in result], ids)
+        self.assertEqual(sorted(len(c) for c in self.chunks), [203, 500, 500])
+        self.assertEqual({p["fields"] for p in result}, {"paperId,title"})
+
+    def test_missing_ids_and_duplicates(self):
+        ids = ["a", "missing-1", "a", "b", "unknown-tail"]
+        self.assertEqual(ss_client.batch(ids), [{"paperId": "a", "fields": ss_client.DEFAULT_PAPER_FIELDS}, None,
+                                                {"paperId": "a", "fields": ss_client.DEFAULT_PAPER_FIELDS},
+                                                {"paperId": "b", "fields": ss_client.DEFAULT_PAPER_FIELDS}, None])
+        self.assertEqual(self.chunks, [["a", "missing-1", "b", "unknown-tail"]])
+
+    def test_iter_batch_streams_before_later_chunks_finish(self):
+        ids = [f"id-{n}" for n in range(501)]
+        self.blocked = "id-500"
+        self.addCleanup(self.release.set)
+        results = ss_client.iter_batch(ids, workers=2)
+        self.assertEqual(next(results)["paperId"], "id-0")  # while the second chunk is still blocked
+        self.release.set()
+        self.assertEqual([p["paperId"] for p in results], ids[1:])
+
+    def run_cli(self, *argv, stdin=""):
+        import contextlib
+        import io
+        from unittest import mock
+        out = io.StringIO()
+        with mock.patch.object(sys, "stdin", io.StringIO(stdin)), contextlib.redirect_stdout(out):
+            self.assertEqual(ss_client._main(["batch", "--no-cache", *argv]), 0)
+        return out.getvalue()
+
+    def test_cli_reads_ids_from_stdin_and_file(self):
+        import tempfile
+        from unittest import mock
+        lines = [json.loads(line) for line in self.run_cli("--format", "jsonl", stdin="a\n# comment\n\nmissing-1\n b \n").splitlines()]
+        self.assertEqual([p and p["paperId"] for p in lines], ["a", None, "b"])
+
+        with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as f:
+            f.write("\n".join(f"id-{n}" for n in range(1, 601)))
+        self.addCleanup(os.unlink, f.name)
+        with mock.patch.object(ss_client, "iter_batch", wraps=ss_client.iter_batch) as spy:
+            result = json.loads(self.run_cli("id-0", "--input", f.name, "--workers", "2", "--fields", "paperId"))
+        self.assertEqual([p["paperId"] for p in result], [f"id-{n}" for n in range(601)])
+        self.assertEqual(spy.call_args.kwargs, {"fields": "paperId", "workers": 2})
+        self.assertEqual(json.loads(self.run_cli("x", "--input", "-", stdin="y\n")), [
+            {"paperId": "x", "fields": ss_client.DEFAULT_PAPER_FIELDS},
+            {"paperId": "y", "fields": ss_client.DEFAULT_PAPER_FIELDS},
+        ])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)